@@ -0,0 +1,371 @@
+"""
+Merjenje hitrosti in kakovosti DCT kodeka (utils/image_compression_dct.py)
+Za vsako kombinacijo slike, faktorja, verzije formata in barvnega načina izmeri čas posameznih
+korakov kodiranja (pad, dct, quant, zigzag, rle/entropy, serialize) in dekodiranja, MB/s,
+razmerje stiskanja ter PSNR/SSIM. Rezultati so JSON, ki ga lahko shranimo kot osnovo (baseline)
+in z njim primerjamo kasnejše meritve - tako vsaka optimizacija pokaže, da je hitrejša in ne slabša.
+
+Uporaba:
+    benchmark_codec.py [--images PATH ...] [--sizes 64 256 ...] [--faktors 1 5 ...]
+        [--versions 1 2] [--color-modes bgr ycbcr420] [--repeat N] [--output results.json]
+    benchmark_codec.py ... --save-baseline baseline.json     shrani rezultate kot osnovo
+    benchmark_codec.py ... --baseline baseline.json          primerja z osnovo, izhod 1 ob regresiji
+    benchmark_codec.py --reference [--ignore-time]          referenčni nabor (benchmarks/golden) in osnova
+                                                            (benchmarks/baseline.json)
+
+Časi se primerjajo kot najmanjši čas čez --repeat ponovitev; sprememba pod --time-floor (privzeto 1 ms)
+ni regresija, saj je pri majhnih slikah relativni šum velik. Osnova je izmerjena na enem računalniku;
+v drugačnem okolju (ali z --ignore-time) se primerjajo le velikost, PSNR in izhod.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+import platform
+import cv2
+import numpy as np
+from utils.image_compression_dct import (
+    COLOR_MODES, DEFAULT_DCT_ENGINE, DCT_ENGINES, split_color_planes, pad_plane, channel_quant_matrices,
+    channel_to_blocks, fdct_blocks, apply_quant, zigzag_scan_blocks, coefficients_to_runs,
+    serialize_binary, serialize_binary_v2, parse_binary, decode_channels, compress_image_array, image_psnr
+)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+DEFAULT_SIZES = (64, 256, 512, 1024)
+DEFAULT_FAKTORS = (1, 5, 10, 15)
+
+# Referenčni nabor slik in osnova v repozitoriju
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+REFERENCE_IMAGES = os.path.join(BENCHMARK_DIR, 'golden')
+REFERENCE_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+REFERENCE_SIZES = (64, 256)
+
+# Najmanjša absolutna sprememba časa (sekunde), ki šteje kot regresija
+TIME_FLOOR = 0.001
+# Najmanjši skupni čas meritev ene kombinacije (sekunde)
+MIN_CASE_TIME = 0.1
+# Časi se primerjajo le z osnovo, izmerjeno v enakem okolju
+TIME_ENVIRONMENT_KEYS = ('platform', 'machine', 'cpu_count', 'python', 'numpy', 'numba')
+
+
+def synthetic_image(height, width, seed=0):
+    """
+    Deterministična testna slika: gladki prelivi, ostri robovi in šum (podobno fotografiji obraza).
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.empty((height, width, 3), dtype=np.float32)
+    image[..., 0] = 255.0 * x / max(1, width - 1)
+    image[..., 1] = 255.0 * y / max(1, height - 1)
+    image[..., 2] = 127.5 + 100.0 * np.sin(x / 7.0) * np.cos(y / 11.0)
+
+    # Ostri robovi: pravokotnik in krog
+    image[height // 4:height // 2, width // 4:width // 2] = (40, 200, 90)
+    circle = (x - 0.65 * width) ** 2 + (y - 0.6 * height) ** 2 < (0.15 * min(width, height)) ** 2
+    image[circle] = (220, 60, 160)
+
+    image += rng.normal(0.0, 6.0, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def load_images(paths, sizes):
+    """
+    Vrne seznam (ime, slika): sintetične slike za vsako velikost in shranjene slike iz paths
+    (datoteke ali mape).
+    """
+    images = [(f"synthetic-{size}", synthetic_image(size, size, seed=size)) for size in sizes]
+    # Velikost, ki ni deljiva z 8, preveri še dopolnjevanje in obrezovanje
+    images.append(("synthetic-odd", synthetic_image(333, 250, seed=1)))
+
+    files = []
+    for path in paths or []:
+        if os.path.isdir(path):
+            files.extend(sorted(f for f in glob.glob(os.path.join(path, '*'))
+                                if f.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            files.append(path)
+    for path in files:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not read image file: {path}")
+        images.append((os.path.basename(path), image))
+    return images
+
+
+def ssim(original, decoded):
+    """
+    SSIM (Wang et al. 2004) z Gaussovim oknom 11x11, sigma 1.5, povprečen po kanalih.
+    """
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    values = []
+    for a, b in zip(cv2.split(original.astype(np.float64)), cv2.split(decoded.astype(np.float64))):
+        blur = lambda img: cv2.GaussianBlur(img, (11, 11), 1.5)
+        mu_a, mu_b = blur(a), blur(b)
+        var_a = blur(a * a) - mu_a * mu_a
+        var_b = blur(b * b) - mu_b * mu_b
+        cov = blur(a * b) - mu_a * mu_b
+        ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+        values.append(ssim_map.mean())
+    return float(np.mean(values))
+
+
+def encode_stages(image, faktor, version, color_mode, dct_engine):
+    """
+    Kodira sliko po korakih (enako kot compress_image_array) in izmeri čas vsakega koraka.
+
+    Returns:
+        Tuple (kompresirani podatki, {korak: sekunde})
+    """
+    timings = {}
+    rows, cols = image.shape[:2]
+
+    start = time.perf_counter()
+    channels = [pad_plane(plane) for plane in split_color_planes(image, color_mode)]
+    new_rows, new_cols = channels[0].shape
+    timings['pad'] = time.perf_counter() - start
+
+    Qs = channel_quant_matrices(faktor, color_mode, len(channels))
+
+    start = time.perf_counter()
+    F = [fdct_blocks(channel_to_blocks(channel), dct_engine) for channel in channels]
+    timings['dct'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Fq = [apply_quant(f, Q) for f, Q in zip(F, Qs)]
+    timings['quant'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    coefficients = [zigzag_scan_blocks(f) for f in Fq]
+    timings['zigzag'] = time.perf_counter() - start
+
+    if version == 1:
+        start = time.perf_counter()
+        runs = [coefficients_to_runs(zz) for zz in coefficients]
+        timings['rle'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = serialize_binary(runs, new_cols, new_rows, cols, rows, faktor)
+        timings['serialize'] = time.perf_counter() - start
+    else:
+        # V formatu v2 so nizi ničel del Huffmanovih simbolov, zato rle in serialize merimo skupaj
+        start = time.perf_counter()
+        data = serialize_binary_v2(coefficients, new_cols, new_rows, cols, rows, faktor, color_mode)
+        timings['entropy'] = time.perf_counter() - start
+
+    return data, timings
+
+
+def decode_stages(data, dct_engine):
+    timings = {}
+
+    start = time.perf_counter()
+    parsed = parse_binary(data)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image = decode_channels(parsed, dct_engine)
+    timings['decode'] = time.perf_counter() - start
+
+    return image, timings
+
+
+def best_timings(runs):
+    # Najmanjši čas čez ponovitve je najmanj občutljiv na šum sistema
+    return {stage: min(run[stage] for run in runs) for stage in runs[0]}
+
+
+def benchmark_case(name, image, faktor, version, color_mode, dct_engine, repeat, min_time=MIN_CASE_TIME):
+    """
+    Izmeri eno kombinacijo in vrne slovar z rezultati.
+    Ponavlja vsaj repeat-krat in dokler meritve skupaj ne trajajo min_time sekund (stabilnejši minimum
+    pri majhnih slikah).
+    """
+    raw_bytes = image.size
+
+    # Ogrevanje (numba prevajanje, predpomnilniki)
+    data, _ = encode_stages(image, faktor, version, color_mode, dct_engine)
+    if data != compress_image_array(image, faktor, dct_engine, version, 1, color_mode):
+        raise RuntimeError("Stage benchmark output differs from compress_image_array")
+    decoded, _ = decode_stages(data, dct_engine)
+
+    encode_runs, decode_runs = [], []
+    start = time.perf_counter()
+    while len(encode_runs) < repeat or time.perf_counter() - start < min_time:
+        encode_runs.append(encode_stages(image, faktor, version, color_mode, dct_engine)[1])
+        decode_runs.append(decode_stages(data, dct_engine)[1])
+    encode = best_timings(encode_runs)
+    decode = best_timings(decode_runs)
+    encode_total = min(sum(run.values()) for run in encode_runs)
+    decode_total = min(sum(run.values()) for run in decode_runs)
+
+    height, width = image.shape[:2]
+    return {
+        'id': f"{name}:{width}x{height}:f{faktor}:v{version}:{color_mode}",
+        'image': name,
+        'width': width,
+        'height': height,
+        'faktor': faktor,
+        'version': version,
+        'color_mode': color_mode,
+        'dct_engine': dct_engine,
+        'original_size': raw_bytes,
+        'compressed_size': len(data),
+        'compression_ratio': raw_bytes / len(data),
+        'bits_per_pixel': 8.0 * len(data) / (width * height),
+        'psnr': image_psnr(image, decoded),
+        'ssim': ssim(image, decoded),
+        'encode_seconds': encode_total,
+        'decode_seconds': decode_total,
+        'encode_mb_per_s': raw_bytes / 1e6 / encode_total,
+        'decode_mb_per_s': raw_bytes / 1e6 / decode_total,
+        'encode_stages': encode,
+        'decode_stages': decode,
+        'runs': len(encode_runs),
+        # Zgoščena vrednost izhoda - spremembo formata ali izgube pokaže že primerjava z osnovo
+        'output_sha256': hashlib.sha256(data).hexdigest(),
+        'decoded_sha256': hashlib.sha256(decoded.tobytes()).hexdigest()
+    }
+
+
+def run_benchmark(images, faktors, versions, color_modes, dct_engine=DEFAULT_DCT_ENGINE, repeat=5,
+                  min_time=MIN_CASE_TIME):
+    results = []
+    for name, image in images:
+        for version in versions:
+            for color_mode in color_modes:
+                if version == 1 and color_mode != 'bgr':
+                    continue
+                for faktor in faktors:
+                    result = benchmark_case(name, image, faktor, version, color_mode, dct_engine, repeat, min_time)
+                    print(f"{result['id']:<48} {result['encode_mb_per_s']:8.2f} MB/s enc "
+                          f"{result['decode_mb_per_s']:8.2f} MB/s dec  ratio {result['compression_ratio']:7.2f}  "
+                          f"PSNR {result['psnr']:6.2f}  SSIM {result['ssim']:.4f}", file=sys.stderr)
+                    results.append(result)
+    return results
+
+
+def environment_info():
+    import numba
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'numba': numba.__version__
+    }
+
+
+def compare_results(results, baseline, time_tolerance=0.2, psnr_tolerance=0.01, size_tolerance=0.0,
+                    time_floor=TIME_FLOOR):
+    """
+    Primerja rezultate z osnovo. Vrne seznam regresij (opisi) in seznam opomb.
+
+    Regresija je: počasnejše kodiranje/dekodiranje za več kot time_tolerance (relativno) in hkrati
+    za več kot time_floor sekund (time_tolerance=None: časi se ne primerjajo),
+    nižji PSNR za več kot psnr_tolerance (dB) ali večja datoteka za več kot size_tolerance (relativno).
+    Spremenjen izhod ob nespremenjeni kakovosti in velikosti je le opomba.
+    """
+    baseline_cases = {case['id']: case for case in baseline['results']}
+    regressions, notes = [], []
+
+    for case in results:
+        base = baseline_cases.get(case['id'])
+        if base is None:
+            notes.append(f"{case['id']}: not in baseline")
+            continue
+
+        for key in ('encode_seconds', 'decode_seconds'):
+            if time_tolerance is None:
+                break
+            if case[key] > base[key] * (1.0 + time_tolerance) and case[key] - base[key] > time_floor:
+                regressions.append(f"{case['id']}: {key} {base[key] * 1e3:.2f} ms -> {case[key] * 1e3:.2f} ms")
+        if case['psnr'] < base['psnr'] - psnr_tolerance:
+            regressions.append(f"{case['id']}: psnr {base['psnr']:.3f} -> {case['psnr']:.3f} dB")
+        if case['compressed_size'] > base['compressed_size'] * (1.0 + size_tolerance):
+            regressions.append(f"{case['id']}: compressed_size {base['compressed_size']} -> {case['compressed_size']}")
+        if case['output_sha256'] != base['output_sha256']:
+            notes.append(f"{case['id']}: compressed output changed")
+        if case['decoded_sha256'] != base['decoded_sha256']:
+            notes.append(f"{case['id']}: decoded image changed")
+
+    missing = set(baseline_cases) - {case['id'] for case in results}
+    notes.extend(f"{case_id}: missing from results" for case_id in sorted(missing))
+    return regressions, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DCT image codec")
+    parser.add_argument('--images', nargs='*', default=[], help="Reference image files or directories")
+    parser.add_argument('--sizes', nargs='*', type=int,
+                        help=f"Edge lengths of synthetic square images (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument('--faktors', nargs='*', type=int, default=list(DEFAULT_FAKTORS))
+    parser.add_argument('--versions', nargs='*', type=int, default=[1, 2], choices=[1, 2])
+    parser.add_argument('--color-modes', nargs='*', default=['bgr', 'ycbcr420'], choices=COLOR_MODES)
+    parser.add_argument('--dct-engine', default=DEFAULT_DCT_ENGINE, choices=sorted(DCT_ENGINES))
+    parser.add_argument('--repeat', type=int, default=5, help="Timed repetitions per case (best is reported)")
+    parser.add_argument('--min-time', type=float, default=MIN_CASE_TIME,
+                        help="Keep repeating each case until its runs take this many seconds")
+    parser.add_argument('--output', help="Write results JSON to this file (default: stdout)")
+    parser.add_argument('--save-baseline', help="Also write results JSON as a baseline file")
+    parser.add_argument('--baseline', help="Compare against a baseline JSON file")
+    parser.add_argument('--reference', action='store_true',
+                        help="Benchmark the committed reference set and compare with its baseline")
+    parser.add_argument('--time-tolerance', type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument('--time-floor', type=float, default=TIME_FLOOR,
+                        help="Ignore slowdowns smaller than this many seconds")
+    parser.add_argument('--ignore-time', action='store_true',
+                        help="Compare only size, quality and output (baseline measured on another machine)")
+    parser.add_argument('--psnr-tolerance', type=float, default=0.01, help="Allowed PSNR drop in dB")
+    parser.add_argument('--size-tolerance', type=float, default=0.0, help="Allowed relative size increase")
+    args = parser.parse_args()
+
+    sizes = args.sizes
+    if args.reference:
+        args.images = [REFERENCE_IMAGES] + args.images
+        sizes = REFERENCE_SIZES if sizes is None else sizes
+        if not args.baseline and not args.save_baseline:
+            args.baseline = REFERENCE_BASELINE
+    images = load_images(args.images, DEFAULT_SIZES if sizes is None else sizes)
+    results = run_benchmark(images, args.faktors, args.versions, args.color_modes, args.dct_engine,
+                            max(1, args.repeat), args.min_time)
+    report = {'environment': environment_info(), 'results': results}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Časi osnove z drugega računalnika (ali druge verzije knjižnic) niso primerljivi
+        same_environment = all(baseline.get('environment', {}).get(key) == report['environment'][key]
+                               for key in TIME_ENVIRONMENT_KEYS)
+        compare_time = not args.ignore_time and same_environment
+        regressions, notes = compare_results(results, baseline, args.time_tolerance if compare_time else None,
+                                             args.psnr_tolerance, args.size_tolerance, args.time_floor)
+        if not same_environment and not args.ignore_time:
+            notes.append("baseline was measured in a different environment, timings not compared")
+        for note in notes:
+            print(f"note: {note}", file=sys.stderr)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} ({len(results)} cases)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Dolgo živeči strežnik za kompresijo in dekompresijo profilnih slik
+Namesto zagona novega Python procesa za vsako zahtevo (PythonShell.run) se
+cv2/numpy/numba naložijo enkrat, zahteve pa obdeluje bazen delavcev.
+
+Protokol (stdin/stdout ali Unix socket), vsa števila so little-endian:
+    zahteva: request_id (uint32), op (uint8), dolžina opcij (uint16), dolžina podatkov (uint32),
+             opcije (JSON, UTF-8), podatki (surovi bytes)
+    odgovor: request_id (uint32), status (uint8), dolžina meta (uint16), dolžina podatkov (uint32),
+             meta (JSON, UTF-8), podatki (surovi bytes)
+Status 0 pomeni uspeh, pri statusu 1 meta vsebuje {"error": "..."}.
+Odgovori se lahko vrnejo v drugačnem vrstnem redu kot zahteve.
+
+Predpomnilnik dekodiranih slik je en sam, v glavnem procesu strežnika: zahteva za dekompresijo
+se najprej poišče v njem in le ob zgrešitvi pošlje delavcu, rezultat pa se shrani ob odgovoru.
+Poraba pomnilnika zato ni odvisna od --workers (PROFILE_IMAGE_CACHE_BYTES velja za celoten strežnik),
+ista slika pa se ne dekodira znova glede na to, kateri delavec prevzame zahtevo.
+"""
+import sys
+import os
+import json
+import struct
+import argparse
+import threading
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+from utils.decoded_image_cache import cache_from_environment, make_cache_key
+
+FRAME_HEADER = struct.Struct('<IBHI')
+
+OP_PING = 0
+OP_COMPRESS = 1
+OP_DECOMPRESS = 2
+OP_STATS = 3
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def _compress(options, data):
+    from compress_profile_image import (load_profile_image, encode_profile_image, PROFILE_COLOR_MODE,
+                                        PROFILE_MAX_EDGE, PROFILE_SQUARE_CROP)
+
+    image, image_info = load_profile_image(options.get('path'), data if data else None,
+                                           max_edge=int(options.get('max_edge', PROFILE_MAX_EDGE)),
+                                           square=bool(options.get('square', PROFILE_SQUARE_CROP)))
+    if image is None:
+        raise ValueError("Could not read image file")
+    target_bytes = options.get('target_bytes')
+    min_psnr = options.get('min_psnr')
+    compressed_data, info = encode_profile_image(
+        image,
+        faktor=int(options.get('faktor', 10)),
+        color_mode=options.get('color_mode', PROFILE_COLOR_MODE),
+        target_bytes=int(target_bytes) if target_bytes is not None else None,
+        min_psnr=float(min_psnr) if min_psnr is not None else None
+    )
+    meta = {
+        "original_size": image_info["source_width"] * image_info["source_height"] * 3,
+        "compressed_size": len(compressed_data),
+        **image_info,
+        **info
+    }
+    return meta, compressed_data
+
+
+def _decompress(options, data):
+    from decompress_profile_image import decode_profile_image
+
+    image_format = options.get('format', 'png')
+    image_bytes = decode_profile_image(data, image_format, options.get('quality'), int(options.get('scale', 1)))
+    return {"format": image_format}, image_bytes
+
+
+HANDLERS = {
+    OP_PING: lambda options, data: ({"pid": os.getpid()}, b''),
+    OP_COMPRESS: _compress,
+    OP_DECOMPRESS: _decompress,
+}
+
+
+def _decompress_cache_key(options, data):
+    # Enak ključ kot v decode_profile_image; ob neveljavnih opcijah None (napako vrne delavec)
+    try:
+        return make_cache_key(data, image_format=options.get('format', 'png'), quality=options.get('quality'),
+                              scale=int(options.get('scale', 1)))
+    except (TypeError, ValueError):
+        return None
+
+
+def handle_request(op, options, data):
+    """
+    Izvede eno zahtevo v delavcu. Vrne (status, meta, podatki).
+    """
+    try:
+        handler = HANDLERS.get(op)
+        if handler is None:
+            raise ValueError(f"Unknown operation: {op}")
+        meta, result = handler(options, data)
+        return STATUS_OK, meta, result
+    except Exception as e:
+        return STATUS_ERROR, {"error": str(e)}, b''
+
+
+def _warm_up():
+    # Uvozi in prevede (numba) kodek v delavcu, preden pride prva zahteva
+    import compress_profile_image  # noqa: F401
+    import decompress_profile_image  # noqa: F401
+    return os.getpid()
+
+
+def read_exact(stream, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def write_frame(stream, lock, request_id, status, meta, data):
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    with lock:
+        stream.write(FRAME_HEADER.pack(request_id, status, len(meta_bytes), len(data)))
+        stream.write(meta_bytes)
+        stream.write(data)
+        stream.flush()
+
+
+def serve_stream(reader, writer, pool, cache=None):
+    """
+    Bere zahteve iz reader do EOF in jih pošilja v bazen delavcev.
+    Odgovori se zapišejo v writer takoj, ko je posamezna zahteva končana.
+    Dekompresija se najprej poišče v cache (DecodedImageCache glavnega procesa ali None).
+    """
+    lock = threading.Lock()
+    pending = []
+
+    while True:
+        header = read_exact(reader, FRAME_HEADER.size)
+        if header is None:
+            break
+        request_id, op, options_length, data_length = FRAME_HEADER.unpack(header)
+        options_bytes = read_exact(reader, options_length)
+        data = read_exact(reader, data_length)
+        if options_bytes is None or data is None:
+            break
+
+        try:
+            options = json.loads(options_bytes.decode('utf-8')) if options_bytes else {}
+        except ValueError as e:
+            write_frame(writer, lock, request_id, STATUS_ERROR, {"error": str(e)}, b'')
+            continue
+
+        if op == OP_STATS:
+            stats = cache.stats() if cache is not None else None
+            write_frame(writer, lock, request_id, STATUS_OK, {"pid": os.getpid(), "cache": stats}, b'')
+            continue
+
+        key = _decompress_cache_key(options, data) if op == OP_DECOMPRESS and cache is not None else None
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                write_frame(writer, lock, request_id, STATUS_OK, {"format": options.get('format', 'png')}, cached)
+                continue
+
+        future = pool.submit(handle_request, op, options, data)
+
+        def done(f, request_id=request_id, key=key):
+            try:
+                status, meta, result = f.result()
+            except Exception as e:
+                status, meta, result = STATUS_ERROR, {"error": str(e)}, b''
+            if key is not None and status == STATUS_OK:
+                cache.put(key, result)
+            try:
+                write_frame(writer, lock, request_id, status, meta, result)
+            except (BrokenPipeError, OSError):
+                pass
+
+        future.add_done_callback(done)
+        pending.append(future)
+        pending = [f for f in pending if not f.done()]
+
+    for f in pending:
+        try:
+            f.result()
+        except Exception:
+            pass
+
+
+def serve_unix_socket(socket_path, pool, cache=None):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_stream(self.rfile, self.wfile, pool, cache)
+
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        server.daemon_threads = True
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codec server for DCT profile images")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('CODEC_WORKERS', 2)),
+                        help="Number of worker processes")
+    parser.add_argument('--socket', help="Listen on a Unix socket instead of stdin/stdout")
+    args = parser.parse_args()
+
+    # Protokol uporablja kopijo stdout, stdout procesa (in delavcev) pa preusmerimo na stderr,
+    # da naključni izpisi knjižnic ne pokvarijo okvirjev
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for f in [pool.submit(_warm_up) for _ in range(max(1, args.workers))]:
+            f.result()
+
+        cache = cache_from_environment()
+        if args.socket:
+            serve_unix_socket(args.socket, pool, cache)
+        else:
+            serve_stream(sys.stdin.buffer, protocol_out, pool, cache)
+
+
+if __name__ == "__main__":
+    main()
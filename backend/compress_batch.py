@@ -0,0 +1,235 @@
+"""
+Paketna kompresija slik z DCT (npr. ponovno kodiranje obstoječih profilnih slik)
+Slike iz mape ali seznama poti se kodirajo vzporedno v omejenem bazenu procesov,
+za vsako sliko se takoj, ko je končana, izpiše ena vrstica JSON (JSON lines) na stdout.
+V obdelavi je največ 2 x število delavcev slik, zato poraba pomnilnika ni odvisna od velikosti paketa
+(zasedene izhodne poti se hranijo le za nekaj zadnjih izhodnih map, glej OutputClaims).
+
+Uporaba:
+    compress_batch.py <mapa> [--recursive] [--output-dir OUT] [--faktor F] [--workers N]
+    compress_batch.py --list paths.txt [--output-dir OUT [--base-dir DIR]] ...
+        seznam poti, ena na vrstico ('-' za stdin); izhod zrcali poti glede na DIR,
+        brez --base-dir pa celotno absolutno pot pod OUT (npr. OUT/home/user/photo.dct)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp', '.tif', '.tiff')
+
+# Število izhodnih map, za katere se hranijo zasedene poti
+CLAIMED_DIRECTORIES = 64
+
+
+def iter_directory(directory, recursive=False):
+    # Generator - poti se ne zbirajo v seznam
+    if recursive:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+    else:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                yield path
+
+
+def iter_list(list_path):
+    stream = sys.stdin if list_path == '-' else open(list_path)
+    try:
+        for line in stream:
+            path = line.strip()
+            if path:
+                yield path
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def output_path_for(image_path, base_dir, output_dir):
+    # Ohrani relativno strukturo map glede na vhodno mapo (brez nje celotno absolutno pot), končnica .dct
+    if base_dir:
+        relative = os.path.relpath(os.path.abspath(image_path), os.path.abspath(base_dir))
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            raise ValueError(f"Image is outside the base directory {base_dir}")
+    else:
+        relative = os.path.splitdrive(os.path.abspath(image_path))[1].lstrip(os.sep)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + '.dct')
+
+
+class OutputClaims:
+    """
+    Izhodne poti, ki so v paketu že dodeljene (npr. photo.jpg in photo.png v isti mapi - druga slika
+    se ne zapiše čez prvo). Do trka pride le med slikami iz iste mape, te pa si pri iter_directory
+    sledijo, zato se hranijo le poti zadnjih max_directories izhodnih map; pri --list so trki
+    zaznani, če so slike iste mape v seznamu blizu skupaj (npr. izpis find).
+    """
+
+    def __init__(self, max_directories=CLAIMED_DIRECTORIES):
+        self.max_directories = max_directories
+        self._directories = OrderedDict()
+
+    def claim(self, output_path, image_path):
+        """
+        Dodeli output_path sliki image_path. Vrne None ali pot slike, ki ji je izhod že dodeljen.
+        """
+        directory, name = os.path.split(output_path)
+        names = self._directories.pop(directory, None)
+        if names is None:
+            names = {}
+        self._directories[directory] = names
+        while len(self._directories) > self.max_directories:
+            self._directories.popitem(last=False)
+        owner = names.get(name)
+        if owner is None:
+            names[name] = image_path
+        return owner
+
+
+def compress_one(image_path, output_path, options):
+    """
+    Kodira eno sliko v delavcu. Vrne slovar za vrstico JSON (tudi ob napaki).
+    """
+    from compress_profile_image import load_profile_image, encode_profile_image
+
+    start = time.perf_counter()
+    result = {"path": image_path}
+    try:
+        image, image_info = load_profile_image(image_path, max_edge=options['max_edge'], square=options['square'])
+        if image is None:
+            raise ValueError("Could not read image file")
+
+        compressed_data, info = encode_profile_image(image, options['faktor'], options['color_mode'],
+                                                     options['target_bytes'], options['min_psnr'])
+        original_size = image_info["source_width"] * image_info["source_height"] * 3
+
+        if output_path:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed_data)
+            os.replace(tmp_path, output_path)
+            result["output"] = output_path
+
+        result.update({
+            "success": True,
+            **image_info,
+            "input_size": os.path.getsize(image_path),
+            "original_size": original_size,
+            "compressed_size": len(compressed_data),
+            "ratio": original_size / len(compressed_data),
+            **info
+        })
+    except Exception as e:
+        result.update({"success": False, "error": str(e)})
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(paths, base_dir, output_dir, options, workers, skip_existing=False, out=sys.stdout):
+    """
+    Kodira slike iz iteratorja paths in sproti izpisuje rezultate. Vrne (uspešne, neuspešne).
+    """
+    succeeded = failed = 0
+    max_pending = max(1, workers) * 2
+
+    def emit(result):
+        nonlocal succeeded, failed
+        if result.get("success"):
+            succeeded += 1
+        elif not result.get("skipped"):
+            failed += 1
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    claims = OutputClaims()
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = set()
+        for image_path in paths:
+            try:
+                output_path = output_path_for(image_path, base_dir, output_dir) if output_dir else None
+            except ValueError as e:
+                emit({"path": image_path, "success": False, "error": str(e)})
+                continue
+            if output_path:
+                owner = claims.claim(output_path, image_path)
+                if owner is not None:
+                    emit({"path": image_path, "output": output_path, "success": False,
+                          "error": f"Output path already used by {owner}"})
+                    continue
+            if skip_existing and output_path and os.path.exists(output_path):
+                emit({"path": image_path, "output": output_path, "skipped": True})
+                continue
+
+            # Omeji število slik v obdelavi, da se poti ne berejo hitreje, kot jih delavci obdelajo
+            while len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+            pending.add(pool.submit(compress_one, image_path, output_path, options))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                emit(future.result())
+
+    return succeeded, failed
+
+
+def main():
+    from utils.image_compression_dct import COLOR_MODES
+    from compress_profile_image import PROFILE_COLOR_MODE
+
+    parser = argparse.ArgumentParser(description="Compress a directory or list of images with the DCT codec")
+    parser.add_argument('directory', nargs='?', help="Directory with images")
+    parser.add_argument('--list', help="File with one image path per line ('-' for stdin)")
+    parser.add_argument('--recursive', action='store_true', help="Include subdirectories")
+    parser.add_argument('--output-dir', help="Write .dct files here (default: only report results)")
+    parser.add_argument('--base-dir', help="With --list: mirror paths relative to this directory "
+                                           "(default: mirror the absolute input paths)")
+    parser.add_argument('--skip-existing', action='store_true', help="Skip images whose .dct output exists")
+    parser.add_argument('--faktor', type=int, default=10, help="Compression factor (1-15)")
+    parser.add_argument('--color-mode', default=PROFILE_COLOR_MODE, choices=COLOR_MODES)
+    parser.add_argument('--target-bytes', type=int, help="Pick the best quality that fits in this many bytes")
+    parser.add_argument('--min-psnr', type=float, help="Pick the smallest output with at least this PSNR (dB)")
+    parser.add_argument('--max-edge', type=int, default=0,
+                        help="Downscale so the longer edge is at most this many pixels (0 = keep size)")
+    parser.add_argument('--square', action='store_true', help="Center-crop to a square before downscaling")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if bool(args.directory) == bool(args.list):
+        parser.error("give either a directory or --list")
+    if args.base_dir and not args.list:
+        parser.error("--base-dir only applies to --list")
+
+    if args.directory:
+        paths = iter_directory(args.directory, args.recursive)
+        base_dir = args.directory
+    else:
+        paths = iter_list(args.list)
+        base_dir = args.base_dir
+
+    options = {
+        'faktor': args.faktor,
+        'color_mode': args.color_mode,
+        'target_bytes': args.target_bytes,
+        'min_psnr': args.min_psnr,
+        'max_edge': args.max_edge,
+        'square': args.square
+    }
+    start = time.perf_counter()
+    succeeded, failed = run_batch(paths, base_dir, args.output_dir, options, args.workers, args.skip_existing)
+    print(f"{succeeded} compressed, {failed} failed in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
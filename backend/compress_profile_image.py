@@ -1,41 +1,245 @@
 """
 Kompresija profilne slike z DCT
 Uporablja se za kompresijo profilnih slik uporabnikov
+
+Uporaba:
+    compress_profile_image.py <image_path> [faktor]                      JSON z base64 podatki na stdout
+    compress_profile_image.py --raw [image_path] [--input PATH | --fd N]  surova slika iz datoteke/stdin,
+        [--faktor F] [--color-mode MODE]                                 surovi .dct bytes na stdout
+        [--target-bytes N] [--min-psnr DB]                               faktor se izbere samodejno
+        [--max-edge PX] [--square]                                       pomanjšanje/izrez pred kodiranjem
 """
+import io
+import os
 import sys
 import json
+import argparse
 import cv2
 import numpy as np
 import base64
-from utils.image_compression_dct import compress_image_array
+from utils.image_compression_dct import compress_image_array, compress_image_array_to_target, COLOR_MODES
+from decompress_profile_image import read_raw_input
+
+# Profilne slike: YCbCr s 4:2:0 podvzorčenjem barve (kot JPEG) - manjše datoteke pri enaki zaznani kakovosti
+PROFILE_COLOR_MODE = 'ycbcr420'
+
+# Največja stranica profilne slike pred kodiranjem (0 = brez omejitve) in neobvezen izrez na kvadrat
+# PROFILE_IMAGE_MAX_EDGE, PROFILE_IMAGE_SQUARE=1 - slike z mobitela imajo lahko 12 MP, prikazujejo pa se majhne
+PROFILE_MAX_EDGE = int(os.environ.get('PROFILE_IMAGE_MAX_EDGE', 512))
+PROFILE_SQUARE_CROP = os.environ.get('PROFILE_IMAGE_SQUARE', '').lower() in ('1', 'true', 'yes')
+
+# Branje v zmanjšani ločljivosti (pri JPEG dekoder preskoči visoke frekvence, zato je bistveno hitreje)
+REDUCED_READ_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Stranica v glavi, večja od tega, je skoraj gotovo pokvarjena glava (JPEG sicer dovoli do 65535)
+MAX_SNIFFED_EDGE = 1 << 16
+# Največ segmentov pred SOF (EXIF, ICC, ...); pri pokvarjenih podatkih se sprehod ne sme vleči
+MAX_JPEG_SEGMENTS = 256
+
+def _stream_size(stream):
+    position = stream.tell()
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(position)
+    return size
+
+def _sane_size(width, height):
+    if 0 < width <= MAX_SNIFFED_EDGE and 0 < height <= MAX_SNIFFED_EDGE:
+        return width, height
+    return None
+
+def sniff_image_size(stream):
+    # Prebere (širina, višina) iz glave PNG ali JPEG brez dekodiranja slike
+    # None, če format ni prepoznan ali glava ni veljavna (segment sega čez konec, nesmiselne mere ...)
+    header = stream.read(24)
+    if header[:8] == b'\x89PNG\r\n\x1a\n':
+        # Prvi blok mora biti IHDR dolžine 13
+        if len(header) < 24 or header[8:16] != b'\x00\x00\x00\x0dIHDR':
+            return None
+        return _sane_size(int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big'))
+    if header[:2] != b'\xff\xd8':
+        return None
+    
+    # JPEG: sprehod po segmentih do SOF (podatki EXIF so lahko pred njim)
+    end = _stream_size(stream)
+    stream.seek(2)
+    for _ in range(MAX_JPEG_SEGMENTS):
+        # Vsak segment se začne z 0xFF (lahko več zapolnitvenih 0xFF pred oznako)
+        if stream.read(1) != b'\xff':
+            return None
+        byte = stream.read(1)
+        while byte == b'\xff':
+            byte = stream.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x00 or marker == 0xD9 or marker == 0xDA:
+            # Vrinjeni 0x00, konec slike ali začetek podatkov pred SOF - glava ni veljavna
+            return None
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        length_bytes = stream.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = int.from_bytes(length_bytes, 'big')
+        # Dolžina vključuje sama sebe in segment mora biti v celoti v podatkih
+        if length < 2 or stream.tell() + length - 2 > end:
+            return None
+        if marker in JPEG_SOF_MARKERS:
+            # SOF: natančnost (1), višina (2), širina (2), število komponent (1), nato 3 bajti na komponento
+            if length < 8:
+                return None
+            sof = stream.read(6)
+            if len(sof) < 6 or sof[5] == 0 or length != 8 + 3 * sof[5]:
+                return None
+            return _sane_size(int.from_bytes(sof[3:5], 'big'), int.from_bytes(sof[1:3], 'big'))
+        stream.seek(length - 2, io.SEEK_CUR)
+    return None
+
+def reduced_read_flag(size, max_edge, square=False):
+    # Največje zmanjšanje, pri katerem ostane (krajša pri izrezu na kvadrat) stranica vsaj max_edge
+    if not size or not max_edge:
+        return cv2.IMREAD_COLOR
+    edge = min(size) if square else max(size)
+    for factor, flag in REDUCED_READ_FLAGS:
+        if edge // factor >= max_edge:
+            return flag
+    return cv2.IMREAD_COLOR
+
+def reduced_size_matches(size, image, flags):
+    # Dekoder zaokroži zmanjšane mere navzgor (JPEG) ali navzdol (ostali formati)
+    factor = next(factor for factor, flag in REDUCED_READ_FLAGS if flag == flags)
+    width, height = size
+    return (width // factor <= image.shape[1] <= -(-width // factor) and
+            height // factor <= image.shape[0] <= -(-height // factor))
 
-def compress_profile_image(image_path, faktor=10):
+def fit_profile_image(image, max_edge=None, square=False):
+    # Izrez na sredinski kvadrat in pomanjšanje (INTER_AREA) na največjo stranico max_edge
+    if square:
+        rows, cols = image.shape[:2]
+        edge = min(rows, cols)
+        top, left = (rows - edge) // 2, (cols - edge) // 2
+        image = image[top:top + edge, left:left + edge]
+    if max_edge:
+        rows, cols = image.shape[:2]
+        if max(rows, cols) > max_edge:
+            ratio = max_edge / max(rows, cols)
+            size = (max(1, round(cols * ratio)), max(1, round(rows * ratio)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(image)
+
+def read_profile_image(image_path=None, image_data=None, flags=cv2.IMREAD_COLOR):
+    # Preberi sliko iz datoteke ali iz bytes (npr. iz codec strežnika ali stdin)
+    if image_data is not None:
+        return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), flags)
+    return cv2.imread(image_path, flags)
+
+def load_profile_image(image_path=None, image_data=None, max_edge=PROFILE_MAX_EDGE, square=PROFILE_SQUARE_CROP):
+    # Prebere sliko (po možnosti v zmanjšani ločljivosti) in jo pripravi za kodiranje
+    # Vrne (slika, info) ali (None, None), če slike ni mogoče prebrati
+    try:
+        if image_data is not None:
+            source_size = sniff_image_size(io.BytesIO(image_data))
+        else:
+            with open(image_path, 'rb') as f:
+                source_size = sniff_image_size(f)
+    except OSError:
+        source_size = None
+    
+    flags = reduced_read_flag(source_size, max_edge, square)
+    image = read_profile_image(image_path, image_data, flags)
+    if image is not None and flags != cv2.IMREAD_COLOR and not reduced_size_matches(source_size, image, flags):
+        # Glava se ne ujema s sliko (npr. prirejen SOF): zmanjšanje je bilo izbrano napačno, beri celo sliko
+        source_size = None
+        image = read_profile_image(image_path, image_data)
+    if image is None:
+        return None, None
+    if source_size is None:
+        source_size = (image.shape[1], image.shape[0])
+    
+    image = fit_profile_image(image, max_edge, square)
+    return image, {
+        "source_width": source_size[0],
+        "source_height": source_size[1],
+        "width": image.shape[1],
+        "height": image.shape[0]
+    }
+
+def encode_profile_image(image, faktor=10, color_mode=PROFILE_COLOR_MODE, target_bytes=None, min_psnr=None):
+    # Z omejitvijo velikosti ali kakovosti se faktor izbere samodejno, sicer se uporabi podani faktor
+    if target_bytes is None and min_psnr is None:
+        return compress_image_array(image, faktor=faktor, color_mode=color_mode), {"faktor": faktor}
+    compressed_data, info = compress_image_array_to_target(image, target_bytes=target_bytes, min_psnr=min_psnr,
+                                                           color_mode=color_mode)
+    return compressed_data, {"faktor": info['faktor'], "psnr": info['psnr'], "target_met": info['met']}
+
+def compress_profile_image(image_path, faktor=10, color_mode=PROFILE_COLOR_MODE, target_bytes=None, min_psnr=None,
+                           max_edge=PROFILE_MAX_EDGE, square=PROFILE_SQUARE_CROP):
     try:
-        # Preberi sliko
-        image = cv2.imread(image_path)
+        # Preberi sliko (pomanjšano na max_edge, po želji izrezano na kvadrat)
+        image, image_info = load_profile_image(image_path, max_edge=max_edge, square=square)
         if image is None:
             return {"error": "Could not read image file"}
         
         # Kompresiraj sliko
-        compressed_data = compress_image_array(image, faktor=faktor)
+        compressed_data, info = encode_profile_image(image, faktor, color_mode, target_bytes, min_psnr)
         compressed_base64 = base64.b64encode(compressed_data).decode('utf-8')
         
         return {
             "success": True,
             "compressed_data": compressed_base64,
-            "original_size": image.shape[0] * image.shape[1] * 3,
-            "compressed_size": len(compressed_data)
+            "original_size": image_info["source_width"] * image_info["source_height"] * 3,
+            "compressed_size": len(compressed_data),
+            **image_info,
+            **info
         }
     except Exception as e:
         return {"error": str(e)}
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Compress a profile image with DCT")
+    parser.add_argument('image_path', nargs='?')
+    parser.add_argument('faktor_arg', nargs='?', type=int, metavar='faktor')
+    parser.add_argument('--faktor', type=int, help="Compression factor (1-15)")
+    parser.add_argument('--raw', action='store_true', help="Write raw compressed bytes instead of JSON")
+    parser.add_argument('--input', help="Input file for --raw mode ('-' for stdin)")
+    parser.add_argument('--fd', type=int, help="Input file descriptor for --raw mode")
+    parser.add_argument('--color-mode', default=PROFILE_COLOR_MODE, choices=COLOR_MODES,
+                        help="Color space and chroma subsampling")
+    parser.add_argument('--target-bytes', type=int, help="Pick the best quality that fits in this many bytes")
+    parser.add_argument('--min-psnr', type=float, help="Pick the smallest output with at least this PSNR (dB)")
+    parser.add_argument('--max-edge', type=int, default=PROFILE_MAX_EDGE,
+                        help="Downscale so the longer edge is at most this many pixels (0 = keep size)")
+    parser.add_argument('--square', action='store_true', default=PROFILE_SQUARE_CROP,
+                        help="Center-crop to a square before downscaling")
+    args = parser.parse_args()
+    faktor = args.faktor or args.faktor_arg or 10
+    
+    if args.raw:
+        try:
+            if args.image_path:
+                image, _ = load_profile_image(args.image_path, max_edge=args.max_edge, square=args.square)
+            else:
+                image, _ = load_profile_image(image_data=read_raw_input(args.input, args.fd),
+                                              max_edge=args.max_edge, square=args.square)
+            if image is None:
+                raise ValueError("Could not read image file")
+            compressed_data, _ = encode_profile_image(image, faktor, args.color_mode, args.target_bytes,
+                                                      args.min_psnr)
+        except Exception as e:
+            print(json.dumps({"error": str(e)}), file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.buffer.write(compressed_data)
+        sys.stdout.buffer.flush()
+        sys.exit(0)
+    
+    if not args.image_path:
         print(json.dumps({"error": "Image path required"}))
         sys.exit(1)
     
-    image_path = sys.argv[1]
-    faktor = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-    
-    result = compress_profile_image(image_path, faktor)
+    result = compress_profile_image(args.image_path, faktor, args.color_mode, args.target_bytes, args.min_psnr,
+                                    args.max_edge, args.square)
     print(json.dumps(result))
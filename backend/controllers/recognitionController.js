@@ -56,7 +56,7 @@ const processVideo = (req, res) => {
     mode: 'text',
     pythonOptions: ['-u'],
     scriptPath: path.dirname(dataSetScriptPath),
-    args: [videoPath, username]
+    args: [videoPath, username, '--shard']
   };
 
   // Running dataSet.py
@@ -84,7 +84,8 @@ const processVideo = (req, res) => {
         mode: 'text',
         pythonOptions: ['-u'],
         scriptPath: path.dirname(learnScriptPath),
-        args: [username] 
+        // FACE_VERIFICATION_MODE=index: only store templates in the shared index, no per-user model
+        args: process.env.FACE_VERIFICATION_MODE === 'index' ? [username, '--index-only'] : [username]
       };
       
       // Running learn.py
@@ -1,10 +1,13 @@
 const User = require('../models/User');
 const { Expo } = require('expo-server-sdk');
 const axios = require('axios');
-const { PythonShell } = require('python-shell');
 const path = require('path');
 const fs = require('fs');
 const multer = require('multer');
+const codecClient = require('../utils/codecClient');
+
+// Največja velikost kompresirane profilne slike (bytes), ki se shrani v bazo
+const profilePhotoMaxBytes = parseInt(process.env.PROFILE_PHOTO_MAX_BYTES, 10) || 64 * 1024;
 
 let expo = new Expo();
 
@@ -342,42 +345,24 @@ exports.uploadProfilePhoto = async (req, res) => {
             return res.status(404).json({ message: 'User not found' });
         }
 
-        // Kompresiraj sliko z Python skripto
-        const compressScriptPath = path.join(__dirname, '../compress_profile_image.py');
-        const compressOptions = {
-            mode: 'text',
-            pythonOptions: ['-u'],
-            scriptPath: path.dirname(compressScriptPath),
-            args: [imagePath, '10'] // faktor 10 za dobro kakovost
-        };
-
-        const compressResults = await PythonShell.run('compress_profile_image.py', compressOptions);
-        
-        // Parse rezultat
+        // Kompresiraj sliko s codec strežnikom (faktor 10 za dobro kakovost); če je rezultat večji od
+        // omejitve, se faktor izbere samodejno, da velikost dokumenta v bazi ostane omejena
         let compressResult;
         try {
-            const lastMessage = compressResults[compressResults.length - 1];
-            compressResult = JSON.parse(lastMessage);
-        } catch (parseError) {
-            console.error('Error parsing compression result:', parseError);
-            fs.unlink(imagePath, (err) => {
-                if (err) console.error('Error deleting file:', err);
-            });
-            return res.status(500).json({ message: 'Error compressing image' });
-        }
-
-        if (compressResult.error) {
+            compressResult = await codecClient.compressImage(imagePath, { faktor: 10 });
+            if (compressResult.compressedSize > profilePhotoMaxBytes) {
+                compressResult = await codecClient.compressImage(imagePath, { targetBytes: profilePhotoMaxBytes });
+            }
+        } catch (compressError) {
+            console.error('Error compressing image:', compressError);
             fs.unlink(imagePath, (err) => {
                 if (err) console.error('Error deleting file:', err);
             });
-            return res.status(500).json({ message: compressResult.error });
+            return res.status(500).json({ message: compressError.message || 'Error compressing image' });
         }
 
-        // Pretvori base64 v Buffer za shranjevanje v bazi
-        const compressedBuffer = Buffer.from(compressResult.compressed_data, 'base64');
-
         // Shrani v bazo
-        user.profilePhotoData = compressedBuffer;
+        user.profilePhotoData = compressResult.compressedData;
         user.profilePhotoCompressed = true;
         await user.save();
 
@@ -388,8 +373,8 @@ exports.uploadProfilePhoto = async (req, res) => {
 
         res.status(200).json({ 
             message: 'Profile photo uploaded successfully',
-            compressed_size: compressResult.compressed_size,
-            original_size: compressResult.original_size
+            compressed_size: compressResult.compressedSize,
+            original_size: compressResult.originalSize
         });
     } catch (error) {
         console.error('Error uploading profile photo:', error);
@@ -405,6 +390,12 @@ exports.uploadProfilePhoto = async (req, res) => {
     }
 };
 
+const profilePhotoFormats = {
+    png: 'image/png',
+    jpeg: 'image/jpeg',
+    webp: 'image/webp'
+};
+
 // Get profile photo
 exports.getProfilePhoto = async (req, res) => {
     try {
@@ -419,38 +410,43 @@ exports.getProfilePhoto = async (req, res) => {
             return res.status(404).json({ message: 'Profile photo not found' });
         }
 
-        // Pretvori Buffer v base64
-        const compressedBase64 = user.profilePhotoData.toString('base64');
-
-        // Dekompresiraj z Python skripto
-        const decompressScriptPath = path.join(__dirname, '../decompress_profile_image.py');
-        const decompressOptions = {
-            mode: 'text',
-            pythonOptions: ['-u'],
-            scriptPath: path.dirname(decompressScriptPath),
-            args: [compressedBase64]
-        };
+        // Izhodni format (png, jpeg, webp), kakovost in pomanjšava iz query parametrov
+        const format = req.query.format || 'png';
+        if (!profilePhotoFormats[format]) {
+            return res.status(400).json({ message: `Unsupported image format: ${format}` });
+        }
+        const decompressOptions = { format };
+        if (req.query.quality) {
+            decompressOptions.quality = parseInt(req.query.quality, 10);
+        }
+        // ?scale=2|4|8 dekodira neposredno v zmanjšani ločljivosti (sličice za sezname)
+        if (req.query.scale) {
+            const scale = parseInt(req.query.scale, 10);
+            if (![1, 2, 4, 8].includes(scale)) {
+                return res.status(400).json({ message: 'Scale must be 1, 2, 4 or 8' });
+            }
+            decompressOptions.scale = scale;
+        }
 
-        const decompressResults = await PythonShell.run('decompress_profile_image.py', decompressOptions);
-        
-        // Parse rezultat
+        // Dekompresiraj s codec strežnikom
         let decompressResult;
         try {
-            const lastMessage = decompressResults[decompressResults.length - 1];
-            decompressResult = JSON.parse(lastMessage);
-        } catch (parseError) {
-            console.error('Error parsing decompression result:', parseError);
-            return res.status(500).json({ message: 'Error decompressing image' });
+            decompressResult = await codecClient.decompressImage(user.profilePhotoData, decompressOptions);
+        } catch (decompressError) {
+            console.error('Error decompressing image:', decompressError);
+            return res.status(500).json({ message: decompressError.message || 'Error decompressing image' });
         }
 
-        if (decompressResult.error) {
-            return res.status(500).json({ message: decompressResult.error });
+        // ?raw=1 vrne sliko neposredno, brez base64 in JSON ovoja
+        if (req.query.raw === '1' || req.query.raw === 'true') {
+            res.set('Content-Type', profilePhotoFormats[decompressResult.format]);
+            return res.status(200).send(decompressResult.image);
         }
 
         // Vrni sliko kot base64
         res.status(200).json({ 
-            image: decompressResult.image_base64,
-            format: decompressResult.format || 'png'
+            image: decompressResult.image.toString('base64'),
+            format: decompressResult.format
         });
     } catch (error) {
         console.error('Error getting profile photo:', error);
@@ -1,8 +1,32 @@
 import sys
 import json
+import time
+import inspect
+import argparse
+import functools
 import cv2
 import os
 import numpy as np
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.face_detection import (FACE_SIZE, FACE_BOX_CACHE, FaceBoxCache, crop_face, detect_face,
+                                  transform_box, video_signature)
+from utils.enrolment_shard import EnrolmentShardWriter, remove_enrolment_shard
+
+# Velikost omejenih vrst med stopnjami cevovoda in število niti za zapis slik
+QUEUE_SIZE = 8
+WRITE_WORKERS = int(os.environ.get('DATASET_WRITE_WORKERS', min(4, os.cpu_count() or 1)))
+_END = object()
+
+# jpeg: augmentirane slike za learn.py kot datoteke; shard: izrezi obrazov v enem .npy
+OUTPUT_MODES = ('jpeg', 'shard')
+
+# Privzeto število izbranih slik na sekundo videa in najmanjši razmik (v slikah), pri katerem se
+# namesto zaporednih grab() uporabi iskanje (CAP_PROP_POS_FRAMES)
+SAMPLE_FPS = 20
+SEEK_MIN_GAP = 90
 
 def preprocess_image(image):
     # Odstranjevanje šuma z Gaussovim zamegljevanjem
@@ -54,64 +78,431 @@ def apply_zoom(image, zoom_factor=1.2):
     return cv2.resize(cropped, (image.shape[1], image.shape[0]))
 
 
+# Transformacije, ki jih lahko uporablja načrt augmentacij (ime v JSON -> funkcija)
+AUGMENTATIONS = {
+    'adjust_brightness': adjust_brightness,
+    'rotate_image': rotate_image,
+    'flip_image': flip_image,
+    'add_noise': add_noise,
+    'apply_translation': apply_translation,
+    'change_contrast': change_contrast,
+    'apply_zoom': apply_zoom,
+}
+# Zaporedne afine transformacije se združijo v en sam warpAffine
+AFFINE_AUGMENTATIONS = ('rotate_image', 'apply_translation', 'apply_zoom')
+# Velikost testne slike za preverjanje načrta
+DRY_RUN_SIZE = 64
+
+# Privzeti načrt ustreza doslej shranjenim slikam: original, bright, flipped, translation, contrast
+# Vsak vnos: name (predpona datoteke), transforms [{op, parametri}], count (število različic),
+# preprocess (začni iz sivinske slike preprocess_image). Parameter [min, max] pri count > 1 da enakomerno razporejene vrednosti.
+DEFAULT_AUGMENTATION_PLAN = [
+    {"name": "original"},
+    {"name": "bright", "transforms": [{"op": "adjust_brightness", "value": 50}]},
+    {"name": "flipped", "preprocess": True, "transforms": [{"op": "flip_image"}]},
+    {"name": "translation", "transforms": [{"op": "apply_translation", "tx": 50, "ty": 50}]},
+    {"name": "contrast", "transforms": [{"op": "change_contrast", "contrast": 1.5}]},
+]
+
+def affine_matrix(op, params, shape):
+    # 3x3 matrika transformacije, enaka tisti v rotate_image/apply_translation/apply_zoom
+    height, width = shape[:2]
+    if op == 'rotate_image':
+        M = cv2.getRotationMatrix2D((width/2, height/2), params['angle'], 1)
+    elif op == 'apply_translation':
+        M = np.float64([[1, 0, params['tx']], [0, 1, params['ty']]])
+    elif op == 'apply_zoom':
+        M = cv2.getRotationMatrix2D((width/2, height/2), 0, params['zoom_factor'])
+    else:
+        raise ValueError(f"Not an affine augmentation: {op}")
+    return np.vstack([M, [0, 0, 1]])
+
+def chain_matrix(ops, shape):
+    # Skupna 3x3 matrika zaporedja transformacij; flip_image je zrcaljenje, ostale ne premikajo pikslov
+    M = np.eye(3)
+    for op, params in ops:
+        if op in AFFINE_AUGMENTATIONS:
+            M = affine_matrix(op, params, shape) @ M
+        elif op == 'flip_image':
+            M = np.float64([[-1, 0, shape[1] - 1], [0, 1, 0], [0, 0, 1]]) @ M
+    return M
+
+def fused_affine(ops):
+    # Ena warpAffine za zaporedje afinih transformacij (matrike se shranijo glede na velikost slike)
+    matrices = {}
+
+    def apply(image):
+        shape = image.shape[:2]
+        if shape not in matrices:
+            matrices[shape] = chain_matrix(ops, shape)[:2]
+        return cv2.warpAffine(image, matrices[shape], (shape[1], shape[0]))
+    return apply
+
+def _resolve_params(op, params, variant, count):
+    # Preveri parametre glede na podpis funkcije in dopolni privzete vrednosti
+    # Vrednost iz razpona [min, max] ohrani tip privzete vrednosti (npr. int za adjust_brightness)
+    signature = inspect.signature(AUGMENTATIONS[op])
+    values = {}
+    for key, value in params.items():
+        if isinstance(value, list):
+            if len(value) != 2:
+                raise ValueError(f"{op}.{key}: a range must be [min, max]")
+            value = float(np.linspace(value[0], value[1], count)[variant]) if count > 1 else value[0]
+            default = signature.parameters[key].default if key in signature.parameters else None
+            if isinstance(default, int) and not isinstance(default, bool):
+                value = int(round(value))
+        values[key] = value
+    try:
+        bound = signature.bind(None, **values)
+    except TypeError as e:
+        raise ValueError(f"{op}: {e}")
+    bound.apply_defaults()
+    return {key: value for key, value in list(bound.arguments.items())[1:]}
+
+class AugmentationPlan:
+    """
+    Preveden načrt augmentacij: za vsako sliko videa en prehod čez vse različice,
+    sivinska slika se izračuna največ enkrat, zaporedne afine transformacije so združene.
+    Beleži čas po transformacijah (timings: ime -> [sekunde, klici]).
+    """
+
+    def __init__(self, plan=None):
+        self.variants = []
+        self.timings = {}
+        self._box_matrices = {}
+        self.needs_preprocess = False
+        names = set()
+        for entry in DEFAULT_AUGMENTATION_PLAN if plan is None else plan:
+            name = entry.get('name')
+            if not name or '_' in name or os.sep in name:
+                raise ValueError(f"Invalid augmentation name: {name!r} (must not contain '_')")
+            count = int(entry.get('count', 1))
+            if count < 1:
+                raise ValueError(f"{name}: count must be at least 1")
+            preprocess = bool(entry.get('preprocess', False))
+            self.needs_preprocess |= preprocess
+
+            for variant in range(count):
+                variant_name = name if count == 1 else f'{name}{variant}'
+                if variant_name in names:
+                    raise ValueError(f"Duplicate augmentation name: {variant_name}")
+                names.add(variant_name)
+                steps = []
+                for transform in entry.get('transforms', []):
+                    params = dict(transform)
+                    op = params.pop('op', None)
+                    if op not in AUGMENTATIONS:
+                        raise ValueError(f"Unknown augmentation: {op!r}")
+                    steps.append((op, _resolve_params(op, params, variant, count)))
+                self.variants.append((variant_name, preprocess, self._compile(steps), steps))
+        self._dry_run()
+
+    def _dry_run(self):
+        # Preizkus načrta na majhni sliki: napačni parametri se pokažejo ob nalaganju načrta,
+        # ne šele med obdelavo videa (kjer bi nastal prazen nabor slik)
+        frame = np.zeros((DRY_RUN_SIZE, DRY_RUN_SIZE, 3), dtype=np.uint8)
+        frame[::2, ::3] = 200
+        processed_image = preprocess_image(frame)
+        for name, preprocess, steps, _ in self.variants:
+            image = processed_image if preprocess else frame
+            try:
+                for _, fn in steps:
+                    image = fn(image)
+            except Exception as e:
+                raise ValueError(f"Augmentation {name!r} failed on a test frame: {e}")
+            if not isinstance(image, np.ndarray) or image.dtype != np.uint8 or image.shape[:2] != frame.shape[:2]:
+                raise ValueError(f"Augmentation {name!r} must return a uint8 image of the input size")
+
+    @staticmethod
+    def _compile(steps):
+        # (ime za merjenje časa, funkcija); afine skupine z vsaj dvema korakoma -> en warpAffine
+        compiled = []
+        i = 0
+        while i < len(steps):
+            j = i
+            while j < len(steps) and steps[j][0] in AFFINE_AUGMENTATIONS:
+                j += 1
+            if j - i >= 2:
+                group = steps[i:j]
+                compiled.append(('+'.join(op for op, _ in group), fused_affine(group)))
+                i = j
+                continue
+            op, params = steps[i]
+            compiled.append((op, functools.partial(AUGMENTATIONS[op], **params)))
+            i += 1
+        return compiled
+
+    def _timed(self, label, fn, image):
+        start = time.perf_counter()
+        result = fn(image)
+        timing = self.timings.setdefault(label, [0.0, 0])
+        timing[0] += time.perf_counter() - start
+        timing[1] += 1
+        return result
+
+    def apply(self, frame):
+        # Vrne [(ime, slika)] za vse različice ene slike videa
+        processed_image = None
+        if self.needs_preprocess:
+            processed_image = self._timed('preprocess_image', preprocess_image, frame)
+        results = []
+        for name, preprocess, steps, _ in self.variants:
+            image = processed_image if preprocess else frame
+            for label, fn in steps:
+                image = self._timed(label, fn, image)
+            results.append((name, image))
+        return results
+
+    def variant_boxes(self, shape, box):
+        # Okvir obraza za vsako različico iz okvirja na izvorni sliki: fotometrične transformacije
+        # ga ne spremenijo, geometrijske (rotacija, premik, povečava, zrcaljenje) se preslikajo
+        if box is None:
+            return [None] * len(self.variants)
+        if shape not in self._box_matrices:
+            self._box_matrices[shape] = [chain_matrix(steps, shape) for _, _, _, steps in self.variants]
+        return [transform_box(box, M, shape) for M in self._box_matrices[shape]]
+
+    def report(self):
+        return {label: {"seconds": round(seconds, 6), "calls": calls}
+                for label, (seconds, calls) in sorted(self.timings.items(), key=lambda item: -item[1][0])}
+
+def load_augmentation_plan(source=None):
+    # Načrt iz JSON datoteke ali niza JSON; seznam vnosov ali {"augmentations": [...]}
+    if source is None:
+        return AugmentationPlan()
+    if os.path.isfile(source):
+        with open(source) as f:
+            plan = json.load(f)
+    else:
+        plan = json.loads(source)
+    if isinstance(plan, dict):
+        plan = plan.get('augmentations')
+    if not isinstance(plan, list):
+        raise ValueError("Augmentation plan must be a list of augmentations")
+    return AugmentationPlan(plan)
+
 def save_augmented_images(image, directory, base_name, image_index):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    os.makedirs(directory, exist_ok=True)
     cv2.imwrite(os.path.join(directory, f'{base_name}_{image_index}.jpg'), image)
 
-def process_video(video_path, username):
+def video_frame_count(cap):
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total > 0:
+        return total
+    # Nekateri vsebniki ne poznajo števila slik: preštej jih z grab() (brez dekodiranja) in se vrni na začetek
+    total = 0
+    while cap.grab():
+        total += 1
+    if not cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+        raise ValueError("Could not determine the number of frames in the video")
+    return total
+
+def sample_frames_by_rate(cap, fps):
+    # Izbira po časovnih oznakah slik (pravilno tudi pri spremenljivi hitrosti slik in pri videih pod fps)
+    # Preskočene slike se le preberejo z grab(), dekodirajo (retrieve) se samo izbrane
+    interval = 1000.0 / fps
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    index = 0
+    next_time = 0.0
+    while cap.grab():
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if timestamp <= 0 and index > 0:
+            # Brez časovnih oznak: čas iz zaporedne številke slike (ali vsaka slika, če tudi FPS ni znan)
+            timestamp = index * 1000.0 / video_fps if video_fps > 0 else next_time
+        index += 1
+
+        if timestamp + 0.5 >= next_time:
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            yield index - 1, frame
+            next_time += interval
+            if next_time <= timestamp:
+                next_time = timestamp + interval
+
+def sample_frames_by_count(cap, frame_count):
+    # frame_count enakomerno razporejenih slik; pri velikih razmikih se uporabi iskanje namesto grab()
+    total = video_frame_count(cap)
+    targets = np.unique(np.linspace(0, total - 1, min(frame_count, total)).round().astype(int)) if total else []
+    position = 0  # indeks slike, ki jo vrne naslednji grab()
+    for target in targets:
+        if target - position >= SEEK_MIN_GAP and cap.set(cv2.CAP_PROP_POS_FRAMES, int(target)):
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        while position < target:
+            if not cap.grab():
+                return
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield position - 1, frame
+
+def sample_frames(cap, fps=SAMPLE_FPS, frame_count=None):
+    # Generator (indeks slike v videu, slika): frame_count slik čez cel video ali fps slik na sekundo
+    if frame_count is not None:
+        if frame_count < 1:
+            raise ValueError("frame_count must be at least 1")
+        return sample_frames_by_count(cap, frame_count)
+    if not fps or fps <= 0:
+        raise ValueError("fps must be positive")
+    return sample_frames_by_rate(cap, fps)
+
+def _put(q, item, stop):
+    # Blokirajoč put, ki se prekine, ko se cevovod ustavi
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def process_video(video_path, username, plan=None, fps=SAMPLE_FPS, frame_count=None,
+                  write_workers=WRITE_WORKERS, queue_size=QUEUE_SIZE, output='jpeg'):
+    # Cevovod: dekodiranje (nit) -> augmentacija po načrtu -> zapis (bazen niti)
+    # Stopnje so povezane z omejenimi vrstami, zato pomnilnik ni odvisen od dolžine videa
+    # output='jpeg': vsaka augmentirana slika v learnPhotos/<username>/<ime>_<številka>.jpg
+    # output='shard': izrezi obrazov neposredno v nabor za learn.py (utils/enrolment_shard.py)
+    # Vrne porabo časa po transformacijah (AugmentationPlan.report) ali None ob napaki
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode: {output}")
+    if plan is None:
+        plan = AugmentationPlan()
     cap = cv2.VideoCapture(video_path)
+    stop = threading.Event()
+    decoder = None
+    shard = None
     try:
         if not cap.isOpened():
             print("Error: Could not open video.")
             return
 
-        frame_rate = 20  # frames to process per second
-        count = 0
+        directory = os.path.join('learnPhotos', username)
+        os.makedirs(directory, exist_ok=True)
+        selected = sample_frames(cap, fps, frame_count)
+        frames = queue.Queue(maxsize=queue_size)
+        decode_errors = []
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Only process certain frames to reduce workload
-            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) % int(cap.get(cv2.CAP_PROP_FPS) // frame_rate) == 0:
-                processed_image = preprocess_image(frame)  # this now returns a grayscale image
-                person_name = username
-
-                # Ensure operations compatible with grayscale are handled
-                bright = adjust_brightness(frame, 50)  # Apply brightness on the original frame
-                rotated = rotate_image(processed_image, 45)
-                flipped = flip_image(processed_image)
-                noisy = add_noise(frame)  # Apply noise on the original frame
-                translation = apply_translation(frame)  
-                contrast = change_contrast(frame)  
-                zoom = apply_zoom(frame) 
-
-                # Save all images
-                save_augmented_images(frame, 'learnPhotos/' + person_name, 'original', count)
-                save_augmented_images(bright, 'learnPhotos/' + person_name, 'bright', count)
-                # save_augmented_images(rotated, 'learnPhotos/' + person_name, 'rotated', count)
-                save_augmented_images(flipped, 'learnPhotos/' + person_name, 'flipped', count)
-                # save_augmented_images(noisy, 'learnPhotos/' + person_name, 'noisy', count)
-                save_augmented_images(translation, 'learnPhotos/' + person_name, 'translation', count)
-                save_augmented_images(contrast, 'learnPhotos/' + person_name, 'contrast', count)
-                # save_augmented_images(zoom, 'learnPhotos/' + person_name, 'nozoomisy', count)
-                count += 1
+        def decode():
+            try:
+                for item in selected:
+                    if not _put(frames, item, stop):
+                        return
+            except Exception as e:
+                decode_errors.append(e)
+            finally:
+                _put(frames, _END, stop)
 
-        cap.release()
+        # Obraz se poišče enkrat na sliko videa, okvirji različic se izračunajo iz načrta augmentacij;
+        # okvirji se shranijo po indeksu slike (ponovna obdelava istega videa ne išče znova)
+        # in po imenu datoteke (learn.py ne išče obrazov na shranjenih slikah)
+        boxes = FaceBoxCache(os.path.join(directory, FACE_BOX_CACHE), video_signature(video_path))
+
+        def locate_faces(frame, position):
+            key = f'frame:{position}'
+            if key in boxes:
+                box = boxes.get(key)
+            else:
+                box = detect_face(cv2.GaussianBlur(frame, (5, 5), 0))
+                boxes.set(key, box)
+            return plan.variant_boxes(frame.shape[:2], box)
+
+        if output == 'shard':
+            # Iskanje obraza in izrezi tečejo v nitih, v nabor se dodajajo po vrsti
+            shard = EnrolmentShardWriter(directory, FACE_SIZE)
+
+            def handle_frame(frame, position, variants, index):
+                faces = []
+                for (name, image), box in zip(variants, locate_faces(frame, position)):
+                    if box is not None:
+                        faces.append((name, crop_face(cv2.GaussianBlur(image, (5, 5), 0), box, FACE_SIZE)))
+                return faces, index
+
+            def finish(future):
+                faces, index = future.result()
+                for name, face in faces:
+                    shard.append(face, name, index)
+        else:
+            # Star nabor bi imel v learn.py prednost pred novimi slikami
+            remove_enrolment_shard(directory)
+
+            def handle_frame(frame, position, variants, index):
+                for (name, image), box in zip(variants, locate_faces(frame, position)):
+                    save_augmented_images(image, directory, name, index)
+                    boxes.set(f'{name}_{index}', box)
+
+            def finish(future):
+                future.result()
+
+        decoder = threading.Thread(target=decode, name='dataset-decode', daemon=True)
+        decoder.start()
+
+        # cv2.imwrite in detectMultiScale sprostita GIL, zato delo teče vzporedno v nitih
+        max_pending = max(1, write_workers) * 2
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, write_workers)) as pool:
+                pending = deque()
+                count = 0
+                while True:
+                    item = frames.get()
+                    if item is _END:
+                        break
+
+                    position, frame = item
+                    pending.append(pool.submit(handle_frame, frame, position, plan.apply(frame), count))
+                    count += 1
+
+                    # Omeji število slik v obdelavi
+                    while len(pending) > max_pending:
+                        finish(pending.popleft())
+                while pending:
+                    finish(pending.popleft())
+        finally:
+            boxes.save()
+
+        if decode_errors:
+            raise decode_errors[0]
+        if shard is not None:
+            print(f"Saved {shard.close()} face crops.")
+            shard = None
         print("Done processing video.")
+        return plan.report()
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        stop.set()
+        if decoder is not None:
+            decoder.join()
+        if shard is not None:
+            shard.abort()
         cap.release()
         print("Released video resources.")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        video_path = sys.argv[1]
-        username = sys.argv[2]
-        print(f"Processing video: {video_path}")
-        process_video(video_path, username)
+    parser = argparse.ArgumentParser(description="Extract augmented training images from an enrolment video")
+    parser.add_argument('video_path', nargs='?')
+    parser.add_argument('username', nargs='?')
+    parser.add_argument('--plan', help="Augmentation plan as a JSON file or JSON string (default: built-in plan)")
+    parser.add_argument('--timings', action='store_true', help="Print time spent per augmentation")
+    parser.add_argument('--fps', type=float, default=SAMPLE_FPS, help="Frames to sample per second of video")
+    parser.add_argument('--frames', type=int, help="Sample this many evenly spaced frames instead of --fps")
+    parser.add_argument('--shard', action='store_true',
+                        help="Write detected face crops to a training shard instead of JPEG files")
+    parser.add_argument('--write-workers', type=int, default=WRITE_WORKERS, help="Threads encoding and writing images")
+    args = parser.parse_args()
+
+    if args.video_path and args.username:
+        try:
+            plan = load_augmentation_plan(args.plan)
+        except (OSError, ValueError) as e:
+            print(json.dumps({"error": f"Invalid augmentation plan: {e}"}))
+            sys.exit(1)
+        print(f"Processing video: {args.video_path}")
+        timings = process_video(args.video_path, args.username, plan, fps=args.fps, frame_count=args.frames,
+                                write_workers=args.write_workers, output='shard' if args.shard else 'jpeg')
+        if args.timings and timings is not None:
+            for label, timing in timings.items():
+                print(f"{label}: {timing['seconds']:.3f} s ({timing['calls']} calls)")
     else:
-        print(json.dumps({"error": "No video path provided"}))
\ No newline at end of file
+        print(json.dumps({"error": "No video path provided"}))
@@ -1,24 +1,59 @@
 """
 Dekompresija profilne slike iz DCT formata
 Uporablja se za dekompresijo profilnih slik uporabnikov
+
+Uporaba:
+    decompress_profile_image.py <compressed_base64>            JSON z base64 PNG na stdout
+    decompress_profile_image.py --raw [--input PATH | --fd N]   surovi bytes iz stdin/datoteke,
+        [--format png|jpeg|webp] [--quality Q] [--scale 1|2|4|8] surova slika na stdout
 """
+import os
 import sys
 import json
+import argparse
 import cv2
 import base64
 import numpy as np
-from utils.image_compression_dct import decompress_to_array
+from utils.image_compression_dct import decompress_to_array, DECODE_SCALES
+from utils.decoded_image_cache import make_cache_key
+
+# Podprti izhodni formati: končnica za cv2.imencode in parameter kakovosti
+IMAGE_FORMATS = {
+    'png': ('.png', None),
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+def encode_output_image(image, image_format='png', quality=None):
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    extension, quality_flag = IMAGE_FORMATS[image_format]
+    params = [quality_flag, int(quality)] if quality_flag is not None and quality is not None else []
+    success, buffer = cv2.imencode(extension, image, params)
+    if not success:
+        raise ValueError("Failed to encode image")
+    return buffer.tobytes()
+
+# cache: DecodedImageCache ali None (predpomnilnik ima le dolgo živeči codec_server.py)
+def decode_profile_image(compressed_data, image_format='png', quality=None, scale=1, cache=None):
+    if cache is not None:
+        key = make_cache_key(compressed_data, image_format=image_format, quality=quality, scale=scale)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    
+    # Dekompresiraj (pri scale > 1 neposredno v zmanjšani ločljivosti, npr. za sličice)
+    decompressed_image = decompress_to_array(compressed_data, scale=scale)
+    
+    # Pretvori v izbrani format (privzeto PNG - boljša kakovost za profilne slike)
+    image_bytes = encode_output_image(decompressed_image, image_format, quality)
+    if cache is not None:
+        cache.put(key, image_bytes)
+    return image_bytes
 
 def decompress_profile_image(compressed_base64):
     try:
-        # Dekompresiraj
-        compressed_data = base64.b64decode(compressed_base64)
-        decompressed_image = decompress_to_array(compressed_data)
-        
-        # Pretvori v PNG format (boljša kakovost za profilne slike)
-        success, buffer = cv2.imencode('.png', decompressed_image)
-        if not success:
-            return {"error": "Failed to encode image"}
+        buffer = decode_profile_image(base64.b64decode(compressed_base64))
         
         # Pretvori v base64
         image_base64 = base64.b64encode(buffer).decode('utf-8')
@@ -31,11 +66,42 @@ def decompress_profile_image(compressed_base64):
     except Exception as e:
         return {"error": str(e)}
 
+def read_raw_input(input_path=None, fd=None):
+    # Preberi surove bytes iz datoteke, file descriptorja ali stdin
+    if fd is not None:
+        with os.fdopen(fd, 'rb', closefd=False) as f:
+            return f.read()
+    if input_path and input_path != '-':
+        with open(input_path, 'rb') as f:
+            return f.read()
+    return sys.stdin.buffer.read()
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Decompress a DCT profile image")
+    parser.add_argument('compressed_base64', nargs='?')
+    parser.add_argument('--raw', action='store_true', help="Read raw compressed bytes, write raw image bytes")
+    parser.add_argument('--input', help="Input file for --raw mode ('-' for stdin)")
+    parser.add_argument('--fd', type=int, help="Input file descriptor for --raw mode")
+    parser.add_argument('--format', default='png', choices=sorted(IMAGE_FORMATS))
+    parser.add_argument('--quality', type=int, help="JPEG/WebP quality (1-100)")
+    parser.add_argument('--scale', type=int, default=1, choices=DECODE_SCALES,
+                        help="Decode directly at 1/scale resolution")
+    args = parser.parse_args()
+    
+    if args.raw:
+        try:
+            image_bytes = decode_profile_image(read_raw_input(args.input, args.fd), args.format, args.quality,
+                                               args.scale)
+        except Exception as e:
+            print(json.dumps({"error": str(e)}), file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.buffer.write(image_bytes)
+        sys.stdout.buffer.flush()
+        sys.exit(0)
+    
+    if not args.compressed_base64:
         print(json.dumps({"error": "Compressed data required"}))
         sys.exit(1)
     
-    compressed_base64 = sys.argv[1]
-    result = decompress_profile_image(compressed_base64)
+    result = decompress_profile_image(args.compressed_base64)
     print(json.dumps(result))
@@ -3,43 +3,74 @@ ssl._create_default_https_context = ssl._create_unverified_context
 import os
 import sys
 import io
+import json
+import time
+import shutil
+import argparse
+import hashlib
 import numpy as np
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout, Input, BatchNormalization, GlobalAveragePooling2D
 from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.callbacks import Callback
 import cv2
 from sklearn.preprocessing import LabelEncoder
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from utils.enrolment_shard import SHARD_FRAMES, has_enrolment_shard, load_enrolment_shard
+from utils.face_detection import FACE_BOX_CACHE, FaceBoxCache, crop_face, detect_face
+from utils.embedding_index import BACKBONE_FILE, EmbeddingIndex, build_templates, calibrate_threshold
 
 # Nastavi kodiranje standardnega izhoda na UTF-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf8')
 
+parser = argparse.ArgumentParser(description="Train the face recognition model for a user")
+parser.add_argument('username')
+parser.add_argument('--full-model', action='store_true',
+                    help="Train on images through the whole network instead of on cached backbone embeddings")
+parser.add_argument('--index-only', action='store_true',
+                    help="Only store the user's embedding templates in the shared index, without a per-user model")
+parser.add_argument('--epochs', type=int, default=100, help="Maximum number of epochs")
+parser.add_argument('--patience', type=int, default=10,
+                    help="Stop after this many epochs without validation loss improvement")
+parser.add_argument('--time-budget', type=float, default=float(os.environ.get('LEARN_TIME_BUDGET', 0)) or None,
+                    help="Stop before training takes longer than this many seconds")
+parser.add_argument('--checkpoint-every', type=int, default=5, help="Save a resumable checkpoint every N epochs")
+parser.add_argument('--restart', action='store_true', help="Ignore checkpoints of an interrupted run")
+args = parser.parse_args()
+if args.full_model and args.index_only:
+    parser.error("--index-only uses backbone embeddings and cannot be combined with --full-model")
+
 # Pot do slikovne mape
-username = sys.argv[1]
+username = args.username
 data_dir = os.path.join('learnPhotos', username)
 img_size = (224, 224)  # MobileNetV2 pričakuje vhodne slike velikosti 224x224
 batch_size = 32
 
+# Okvirji obrazov, ki jih je dataSet.py našel na slikah videa (in prenesel na augmentirane slike);
+# za slike brez okvirja se obraz poišče enkrat in shrani, zato ponovno učenje ne išče znova
+face_boxes = FaceBoxCache(os.path.join(data_dir, FACE_BOX_CACHE))
+
 # Funkcija za zaznavanje in obrezovanje obraza na sliki
 def detect_and_crop_face(image_path, target_size=img_size):
     image = cv2.imread(image_path)
     image = cv2.GaussianBlur(image, (5, 5), 0)  # Uporabi Gaussianov filter za zmanjšanje šuma
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-    if len(faces) == 0:
+    key = os.path.splitext(os.path.basename(image_path))[0]
+    if key in face_boxes:
+        box = face_boxes.get(key)
+    else:
+        box = detect_face(image)  # kaskada se naloži enkrat na proces
+        face_boxes.set(key, box)
+    if box is None:
         return None
-    (x, y, w, h) = faces[0]
-    face = image[y:y+h, x:x+w]
-    face = cv2.resize(face, target_size)
-    return face
+    return crop_face(image, box, target_size)
 
 # Funkcija za nalaganje slik in pripravo oznak
 def load_images_and_labels(data_dir):
     images = []
     labels = []
+    groups = []
     files = os.listdir(data_dir)
     for filename in files:
         if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
@@ -50,12 +81,23 @@ def load_images_and_labels(data_dir):
                     images.append(preprocess_input(face))  # Uporabi preprocess_input za MobileNetV2
                     label = filename.split('_')[0]  # Predpostavka: ime datoteke je v obliki 'ime_številka.jpg'
                     labels.append(label)
+                    groups.append(os.path.splitext(filename)[0].rsplit('_', 1)[-1])  # številka slike videa
             except Exception as e:
                 print(f"Napaka pri nalaganju slike {filename}: {e}")
-    return np.array(images), np.array(labels)
+    return np.array(images), np.array(labels), np.array(groups)
+
+# Nabor izrezov iz dataSet.py --shard (brez dekodiranja in iskanja obrazov), sicer slike v mapi;
+# groups je slika videa, iz katere je izrez nastal (za umerjanje praga na neznanih slikah)
+def load_enrolment_data(data_dir):
+    if has_enrolment_shard(data_dir):
+        faces, labels, _ = load_enrolment_shard(data_dir)
+        groups = np.load(os.path.join(data_dir, SHARD_FRAMES))
+        return preprocess_input(faces.astype(np.float32)), labels, groups
+    return load_images_and_labels(data_dir)
 
 print("Nalaganje slik in oznak...")
-images, labels = load_images_and_labels(data_dir)
+images, labels, groups = load_enrolment_data(data_dir)
+face_boxes.save()
 print(f"Število naloženih slik: {len(images)}")
 
 # Pretvorba oznak v številčne vrednosti
@@ -80,50 +122,248 @@ def train_test_split_manual(images, labels, test_size=0.2):
     
     return X_train, X_test, y_train, y_test
 
-print("Razdelitev podatkov...")
-X_train, X_test, y_train, y_test = train_test_split_manual(images, labels, test_size=0.2)
+# Preveri in ustvari mapo learned_model
+learned_model_dir = os.path.join('learned_model', username)
+if not os.path.exists(learned_model_dir):
+    os.makedirs(learned_model_dir)
 
 num_classes = len(np.unique(labels))
 print(f"Number of classes: {num_classes}")
 
 # Definicija modela z uporabo MobileNetV2
-def build_model(num_classes):
+def build_backbone():
     base_model = MobileNetV2(input_shape=(img_size[0], img_size[1], 3), include_top=False, weights='imagenet')
     base_model.trainable = False  # Ne treniramo osnovnih slojev MobileNetV2
+    return base_model
 
-    model = Sequential([
-        base_model,
-        GlobalAveragePooling2D(),
+def build_head_layers(num_classes):
+    return [
         Dense(256, activation='relu'),
         Dropout(0.3),
         Dense(num_classes, activation='softmax')
-    ])
-    
+    ]
+
+def compile_model(model):
     model.compile(optimizer=Adam(learning_rate=1e-4), 
                   loss='sparse_categorical_crossentropy',
                   metrics=['accuracy'])
     return model
 
+def build_model(num_classes, base_model=None, head_layers=None):
+    model = Sequential([
+        base_model if base_model is not None else build_backbone(),
+        GlobalAveragePooling2D(),
+        *(head_layers if head_layers is not None else build_head_layers(num_classes))
+    ])
+    return compile_model(model)
+
+# Vektorji značilk zamrznjenega MobileNetV2 + GlobalAveragePooling2D (1280 vrednosti na sliko)
+# se izračunajo enkrat in shranijo; ključ je zgoščena vrednost vhodnih slik (cache_path=None: brez shranjevanja)
+def compute_embeddings(images, base_model, cache_path=None):
+    fingerprint = hashlib.sha256(np.ascontiguousarray(images).data).hexdigest() if cache_path else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            cached = np.load(cache_path)
+            if str(cached['fingerprint']) == fingerprint:
+                print("Uporaba shranjenih vektorjev značilk...")
+                return cached['embeddings']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Napaka pri branju vektorjev značilk: {e}")
+
+    print("Izračun vektorjev značilk...")
+    extractor = Sequential([base_model, GlobalAveragePooling2D()])
+    embeddings = extractor.predict(images, batch_size=batch_size, verbose=0).astype(np.float32)
+    if not cache_path:
+        return embeddings
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, fingerprint=fingerprint, embeddings=embeddings)
+    os.replace(tmp_path, cache_path)
+    return embeddings
+
+# Nadzor učenja: zgodnja ustavitev po validacijski izgubi, obnovitev najboljših uteži,
+# periodične kontrolne točke v learned_model/<username>/checkpoints/ in časovna omejitev
+class TrainingController(Callback):
+    def __init__(self, checkpoint_dir, fingerprint, monitor='val_loss', patience=10, min_delta=1e-4,
+                 checkpoint_every=5, time_budget=None):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.fingerprint = fingerprint
+        self.monitor = monitor
+        self.patience = patience
+        self.min_delta = min_delta
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.time_budget = time_budget
+        self.best = float('inf')
+        self.best_epoch = -1
+        self.wait = 0
+        self.elapsed = 0.0
+        self.history = {}
+        self.stop_reason = None
+        self.state_path = os.path.join(checkpoint_dir, 'state.json')
+        self.best_path = os.path.join(checkpoint_dir, 'best.weights.h5')
+        self.latest_path = os.path.join(checkpoint_dir, 'latest.weights.h5')
+
+    def resume(self, model, epochs):
+        # Naloži stanje prekinjenega učenja; vrne število že končanih epoh (0 = začni znova)
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get('fingerprint') != self.fingerprint or not os.path.exists(self.latest_path):
+            return 0
+        model.load_weights(self.latest_path)
+        self.best = state['best']
+        self.best_epoch = state['best_epoch']
+        self.wait = state['wait']
+        self.elapsed = state['elapsed']
+        self.history = state['history']
+        self.stop_reason = state.get('stop_reason')
+        # Učenje se je že ustavilo (prekinjeno je bilo le shranjevanje): brez dodatnih epoh
+        return epochs if self.stop_reason else state['epoch']
+
+    def _save_state(self, epoch):
+        self.model.save_weights(self.latest_path)
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'fingerprint': self.fingerprint,
+                'epoch': epoch,
+                'best': self.best,
+                'best_epoch': self.best_epoch,
+                'wait': self.wait,
+                'elapsed': self.elapsed,
+                'history': self.history,
+                'stop_reason': self.stop_reason
+            }, f)
+        os.replace(tmp_path, self.state_path)
+
+    def on_train_begin(self, logs=None):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._epoch_start = time.monotonic()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.monotonic()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        epoch_seconds = time.monotonic() - self._epoch_start
+        self.elapsed += epoch_seconds
+        for key, value in logs.items():
+            self.history.setdefault(key, []).append(float(value))
+
+        value = logs.get(self.monitor)
+        improved = value is not None and value < self.best - self.min_delta
+        if improved:
+            self.best = float(value)
+            self.best_epoch = epoch
+            self.wait = 0
+            self.model.save_weights(self.best_path)
+        else:
+            self.wait += 1
+
+        if self.wait >= self.patience:
+            self.stop_reason = 'early_stopping'
+        elif self.time_budget and self.elapsed + epoch_seconds > self.time_budget:
+            # Naslednja epoha bi presegla časovno omejitev
+            self.stop_reason = 'time_budget'
+        if improved or self.stop_reason or (epoch + 1) % self.checkpoint_every == 0:
+            self._save_state(epoch + 1)
+        if self.stop_reason:
+            self.model.stop_training = True
+
+    def on_train_end(self, logs=None):
+        # Obnovi uteži najboljše epohe
+        if self.best_epoch >= 0 and os.path.exists(self.best_path):
+            self.model.load_weights(self.best_path)
+
+    def clear(self):
+        # Po shranjenem modelu kontrolne točke niso več potrebne
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+# Skupna osnova za indeks predlog se shrani enkrat za vse uporabnike
+def save_backbone(base_model, path):
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{os.getpid()}.tmp.keras'
+        Sequential([base_model, GlobalAveragePooling2D()]).save(tmp_path)
+        os.replace(tmp_path, path)
+
 print("Gradnja modela...")
-model = build_model(num_classes)
+if args.full_model:
+    # Učenje celotnega modela na slikah (vsaka epoha gre skozi MobileNetV2)
+    print("Razdelitev podatkov...")
+    X_train, X_test, y_train, y_test = train_test_split_manual(images, labels, test_size=0.2)
+    model = build_model(num_classes)
+    trained_model = model
+else:
+    # Osnova je zamrznjena, zato se uči le glava (Dense/Dropout/Dense) na shranjenih vektorjih značilk;
+    # isti sloji glave se nato sestavijo z osnovo v model z enakim vmesnikom kot pri učenju na slikah
+    base_model = build_backbone()
+    # Pri --index-only se vektorji ne shranijo: na uporabnika ostanejo le predloge v indeksu (nekaj KB)
+    embeddings_path = None if args.index_only else os.path.join(learned_model_dir, 'embeddings.npz')
+    embeddings = compute_embeddings(images, base_model, embeddings_path)
+    del images
 
-print("Učenje modela...")
-history = model.fit(X_train, y_train, validation_data=(X_test, y_test), epochs=100, batch_size=batch_size, verbose=1)
+    # Predloge uporabnika v skupnem indeksu (preverjanje v recognize.py brez modela na uporabnika)
+    print("Posodabljanje indeksa predlog...")
+    save_backbone(base_model, os.path.join('learned_model', BACKBONE_FILE))
+    index = EmbeddingIndex('learned_model')
+    # Prag se umeri na izločenih slikah videa (lastni izrezi) in predlogah drugih uporabnikov (tuji obrazi)
+    threshold, stats = calibrate_threshold(embeddings, index.all_templates(exclude=username), groups)
+    if threshold is None:
+        print(f"Premalo slik za umerjanje praga ({stats['holdout']}), uporabljen bo privzeti prag.")
+    else:
+        print(f"Umerjeni prag: {threshold:.3f} ({json.dumps(stats)})")
+    index.update(username, build_templates(embeddings), threshold)
+    if args.index_only:
+        # Shranjeni vektorji prejšnjega učenja (N x 1280 float32) niso več potrebni
+        stale_embeddings = os.path.join(learned_model_dir, 'embeddings.npz')
+        if os.path.exists(stale_embeddings):
+            os.remove(stale_embeddings)
+        print("Predloge shranjene v indeks.")
+        sys.exit(0)
 
-# Preveri in ustvari mapo learned_model
-learned_model_dir = os.path.join('learned_model', username)
-if not os.path.exists(learned_model_dir):
-    os.makedirs(learned_model_dir)
+    print("Razdelitev podatkov...")
+    X_train, X_test, y_train, y_test = train_test_split_manual(embeddings, labels, test_size=0.2)
+    head_layers = build_head_layers(num_classes)
+    trained_model = compile_model(Sequential([Input(shape=embeddings.shape[1:]), *head_layers]))
+    model = build_model(num_classes, base_model, head_layers)
+
+# Kontrolne točke za nadaljevanje prekinjenega učenja veljajo le za iste podatke in način učenja
+fingerprint = hashlib.sha256()
+fingerprint.update(f"{'full' if args.full_model else 'embeddings'}:{num_classes}:".encode('utf-8'))
+for array in (X_train, y_train, X_test, y_test):
+    fingerprint.update(np.ascontiguousarray(array).data)
+fingerprint = fingerprint.hexdigest()
+
+checkpoint_dir = os.path.join(learned_model_dir, 'checkpoints')
+has_validation = len(X_test) > 0
+controller = TrainingController(checkpoint_dir, fingerprint,
+                                monitor='val_loss' if has_validation else 'loss',
+                                patience=args.patience,
+                                checkpoint_every=args.checkpoint_every,
+                                time_budget=args.time_budget)
+initial_epoch = 0 if args.restart else controller.resume(trained_model, args.epochs)
+if initial_epoch:
+    print(f"Nadaljevanje učenja od epohe {initial_epoch}...")
+
+print("Učenje modela...")
+trained_model.fit(X_train, y_train, validation_data=(X_test, y_test) if has_validation else None,
+                  epochs=args.epochs, initial_epoch=initial_epoch, batch_size=batch_size,
+                  callbacks=[controller], verbose=1)
+print(f"Učenje končano ({controller.stop_reason or 'epochs'}), najboljša epoha: {controller.best_epoch + 1}")
 
 print("Shranjevanje modela...")
 model_path = os.path.join(learned_model_dir, 'face_recognition_model.keras')
 model.save(model_path)
+controller.clear()
 
-print("Evalvacija modela...")
-loss, accuracy = model.evaluate(X_test, y_test, verbose=1)
-print(f'Test Loss: {loss}')
-print(f'Test Accuracy: {accuracy}')
+if has_validation:
+    print("Evalvacija modela...")
+    loss, accuracy = trained_model.evaluate(X_test, y_test, verbose=1)
+    print(f'Test Loss: {loss}')
+    print(f'Test Accuracy: {accuracy}')
 
-# Shranjevanje zgodovine učenja
+# Shranjevanje zgodovine učenja (vključno z epohami pred nadaljevanjem)
 history_path = os.path.join(learned_model_dir, 'training_history.npy')
-np.save(history_path, history.history)
\ No newline at end of file
+np.save(history_path, controller.history)
\ No newline at end of file
@@ -5,12 +5,21 @@ import sys
 import io
 import json
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
-from tensorflow.keras.models import load_model
+from tensorflow.keras.models import load_model, Sequential
+from tensorflow.keras.layers import GlobalAveragePooling2D
+from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from utils.embedding_index import BACKBONE_FILE, EmbeddingIndex
+from utils import face_detection
 
 # Nastavi kodiranje standardnega izhoda na UTF-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf8')
 img_size = (224, 224)  # Velikost slik, ki jih pričakuje model
+index_dir = 'learned_model'
+
+# model: model Keras uporabnika, index: predloge v skupnem indeksu,
+# auto: model, če obstaja, sicer indeks
+VERIFICATION_MODE = os.environ.get('FACE_VERIFICATION_MODE', 'auto')
 
 # Funkcija za zaznavanje in obrezovanje obraza na sliki
 def detect_and_crop_face(image_path, target_size=img_size):
@@ -68,12 +77,69 @@ def recognize_faces(uploads_dir, model, confidence_threshold=0.50):
                 results.append((filename, False, float(0.0)))
     return False, results  # Vrni False, če ni bilo nobenega ujemanja
 
+# Skupna osnova (MobileNetV2 + GlobalAveragePooling2D), shranjena ob učenju
+def load_backbone():
+    path = os.path.join(index_dir, BACKBONE_FILE)
+    if os.path.exists(path):
+        return load_model(path, compile=False)
+    base_model = MobileNetV2(input_shape=(img_size[0], img_size[1], 3), include_top=False, weights='imagenet')
+    return Sequential([base_model, GlobalAveragePooling2D()])
+
+# Preverjanje s predlogami uporabnika: kosinusna podobnost vektorja značilk z indeksom;
+# prag je umerjen ob učenju (learn.py), sicer MATCH_THRESHOLD
+def verify_faces(uploads_dir, username, backbone, index, threshold=None):
+    if not os.path.exists(uploads_dir):
+        print(f"Error: Directory {uploads_dir} does not exist", file=sys.stderr)
+        return False, []
+
+    try:
+        files = os.listdir(uploads_dir)
+    except OSError as e:
+        print(f"Error listing directory {uploads_dir}: {e}", file=sys.stderr)
+        return False, []
+
+    names, faces, results = [], [], []
+    for filename in files:
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            image = cv2.imread(os.path.join(uploads_dir, filename))
+            # Enaka obdelava kot pri izrezih za učenje (zameglitev, izrez, 224x224)
+            face = face_detection.detect_and_crop_face(image, img_size) if image is not None else None
+            if face is None:
+                results.append((filename, False, float(0.0)))
+                continue
+            names.append(filename)
+            faces.append(preprocess_input(face.astype(np.float32)))
+    if not faces:
+        return False, results
+
+    if threshold is None:
+        threshold = index.threshold(username)
+    embeddings = backbone.predict(np.stack(faces), verbose=0)
+    for filename, similarity in zip(names, index.similarity(username, embeddings)):
+        match = bool(similarity >= threshold)
+        results.append((filename, match, float(similarity) * 100))
+        if match:
+            return True, results
+    return False, results
+
 def main():
     # Settings
     username = sys.argv[1]
     model_path = os.path.join('learned_model', username, 'face_recognition_model.keras')
     uploads_dir = 'login-photo'
 
+    # Verification against the shared template index (no per-user model needed)
+    index = EmbeddingIndex(index_dir)
+    use_index = VERIFICATION_MODE == 'index' or (VERIFICATION_MODE == 'auto' and not os.path.exists(model_path))
+    if use_index:
+        if username not in index:
+            print(f"Error: No face templates for user {username}", file=sys.stderr)
+            print(json.dumps({"is_match": False}))
+            return
+        is_match, results = verify_faces(uploads_dir, username, load_backbone(), index)
+        print(json.dumps({"is_match": is_match}))
+        return
+
     # Load the trained model without compilation (to avoid optimizer compatibility issues)
     # For inference, we don't need the optimizer, only the weights
     model = load_model(model_path, compile=False)
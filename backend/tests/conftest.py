@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Moduli zaledja se uvažajo kot v skriptah (from utils... import ...), zato mora biti backend/ na poti
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def make_image(height, width, channels=3, seed=0):
+    """
+    Deterministična testna slika: gladki prelivi z nekaj šuma (podobno fotografiji, dobro stisljivo).
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    planes = []
+    for c in range(channels):
+        plane = 128 + 60 * np.sin(x / (7 + 3 * c)) * np.cos(y / (11 + 2 * c)) + 20 * rng.standard_normal((height, width))
+        planes.append(plane)
+    image = np.clip(np.stack(planes, axis=-1), 0, 255).astype(np.uint8)
+    return image if channels > 1 else image[:, :, 0]
+
+
+@pytest.fixture
+def image():
+    return make_image(61, 83)
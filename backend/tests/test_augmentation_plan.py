@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import pytest
+
+import dataSet
+from conftest import make_image
+from dataSet import (AugmentationPlan, adjust_brightness, apply_translation, apply_zoom, change_contrast, flip_image,
+                     load_augmentation_plan, preprocess_image, rotate_image)
+
+
+@pytest.fixture
+def frame():
+    return make_image(64, 64)
+
+
+def outputs(plan, frame):
+    return dict(plan.apply(frame))
+
+
+def test_default_plan_matches_direct_calls(frame):
+    plan = AugmentationPlan()
+    results = outputs(plan, frame)
+    assert list(results) == ['original', 'bright', 'flipped', 'translation', 'contrast']
+    np.testing.assert_array_equal(results['original'], frame)
+    np.testing.assert_array_equal(results['bright'], adjust_brightness(frame, 50))
+    np.testing.assert_array_equal(results['flipped'], flip_image(preprocess_image(frame)))
+    np.testing.assert_array_equal(results['translation'], apply_translation(frame, 50, 50))
+    np.testing.assert_array_equal(results['contrast'], change_contrast(frame, 1.5))
+    # Sivinska slika se izračuna enkrat na sliko videa
+    assert plan.report()['preprocess_image']['calls'] == 1
+
+
+def test_consecutive_affine_steps_are_fused(frame):
+    plan = AugmentationPlan([{"name": "moved", "transforms": [
+        {"op": "rotate_image", "angle": 90},
+        {"op": "apply_translation", "tx": 5, "ty": 3},
+        {"op": "change_contrast"},
+        {"op": "apply_zoom", "zoom_factor": 1.5},
+    ]}])
+    (_, _, steps, _), = plan.variants
+    assert [label for label, _ in steps] == ['rotate_image+apply_translation', 'change_contrast', 'apply_zoom']
+
+    # Rotacija za 90° in celoštevilski premik preslikata središča pikslov v središča, zato je rezultat enak
+    expected = apply_zoom(change_contrast(apply_translation(rotate_image(frame, 90), 5, 3)), 1.5)
+    np.testing.assert_array_equal(outputs(plan, frame)['moved'], expected)
+
+
+def test_ranges_expand_to_variants(frame):
+    plan = AugmentationPlan([{"name": "bright", "count": 3, "transforms": [
+        {"op": "adjust_brightness", "value": [10, 50]}]}])
+    names = [name for name, _, _, _ in plan.variants]
+    assert names == ['bright0', 'bright1', 'bright2']
+    values = [steps[0][1]['value'] for _, _, _, steps in plan.variants]
+    # Privzeta vrednost je int, zato so tudi vrednosti iz razpona cela števila
+    assert values == [10, 30, 50] and all(isinstance(value, int) for value in values)
+    np.testing.assert_array_equal(outputs(plan, frame)['bright1'], adjust_brightness(frame, 30))
+
+
+@pytest.mark.parametrize('plan,message', [
+    ([{"name": "x_y"}], 'name'),
+    ([{"name": "a"}, {"name": "a"}], 'Duplicate'),
+    ([{"name": "a", "count": 0}], 'count'),
+    ([{"name": "a", "transforms": [{"op": "blur"}]}], 'Unknown'),
+    ([{"name": "a", "transforms": [{"op": "rotate_image", "degrees": 10}]}], 'rotate_image'),
+    ([{"name": "a", "transforms": [{"op": "rotate_image", "angle": [1, 2, 3]}]}], 'range'),
+    # Napačen tip parametra se pokaže šele pri izvajanju: ujame ga preizkus na testni sliki
+    ([{"name": "a", "transforms": [{"op": "change_contrast", "contrast": "high"}]}], 'test frame'),
+])
+def test_invalid_plans(plan, message):
+    with pytest.raises(ValueError, match=message):
+        AugmentationPlan(plan)
+
+
+def test_dry_run_checks_output(monkeypatch):
+    monkeypatch.setitem(dataSet.AUGMENTATIONS, 'half', lambda image: image[::2])
+    monkeypatch.setitem(dataSet.AUGMENTATIONS, 'as_float', lambda image: image.astype(np.float32))
+    for op in ('half', 'as_float'):
+        with pytest.raises(ValueError, match='uint8 image of the input size'):
+            AugmentationPlan([{"name": "a", "transforms": [{"op": op}]}])
+
+
+def test_load_plan_from_json(tmp_path):
+    plan = [{"name": "flipped", "transforms": [{"op": "flip_image"}]}]
+    assert [v[0] for v in load_augmentation_plan(json.dumps(plan)).variants] == ['flipped']
+    path = tmp_path / 'plan.json'
+    path.write_text(json.dumps({"augmentations": plan}))
+    assert [v[0] for v in load_augmentation_plan(str(path)).variants] == ['flipped']
+    with pytest.raises(ValueError):
+        load_augmentation_plan('{"augmentations": {}}')
+
+
+def test_variant_boxes_follow_geometry():
+    plan = AugmentationPlan()
+    boxes = dict(zip([v[0] for v in plan.variants], plan.variant_boxes((100, 200), (10, 20, 30, 40))))
+    assert boxes['original'] == boxes['bright'] == boxes['contrast'] == (10, 20, 30, 40)
+    assert boxes['flipped'] == (160, 20, 30, 40)
+    # Premaknjen okvir se obreže na rob slike (višina 100)
+    assert boxes['translation'] == (60, 70, 30, 30)
+    assert plan.variant_boxes((100, 200), None) == [None] * 5
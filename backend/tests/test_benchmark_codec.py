@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from benchmark_codec import REFERENCE_BASELINE, REFERENCE_IMAGES, compare_results, load_images, run_benchmark
+
+
+def case(case_id, encode, decode=0.01, psnr=30.0, size=1000, output='a', decoded='b'):
+    return {'id': case_id, 'encode_seconds': encode, 'decode_seconds': decode, 'psnr': psnr,
+            'compressed_size': size, 'output_sha256': output, 'decoded_sha256': decoded}
+
+
+def test_small_slowdowns_are_noise():
+    baseline = {'results': [case('small', 0.00024), case('large', 0.050)]}
+    # 0.24 ms -> 0.32 ms je relativno +33 %, a pod absolutnim pragom
+    regressions, _ = compare_results([case('small', 0.00032), case('large', 0.055)], baseline)
+    assert regressions == []
+
+    regressions, _ = compare_results([case('small', 0.00032), case('large', 0.070)], baseline)
+    assert len(regressions) == 1 and regressions[0].startswith('large: encode_seconds')
+
+
+def test_ignore_time_still_checks_quality():
+    baseline = {'results': [case('x', 0.010)]}
+    regressions, notes = compare_results([case('x', 1.0, psnr=29.0, size=1200, output='c')], baseline,
+                                         time_tolerance=None)
+    assert len(regressions) == 2
+    assert not any('seconds' in regression for regression in regressions)
+    assert notes == ['x: compressed output changed']
+
+
+def test_missing_and_new_cases_are_notes():
+    regressions, notes = compare_results([case('new', 0.01)], {'results': [case('old', 0.01)]})
+    assert regressions == []
+    assert notes == ['new: not in baseline', 'old: missing from results']
+
+
+@pytest.mark.parametrize('version,color_mode', [(1, 'bgr'), (2, 'bgr'), (2, 'ycbcr420')])
+def test_reference_set_matches_baseline(version, color_mode):
+    with open(REFERENCE_BASELINE) as f:
+        baseline = json.load(f)
+    images = [(name, image) for name, image in load_images([REFERENCE_IMAGES], []) if name.endswith('.png')]
+    assert len(images) == 3
+
+    results = run_benchmark(images, [10], [version], [color_mode], repeat=1, min_time=0)
+    regressions, notes = compare_results(results, baseline, time_tolerance=None)
+    assert regressions == []
+    assert [note for note in notes if 'missing' not in note] == []
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+
+import cv2
+import pytest
+
+from compress_batch import CLAIMED_DIRECTORIES, OutputClaims, iter_directory, output_path_for, run_batch
+from conftest import make_image
+
+OPTIONS = {'faktor': 10, 'color_mode': 'bgr', 'target_bytes': None, 'min_psnr': None, 'max_edge': 0, 'square': False}
+
+
+@pytest.fixture
+def images(tmp_path):
+    source = tmp_path / 'in'
+    for relative in ('a/photo.jpg', 'b/photo.jpg', 'b/photo.png', 'b/c/other.png'):
+        path = source / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(path), make_image(24, 32))
+    return source
+
+
+def run(paths, base_dir, output_dir, **kwargs):
+    out = io.StringIO()
+    counts = run_batch(paths, base_dir, output_dir, OPTIONS, workers=1, out=out, **kwargs)
+    return counts, {result['path']: result for result in map(json.loads, out.getvalue().splitlines())}
+
+
+def test_output_path_mirrors_directories(tmp_path):
+    base = tmp_path / 'in'
+    assert output_path_for(str(base / 'a' / 'x.jpg'), str(base), 'out') == os.path.join('out', 'a', 'x.dct')
+    # Brez osnovne mape se zrcali celotna absolutna pot, zato se različne mape ne prekrivajo
+    first = output_path_for('/srv/a/photo.jpg', None, 'out')
+    second = output_path_for('/srv/b/photo.jpg', None, 'out')
+    assert first == os.path.join('out', 'srv', 'a', 'photo.dct') and first != second
+    with pytest.raises(ValueError):
+        output_path_for(str(tmp_path / 'elsewhere.jpg'), str(base), 'out')
+
+
+def test_output_claims_are_bounded():
+    claims = OutputClaims(max_directories=2)
+    assert claims.claim('out/a/photo.dct', 'a/photo.jpg') is None
+    assert claims.claim('out/a/photo.dct', 'a/photo.png') == 'a/photo.jpg'
+    for name in ('b', 'c', 'd'):
+        claims.claim(f'out/{name}/photo.dct', f'{name}/photo.jpg')
+    assert len(claims._directories) == 2
+    assert CLAIMED_DIRECTORIES >= 1
+
+
+def test_directory_batch_reports_collisions(images, tmp_path):
+    output_dir = tmp_path / 'out'
+    (succeeded, failed), results = run(iter_directory(str(images), recursive=True), str(images), str(output_dir))
+    assert (succeeded, failed) == (3, 1)
+    assert 'already used' in results[str(images / 'b' / 'photo.png')]['error']
+    for relative in ('a/photo.dct', 'b/photo.dct', 'b/c/other.dct'):
+        assert (output_dir / relative).is_file()
+
+    # Ponovni zagon preskoči obstoječe izhode
+    (succeeded, failed), results = run(iter_directory(str(images), recursive=True), str(images), str(output_dir),
+                                       skip_existing=True)
+    assert succeeded == 0 and results[str(images / 'a' / 'photo.jpg')]['skipped']
+
+
+def test_list_batch_streams_paths(images, tmp_path):
+    paths = [str(images / 'a' / 'photo.jpg'), str(images / 'b' / 'photo.jpg'), str(tmp_path / 'missing.jpg')]
+    # Generator: poti se ne zbirajo vnaprej
+    (succeeded, failed), results = run((path for path in paths), None, str(tmp_path / 'out'))
+    assert (succeeded, failed) == (2, 1)
+    assert results[paths[0]]['output'] != results[paths[1]]['output']
+    assert results[paths[2]]['success'] is False
+
+    (succeeded, failed), results = run(iter(paths[:2] + ['/elsewhere/x.jpg']), str(images), str(tmp_path / 'out2'))
+    assert (succeeded, failed) == (2, 1)
+    assert 'outside' in results['/elsewhere/x.jpg']['error']
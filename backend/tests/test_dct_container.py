@@ -0,0 +1,145 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from conftest import make_image
+from utils.image_compression_dct import (COLOR_MODES, HEADER_STRUCT, HEADER_V2_STRUCT, compress_image_array,
+                                         decompress_to_array, image_psnr, parse_binary, read_binary,
+                                         read_compressed_file, save_binary, serialize_coefficients)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# sha256 izhoda in dekodirane slike prvotnega kodirnika (pred DCT v matrični obliki in formatom v2)
+# za make_image(height, width) pri danem faktorju
+BASELINE_V1 = {
+    (61, 83, 1): ('b19dd532e4a51de901b84ba5a86c9e6df884fdfd800fe0a8830c017b7209357a',
+                  'c2f0c012f2592163197589452608e26e4e7fbb8af4810f6e12c395c518d3df19'),
+    (61, 83, 5): ('e8758413174ef63529e294602ec964cdcb1ac15a70506d4ebc772a45ab2b670c',
+                  '52dcee74df3c3c021ec87c4f86a022a79a52eb128714ca19691c5413a45bb330'),
+    (61, 83, 30): ('e9897d24592b6ad5e54ea881fca498c79f4f2a4e2369563cfd7ba1c077605d16',
+                   'ec19dfae2e1fd9b1a2b2c222bfac4de09e58d009c4f90c51ad764895a6092325'),
+    (16, 24, 5): ('809e59114a37e0672a154e96804460c4f522f76fa3a789d911559e8ad960a4a6',
+                  '0d683cd8da233463a56d3b3399c45bf4fa04adca8f91dfc7f4a33a169e097d6a'),
+}
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize('dct_engine', ['reference', 'separable'])
+@pytest.mark.parametrize('height,width,faktor', sorted(BASELINE_V1))
+def test_v1_matches_baseline_encoder(height, width, faktor, dct_engine):
+    encoded_sha, decoded_sha = BASELINE_V1[height, width, faktor]
+    data = compress_image_array(make_image(height, width), faktor, dct_engine, 1)
+    assert sha256(data) == encoded_sha
+    assert sha256(decompress_to_array(data, 'reference').tobytes()) == decoded_sha
+
+
+def test_reads_baseline_file(tmp_path):
+    path = os.path.join(DATA_DIR, 'baseline-16x24-f5.dct')
+    with open(path, 'rb') as f:
+        legacy = f.read()
+    assert sha256(legacy) == BASELINE_V1[16, 24, 5][0]
+
+    data = read_compressed_file(path)
+    assert (data['version'], data['orig_width'], data['orig_height'], data['faktor']) == (1, 24, 16, 5)
+    np.testing.assert_array_equal(data['coefficients'][0], parse_binary(legacy)['coefficients'][0])
+
+    # Zapis prek save_binary (RLE bloki) vrne iste bajte
+    blocks = read_binary(path)
+    output = tmp_path / 'copy.dct'
+    save_binary(blocks['blocks'], str(output), blocks['width'], blocks['height'],
+                blocks['orig_width'], blocks['orig_height'], blocks['faktor'])
+    assert output.read_bytes() == legacy
+
+
+def reserialize(data):
+    parsed = parse_binary(data)
+    return serialize_coefficients(parsed['coefficients'], parsed['width'], parsed['height'], parsed['orig_width'],
+                                  parsed['orig_height'], parsed['faktor'], parsed['version'], parsed['color_mode'])
+
+
+@pytest.mark.parametrize('color_mode', COLOR_MODES)
+def test_v2_round_trip(image, color_mode):
+    data = compress_image_array(image, 5, color_mode=color_mode)
+    parsed = parse_binary(data)
+    assert (parsed['version'], parsed['color_mode']) == (2, color_mode)
+    assert (parsed['orig_width'], parsed['orig_height']) == (83, 61)
+    # Huffmanovo kodiranje je brez izgub: ponovni zapis prebranih koeficientov vrne iste bajte
+    assert reserialize(data) == data
+    decoded = decompress_to_array(data)
+    assert decoded.shape == image.shape and image_psnr(image, decoded) > 20  # šum testne slike omeji PSNR
+
+    if color_mode == 'bgr':
+        # Enaki kvantizirani koeficienti kot v v1, zato enaka slika in manjša datoteka
+        v1 = compress_image_array(image, 5, version=1)
+        np.testing.assert_array_equal(decompress_to_array(v1), decoded)
+        assert len(data) < len(v1)
+
+
+def test_v2_round_trip_grayscale():
+    image = make_image(30, 45, channels=1)
+    data = compress_image_array(image, 5)
+    assert reserialize(data) == data
+    decoded = decompress_to_array(data)
+    assert decoded.shape[:2] == (30, 45) and image_psnr(image, decoded.reshape(image.shape)) > 20
+
+
+def test_v1_rejects_color_modes(image):
+    with pytest.raises(ValueError):
+        compress_image_array(image, 5, version=1, color_mode='ycbcr420')
+
+
+@pytest.mark.parametrize('version,color_mode', [(1, 'bgr'), (2, 'bgr'), (2, 'ycbcr420')])
+def test_truncated_input_raises(image, version, color_mode):
+    data = compress_image_array(image, 5, version=version, color_mode=color_mode)
+    for cut in (0, 3, 10, 24, 40, len(data) // 2, len(data) - 1):
+        with pytest.raises(ValueError, match='poškodovani'):
+            decompress_to_array(data[:cut])
+
+
+@pytest.mark.parametrize('version', [1, 2])
+def test_corrupt_header_raises(image, version):
+    data = bytearray(compress_image_array(image, 5, version=version))
+    # v1: število kanalov na začetku; v2: število kanalov za magic in verzijo
+    channel_offset = 0 if version == 1 else 5
+    data[channel_offset] = 7
+    with pytest.raises(ValueError, match='poškodovani'):
+        decompress_to_array(bytes(data))
+
+    data = bytearray(compress_image_array(image, 5, version=version))
+    # Velikost slike, ki zahteva več blokov, kot jih lahko vsebuje bitni tok
+    header = HEADER_STRUCT if version == 1 else HEADER_V2_STRUCT
+    fields = list(header.unpack_from(data))
+    fields[-4 if version == 2 else 1] *= 64
+    fields[-2 if version == 2 else 3] *= 64
+    header.pack_into(data, 0, *fields)
+    with pytest.raises(ValueError, match='poškodovani'):
+        decompress_to_array(bytes(data))
+
+
+@pytest.mark.parametrize('version', [1, 2])
+def test_random_corruption_is_value_error(image, version):
+    # Pokvarjeni podatki se ali dekodirajo v sliko prave velikosti ali sprožijo ValueError, nikoli druge napake
+    data = compress_image_array(image, 5, version=version)
+    header_size = HEADER_STRUCT.size if version == 1 else HEADER_V2_STRUCT.size
+    rng = np.random.default_rng(version)
+    for _ in range(50):
+        corrupt = bytearray(data)
+        for position in rng.integers(header_size, len(data), 4):
+            corrupt[position] = rng.integers(0, 256)
+        try:
+            decoded = decompress_to_array(bytes(corrupt))
+        except ValueError:
+            continue
+        assert decoded.shape == image.shape
+
+
+def test_unsupported_version_raises(image):
+    data = bytearray(compress_image_array(image, 5))
+    data[4] = 3
+    with pytest.raises(ValueError, match='verzija'):
+        decompress_to_array(bytes(data))
@@ -0,0 +1,95 @@
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from codec_server import FRAME_HEADER, OP_DECOMPRESS, OP_STATS, STATUS_OK, serve_stream
+from conftest import make_image
+from utils.decoded_image_cache import DISK_LOW_WATER, DecodedImageCache, make_cache_key
+from utils.image_compression_dct import compress_image_array
+
+
+def test_cache_key_depends_on_data_and_params():
+    key = make_cache_key(b'abc', image_format='png', scale=1)
+    assert key == make_cache_key(b'abc', scale=1, image_format='png')
+    assert key != make_cache_key(b'abd', image_format='png', scale=1)
+    assert key != make_cache_key(b'abc', image_format='png', scale=2)
+
+
+def test_memory_lru_eviction():
+    cache = DecodedImageCache(max_bytes=30)
+    for key in 'abc':
+        cache.put(key, key.encode() * 10)
+    assert cache.get('a') == b'a' * 10  # 'a' je zdaj nazadnje uporabljen
+    cache.put('d', b'd' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+    cache.put('huge', b'x' * 31)  # večje od omejitve se ne shrani
+    assert cache.get('huge') is None
+    stats = cache.stats()
+    assert stats['bytes'] <= 30 and stats['evictions'] == 1 and stats['misses'] == 2
+
+
+def disk_files(directory):
+    return [os.path.join(root, name) for root, _, files in os.walk(directory) for name in files]
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    DecodedImageCache(max_bytes=100, disk_dir=str(tmp_path)).put('ab' * 32, b'value')
+    cache = DecodedImageCache(max_bytes=100, disk_dir=str(tmp_path))
+    assert cache.get('ab' * 32) == b'value'
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.get('ab' * 32) == b'value' and cache.stats()['hits'] == 1
+
+
+def test_disk_eviction_to_low_water_mark(tmp_path):
+    cache = DecodedImageCache(max_bytes=1000, disk_dir=str(tmp_path), disk_max_bytes=10000)
+    scans = []
+    original = cache._disk_files
+
+    def counted():
+        scans.append(1)
+        return original()
+
+    cache._disk_files = counted
+    for i in range(200):
+        cache.put(f'{i:064x}', b'x' * 100)
+
+    total = sum(os.path.getsize(path) for path in disk_files(tmp_path))
+    assert total <= 10000
+    # Po izrinjanju ostane prostor za več zapisov, zato se mapa ne pregleda ob vsakem zapisu
+    assert len(scans) <= 200 * 100 / (10000 * (1 - DISK_LOW_WATER)) + 2
+    # Najnovejši zapisi ostanejo, najstarejši so izrinjeni
+    assert cache.get(f'{199:064x}') is not None
+    assert not os.path.exists(cache._disk_path(f'{0:064x}'))
+
+
+def request_frame(request_id, op, options, data=b''):
+    options_bytes = json.dumps(options).encode('utf-8')
+    return FRAME_HEADER.pack(request_id, op, len(options_bytes), len(data)) + options_bytes + data
+
+
+def read_frames(stream):
+    frames = {}
+    buffer = stream.getvalue()
+    while buffer:
+        request_id, status, meta_length, data_length = FRAME_HEADER.unpack_from(buffer)
+        start = FRAME_HEADER.size
+        meta = json.loads(buffer[start:start + meta_length])
+        frames[request_id] = (status, meta, buffer[start + meta_length:start + meta_length + data_length])
+        buffer = buffer[start + meta_length + data_length:]
+    return frames
+
+
+def test_server_looks_up_cache_before_workers():
+    compressed = compress_image_array(make_image(40, 48), 10)
+    cache = DecodedImageCache()
+    output = io.BytesIO()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        serve_stream(io.BytesIO(request_frame(1, OP_DECOMPRESS, {}, compressed)), output, pool, cache)
+        serve_stream(io.BytesIO(request_frame(2, OP_DECOMPRESS, {}, compressed) +
+                                request_frame(3, OP_STATS, {})), output, pool, cache)
+    frames = read_frames(output)
+    assert frames[1][0] == STATUS_OK and frames[1][2] == frames[2][2]
+    assert frames[3][1]['cache']['hits'] == 1 and frames[3][1]['cache']['misses'] == 1
@@ -0,0 +1,181 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from utils.embedding_index import (MATCH_THRESHOLD, MIN_THRESHOLD, EmbeddingIndex, build_templates,
+                                   calibrate_threshold, normalize)
+
+
+def random_templates(rng, count, dim=16):
+    return normalize(rng.standard_normal((count, dim))).astype(np.float16)
+
+
+def generation_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.npy'))
+
+
+def test_update_and_lookup(tmp_path):
+    rng = np.random.default_rng(0)
+    index = EmbeddingIndex(str(tmp_path))
+    assert len(index) == 0 and 'alice' not in index
+
+    alice, bob = random_templates(rng, 2), random_templates(rng, 3)
+    index.update('bob', bob, 0.9)
+    index.update('alice', alice)
+
+    reader = EmbeddingIndex(str(tmp_path))
+    assert len(reader) == 2
+    assert 'alice' in reader and 'carol' not in reader and 'alicex' not in reader
+    np.testing.assert_array_equal(reader.templates('alice'), alice)
+    np.testing.assert_array_equal(reader.templates('bob'), bob)
+    assert reader.threshold('bob') == pytest.approx(0.9)
+    assert reader.threshold('alice') == MATCH_THRESHOLD
+
+    match, similarity = reader.match('bob', bob[1].astype(np.float32))
+    assert match and similarity == pytest.approx(1.0, abs=1e-3)
+    with pytest.raises(KeyError):
+        reader.similarity('carol', bob)
+
+
+def test_replace_and_remove(tmp_path):
+    rng = np.random.default_rng(1)
+    index = EmbeddingIndex(str(tmp_path))
+    index.update('alice', random_templates(rng, 2))
+    index.update('bob', random_templates(rng, 1))
+    replacement = random_templates(rng, 4)
+    index.update('alice', replacement)
+    np.testing.assert_array_equal(index.templates('alice'), replacement)
+    assert index.all_templates(exclude='alice').shape == (1, 16)
+
+    index.remove('alice')
+    assert 'alice' not in index and len(index) == 1
+    index.remove('alice')  # odstranitev neobstoječega uporabnika ni napaka
+
+
+def test_dimension_mismatch(tmp_path):
+    index = EmbeddingIndex(str(tmp_path))
+    index.update('alice', np.ones((1, 16)))
+    with pytest.raises(ValueError):
+        index.update('bob', np.ones((1, 8)))
+    with pytest.raises(ValueError):
+        index.update('bob', np.zeros((0, 16)))
+
+
+def test_previous_generation_is_kept(tmp_path):
+    rng = np.random.default_rng(2)
+    index = EmbeddingIndex(str(tmp_path))
+    index.update('alice', random_templates(rng, 2))
+
+    # Bralec odpre generacijo 1, nato pride ena posodobitev: njegova matrika mora še obstajati
+    reader = EmbeddingIndex(str(tmp_path))
+    expected = np.array(reader.templates('alice'))
+    index.update('bob', random_templates(rng, 1))
+    assert 'embedding_templates.1.npy' in generation_files(tmp_path)
+    np.testing.assert_array_equal(reader.templates('alice'), expected)
+
+    # Po še eni posodobitvi ostaneta le zadnji dve generaciji
+    index.update('carol', random_templates(rng, 1))
+    assert generation_files(tmp_path) == ['embedding_rows.2.npy', 'embedding_rows.3.npy',
+                                          'embedding_templates.2.npy', 'embedding_templates.3.npy']
+
+
+def test_reader_retries_after_generation_removed(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    index = EmbeddingIndex(str(tmp_path))
+    index.update('alice', random_templates(rng, 2))
+
+    reader = EmbeddingIndex(str(tmp_path))
+    read_index = reader._read_index
+    stale = read_index()
+    calls = []
+
+    def read_stale_once():
+        # Prvo branje vrne indeks generacije, ki jo je posodobitev vmes že odstranila
+        calls.append(1)
+        return stale if len(calls) == 1 else read_index()
+
+    monkeypatch.setattr(reader, '_read_index', read_stale_once)
+    for name in ('bob', 'carol'):
+        index.update(name, random_templates(rng, 1))
+    assert 'embedding_templates.1.npy' not in generation_files(tmp_path)
+    assert 'carol' in reader and len(calls) == 2
+
+
+def test_reads_version_1_index(tmp_path):
+    templates = np.eye(3, 8, dtype=np.float16)
+    np.save(tmp_path / 'embedding_templates.1.npy', templates)
+    with open(tmp_path / 'embedding_index.json', 'w') as f:
+        json.dump({'version': 1, 'generation': 1, 'dim': 8, 'file': 'embedding_templates.1.npy',
+                   'users': {'zed': {'offset': 0, 'count': 2}, 'amy': {'offset': 2, 'count': 1}}}, f)
+
+    index = EmbeddingIndex(str(tmp_path))
+    assert len(index) == 2
+    np.testing.assert_array_equal(index.templates('amy'), templates[2:])
+    assert index.threshold('zed') == MATCH_THRESHOLD
+
+    index.update('bob', np.ones((1, 8)))
+    np.testing.assert_array_equal(EmbeddingIndex(str(tmp_path)).templates('zed'), templates[:2])
+
+
+def test_build_templates():
+    rng = np.random.default_rng(4)
+    embeddings = rng.standard_normal((20, 16))
+    templates = build_templates(embeddings, max_templates=3)
+    assert templates.shape == (3, 16) and templates.dtype == np.float16
+    np.testing.assert_allclose(np.linalg.norm(templates.astype(np.float32), axis=1), 1, atol=1e-2)
+    assert build_templates(embeddings[:1]).shape == (1, 16)
+    with pytest.raises(ValueError):
+        build_templates(np.zeros((0, 16)))
+
+
+def user_embeddings(rng, frames=30, per_frame=3, noise=0.6, dim=64):
+    # Augmentacije iste slike videa so si bolj podobne kot različne slike
+    center = rng.standard_normal(dim)
+    frame_centers = center + noise * rng.standard_normal((frames, dim))
+    embeddings = np.repeat(frame_centers, per_frame, axis=0) + 0.1 * rng.standard_normal((frames * per_frame, dim))
+    return embeddings, np.repeat(np.arange(frames), per_frame)
+
+
+def test_calibrate_without_impostors_keeps_default_floor():
+    rng = np.random.default_rng(5)
+    # Razpršeni izrezi: lastne podobnosti so nizke, prag pa ne sme pasti pod privzetega
+    embeddings, groups = user_embeddings(rng, noise=2.0)
+    threshold, stats = calibrate_threshold(embeddings, None, groups)
+    assert threshold == pytest.approx(MATCH_THRESHOLD)
+    assert 'impostor_max' not in stats
+    threshold, _ = calibrate_threshold(embeddings, np.zeros((0, 64)), groups)
+    assert threshold == pytest.approx(MATCH_THRESHOLD)
+
+
+def test_calibrate_without_impostors_may_raise_threshold():
+    rng = np.random.default_rng(6)
+    embeddings, groups = user_embeddings(rng, noise=0.1)
+    threshold, stats = calibrate_threshold(embeddings, None, groups)
+    assert MATCH_THRESHOLD < threshold <= 1.0
+    assert stats['false_reject'] <= 0.1
+
+
+def test_calibrate_with_impostors():
+    rng = np.random.default_rng(7)
+    embeddings, groups = user_embeddings(rng, noise=0.6)
+    impostors = rng.standard_normal((6, 64))
+    threshold, stats = calibrate_threshold(embeddings, impostors, groups)
+    assert threshold >= MIN_THRESHOLD
+    assert threshold > stats['impostor_max']
+    assert stats['false_accept'] == 0.0
+    assert stats['holdout'] == 18  # 20 % od 30 slik, vse augmentacije izločene slike skupaj
+
+    # Tuja predloga, zelo podobna uporabniku, dvigne prag nad svojo podobnost
+    close = embeddings.mean(axis=0, keepdims=True) + 0.05 * rng.standard_normal((1, 64))
+    raised, raised_stats = calibrate_threshold(embeddings, np.vstack([impostors, close]), groups)
+    assert raised >= min(raised_stats['impostor_max'] + 0.02, 1.0) - 1e-6
+    assert raised >= threshold
+
+
+def test_calibrate_too_few_samples():
+    rng = np.random.default_rng(8)
+    embeddings, groups = user_embeddings(rng, frames=5)
+    threshold, stats = calibrate_threshold(embeddings, None, groups)
+    assert threshold is None and stats['holdout'] < 5
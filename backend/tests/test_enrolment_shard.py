@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from utils.enrolment_shard import (SHARD_FACES, SHARD_FILES, SHARD_FRAMES, SHARD_INDEX, EnrolmentShardWriter,
+                                   has_enrolment_shard, load_enrolment_shard, remove_enrolment_shard)
+
+SIZE = (8, 6)  # (širina, višina) - majhni izrezi, oblika glave .npy je enaka kot pri 224 x 224
+
+
+def faces(count, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (count, SIZE[1], SIZE[0], 3), dtype=np.uint8)
+
+
+def write(directory, images, labels, frames=None):
+    with EnrolmentShardWriter(str(directory), SIZE) as writer:
+        for i, (face, label) in enumerate(zip(images, labels)):
+            writer.append(face, label, i if frames is None else frames[i])
+    return writer
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(tmp_path, mmap):
+    images = faces(5)
+    labels = ['original', 'bright', 'original', 'flipped', 'bright']
+    writer = write(tmp_path, images, labels, frames=[0, 0, 3, 3, 7])
+    assert writer.count == 5 and writer.labels == ['original', 'bright', 'flipped']
+
+    assert has_enrolment_shard(str(tmp_path))
+    loaded, loaded_labels, index = load_enrolment_shard(str(tmp_path), mmap=mmap)
+    assert isinstance(loaded, np.memmap) == mmap
+    np.testing.assert_array_equal(loaded, images)
+    assert list(loaded_labels) == labels
+    assert index['count'] == 5 and index['image_size'] == list(SIZE)
+    np.testing.assert_array_equal(np.load(tmp_path / SHARD_FRAMES), [0, 0, 3, 3, 7])
+    # Začasna datoteka izrezov ne ostane v mapi
+    assert sorted(os.listdir(tmp_path)) == sorted(SHARD_FILES)
+
+
+def test_empty_shard(tmp_path):
+    write(tmp_path, [], [])
+    loaded, labels, _ = load_enrolment_shard(str(tmp_path))
+    assert loaded.shape == (0, SIZE[1], SIZE[0], 3) and len(labels) == 0
+
+
+def test_rejects_wrong_face_shape(tmp_path):
+    with EnrolmentShardWriter(str(tmp_path), SIZE) as writer:
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((SIZE[0], SIZE[1], 3), dtype=np.uint8), 'original')
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((SIZE[1], SIZE[0], 3), dtype=np.float32), 'original')
+    assert load_enrolment_shard(str(tmp_path))[0].shape[0] == 0
+
+
+def test_failed_write_keeps_previous_shard(tmp_path):
+    previous = faces(2)
+    write(tmp_path, previous, ['a', 'b'])
+    with pytest.raises(RuntimeError):
+        with EnrolmentShardWriter(str(tmp_path), SIZE) as writer:
+            writer.append(faces(1, seed=1)[0], 'c')
+            raise RuntimeError('video failed')
+    loaded, labels, _ = load_enrolment_shard(str(tmp_path))
+    np.testing.assert_array_equal(loaded, previous)
+    assert list(labels) == ['a', 'b'] and sorted(os.listdir(tmp_path)) == sorted(SHARD_FILES)
+
+
+def test_incomplete_or_unknown_shard(tmp_path):
+    write(tmp_path, faces(3), ['a'] * 3)
+    index_path = tmp_path / SHARD_INDEX
+    index = json.loads(index_path.read_text())
+
+    index_path.write_text(json.dumps(dict(index, count=4)))
+    with pytest.raises(ValueError, match='nepopoln'):
+        load_enrolment_shard(str(tmp_path))
+    index_path.write_text(json.dumps(dict(index, version=99)))
+    with pytest.raises(ValueError, match='verzija'):
+        load_enrolment_shard(str(tmp_path))
+
+    remove_enrolment_shard(str(tmp_path))
+    assert not has_enrolment_shard(str(tmp_path)) and os.listdir(tmp_path) == []
+    remove_enrolment_shard(str(tmp_path))  # odstranitev neobstoječega nabora ni napaka
+    assert not (tmp_path / SHARD_FACES).exists()
@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+import pytest
+
+import dataSet
+from dataSet import sample_frames, video_frame_count
+
+
+class FakeCapture:
+    """
+    Nadomestek za cv2.VideoCapture: slike s podanimi časovnimi oznakami (ms), vrednost piksla je indeks slike.
+    """
+
+    def __init__(self, timestamps, fps=0.0, known_count=True, seekable=True):
+        self.timestamps = list(timestamps)
+        self.fps = fps
+        self.known_count = known_count
+        self.seekable = seekable
+        self.position = 0  # naslednja slika za grab()
+        self.grabbed = None
+        self.retrieved = 0
+        self.seeks = 0
+
+    def grab(self):
+        if self.position >= len(self.timestamps):
+            self.grabbed = None
+            return False
+        self.grabbed = self.position
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        if self.grabbed is None:
+            return False, None
+        self.retrieved += 1
+        return True, np.full((2, 2, 3), self.grabbed % 256, dtype=np.uint8)
+
+    def read(self):
+        return self.retrieve() if self.grab() else (False, None)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.timestamps) if self.known_count else 0
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.timestamps[self.grabbed] if self.grabbed is not None else 0.0
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        return 0.0
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES or not self.seekable:
+            return False
+        self.seeks += 1
+        self.position = int(value)
+        return True
+
+
+def indices(frames):
+    pairs = list(frames)
+    # Indeks, ki ga vrne generator, se ujema z dejansko prebrano sliko
+    assert all(int(frame[0, 0, 0]) == index % 256 for index, frame in pairs)
+    return [index for index, _ in pairs]
+
+
+def test_rate_sampling_uses_timestamps():
+    # 30 slik/s, vzorčenje 10 slik/s: vsaka tretja slika, dekodirajo se le izbrane
+    cap = FakeCapture([i * 1000 / 30 for i in range(90)], fps=30)
+    assert indices(sample_frames(cap, fps=10)) == list(range(0, 90, 3))
+    assert cap.retrieved == 30
+
+
+def test_rate_sampling_with_variable_frame_rate():
+    # Prva sekunda 10 slik/s, druga 40 slik/s: pri 5 slikah/s po 5 slik v vsaki sekundi
+    timestamps = [i * 100.0 for i in range(10)] + [1000 + i * 25.0 for i in range(40)]
+    selected = indices(sample_frames(FakeCapture(timestamps), fps=5))
+    assert [timestamps[i] for i in selected] == [i * 200.0 for i in range(10)]
+
+
+def test_rate_sampling_below_requested_rate():
+    # Video ima manj slik na sekundo, kot jih želimo: vsaka slika enkrat, brez podvajanja
+    assert indices(sample_frames(FakeCapture([i * 100.0 for i in range(12)]), fps=20)) == list(range(12))
+
+
+def test_rate_sampling_without_timestamps():
+    # Brez časovnih oznak se čas izračuna iz FPS
+    assert indices(sample_frames(FakeCapture([0.0] * 60, fps=30), fps=15)) == list(range(0, 60, 2))
+
+
+@pytest.mark.parametrize('known_count', [True, False])
+def test_count_sampling_spreads_frames(known_count):
+    cap = FakeCapture([0.0] * 101, known_count=known_count)
+    assert indices(sample_frames(cap, frame_count=5)) == [0, 25, 50, 75, 100]
+    assert cap.retrieved == 5
+    # Več zahtevanih slik, kot jih ima video: vsaka slika enkrat
+    assert indices(sample_frames(FakeCapture([0.0] * 4), frame_count=10)) == [0, 1, 2, 3]
+
+
+def test_count_sampling_seeks_over_large_gaps(monkeypatch):
+    monkeypatch.setattr(dataSet, 'SEEK_MIN_GAP', 10)
+    cap = FakeCapture([0.0] * 201)
+    assert indices(sample_frames(cap, frame_count=3)) == [0, 100, 200]
+    assert cap.seeks == 2
+
+    # Če iskanje ni podprto, se slike preskočijo z grab()
+    cap = FakeCapture([0.0] * 201, seekable=False)
+    assert indices(sample_frames(cap, frame_count=3)) == [0, 100, 200]
+
+
+def test_unknown_frame_count_rewinds():
+    cap = FakeCapture([0.0] * 7, known_count=False)
+    assert video_frame_count(cap) == 7 and cap.position == 0
+    with pytest.raises(ValueError):
+        video_frame_count(FakeCapture([0.0] * 7, known_count=False, seekable=False))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        sample_frames(FakeCapture([]), frame_count=0)
+    with pytest.raises(ValueError):
+        sample_frames(FakeCapture([]), fps=0)
+
+
+def test_real_video(tmp_path, monkeypatch):
+    path = str(tmp_path / 'video.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (32, 24))
+    if not writer.isOpened():
+        pytest.skip('MJPG writer is not available')
+    for i in range(95):
+        writer.write(np.full((24, 32, 3), i * 2, dtype=np.uint8))
+    writer.release()
+
+    def sampled(**kwargs):
+        cap = cv2.VideoCapture(path)
+        try:
+            return [(index, int(frame.mean() / 2 + 0.5)) for index, frame in sample_frames(cap, **kwargs)]
+        finally:
+            cap.release()
+
+    assert [index for index, _ in sampled(fps=10)] == list(range(0, 95, 3))
+    expected = [0, 24, 47, 70, 94]
+    assert sampled(frame_count=5) == list(zip(expected, expected))
+    monkeypatch.setattr(dataSet, 'SEEK_MIN_GAP', 10)
+    assert sampled(frame_count=5) == list(zip(expected, expected))
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from utils.huffman_coding import (MAX_CODE_LENGTH, NUM_DC_SYMBOLS, decode_blocks_at, decode_coefficients,
+                                  decode_payload, decoder_tables, encode_coefficients,
+                                  read_entropy_tables)
+
+
+def random_blocks(rng, count):
+    zz = np.zeros((count, 64), dtype=np.int16)
+    zz[:, 0] = rng.integers(-2048, 2048, count)
+    mask = rng.random((count, 63)) < 0.2
+    zz[:, 1:][mask] = rng.integers(-300, 300, mask.sum())
+    zz[0, 0], zz[1, 0] = 32767, -32768  # največja DC razlika (razred 16)
+    zz[2, 63], zz[3, 1] = 32767, -32767
+    return zz
+
+
+def test_round_trip_with_block_offsets():
+    rng = np.random.default_rng(0)
+    zz = random_blocks(rng, 50)
+    dc_reset = np.zeros(50, dtype=bool)
+    dc_reset[[0, 20]] = True
+    data, block_bits = encode_coefficients(zz, dc_reset, return_block_bits=True)
+
+    decoded, end = decode_coefficients(b'xx' + data, 2, 50, dc_reset)
+    np.testing.assert_array_equal(decoded, zz)
+    assert end == len(data) + 2
+
+    # Od bloka s ponastavljenim napovednikom se da dekodirati neodvisno
+    dc_tables, ac_tables, payload, _ = read_entropy_tables(data, 0)
+    np.testing.assert_array_equal(decode_blocks_at(payload, dc_tables, ac_tables, int(block_bits[20]), 30), zz[20:])
+
+
+def single_code_table(symbol):
+    # Ena koda dolžine 1 ('0') za podani simbol
+    return [1] + [0] * (MAX_CODE_LENGTH - 1), [symbol]
+
+
+def test_rejects_out_of_range_dc_size_symbol():
+    data = bytearray(encode_coefficients(np.zeros((2, 64), dtype=np.int16), np.array([True, False])))
+    # Prva DC tabela: BITS[16], nato HUFFVAL z enim simbolom (razred 0) - zamenjamo ga z neveljavnim
+    assert sum(data[:MAX_CODE_LENGTH]) == 1
+    data[MAX_CODE_LENGTH] = NUM_DC_SYMBOLS
+    with pytest.raises(ValueError, match='poškodovani'):
+        read_entropy_tables(bytes(data), 0)
+
+    # Tudi tabela, ki ne pride iz read_entropy_tables, ne sme uporabiti simbola kot števila bitov
+    dc_tables = decoder_tables(*single_code_table(NUM_DC_SYMBOLS + 3))
+    ac_tables = decoder_tables(*single_code_table(0x00))
+    with pytest.raises(ValueError, match='poškodovani'):
+        decode_payload(np.zeros(8, dtype=np.uint8), dc_tables, ac_tables, 1, np.zeros(1, dtype=bool))
+
+
+def test_rejects_dc_prediction_overflow():
+    # Razred 16 z bitoma 1...1 je DC razlika +65535, kar ne gre v int16
+    dc_tables = decoder_tables(*single_code_table(16))
+    ac_tables = decoder_tables(*single_code_table(0x00))
+    payload = np.array([0b01111111, 0b11111111, 0b10000000], dtype=np.uint8)  # '0' + 16 enic + EOB '0'
+    with pytest.raises(ValueError, match='poškodovani'):
+        decode_payload(payload, dc_tables, ac_tables, 1, np.zeros(1, dtype=bool))
+
+
+def test_rejects_truncated_stream():
+    rng = np.random.default_rng(1)
+    zz = random_blocks(rng, 10)
+    dc_reset = np.zeros(10, dtype=bool)
+    data = encode_coefficients(zz, dc_reset)
+    for cut in (5, MAX_CODE_LENGTH + 2, len(data) // 2, len(data) - 1):
+        with pytest.raises(ValueError, match='poškodovani'):
+            decode_coefficients(data[:cut], 0, 10, dc_reset)
+    with pytest.raises(ValueError, match='poškodovani'):
+        decode_coefficients(data, 0, 10 ** 9, dc_reset)
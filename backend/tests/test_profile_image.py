@@ -0,0 +1,58 @@
+import io
+
+import cv2
+import pytest
+
+import compress_profile_image
+from compress_profile_image import load_profile_image, reduced_read_flag, sniff_image_size
+from conftest import make_image
+
+
+def encoded(extension, height=150, width=230):
+    ok, buffer = cv2.imencode(extension, make_image(height, width))
+    assert ok
+    return buffer.tobytes()
+
+
+def sniff(data):
+    return sniff_image_size(io.BytesIO(data))
+
+
+@pytest.mark.parametrize('extension', ['.jpg', '.png'])
+def test_sniffs_valid_headers(extension):
+    assert sniff(encoded(extension)) == (230, 150)
+
+
+def test_sniffs_jpeg_after_exif_segment():
+    data = encoded('.jpg')
+    app1 = b'\xff\xe1' + (2 + 40).to_bytes(2, 'big') + b'Exif\x00\x00' + bytes(34)
+    assert sniff(data[:2] + app1 + data[2:]) == (230, 150)
+
+
+def test_rejects_truncated_and_malformed_headers():
+    jpeg, png = encoded('.jpg'), encoded('.png')
+    assert sniff(b'') is None and sniff(b'GIF89a' + bytes(20)) is None
+    assert sniff(png[:20]) is None
+    assert sniff(png[:12] + b'IDAT' + png[16:]) is None
+    assert sniff(png[:16] + bytes(4) + png[20:]) is None  # širina 0
+    # Segment, daljši od podatkov
+    assert sniff(jpeg[:2] + b'\xff\xe0\xff\xff' + bytes(10)) is None
+    # Dolžina segmenta manjša od 2 in smeti namesto oznake
+    assert sniff(jpeg[:2] + b'\xff\xe0\x00\x01' + jpeg[2:]) is None
+    assert sniff(jpeg[:2] + b'\x12\x34' + jpeg[2:]) is None
+    for cut in range(2, jpeg.index(b'\xff\xc0') + 10):
+        assert sniff(jpeg[:cut]) is None
+
+
+def test_mismatched_header_falls_back_to_full_decode(monkeypatch):
+    # Glava, ki ne ustreza sliki, bi izbrala 8x zmanjšano branje; po dekodiranju se neujemanje opazi
+    monkeypatch.setattr(compress_profile_image, 'sniff_image_size', lambda stream: (3200, 2400))
+    image, info = load_profile_image(image_data=encoded('.png', 600, 800), max_edge=300)
+    assert (info['source_width'], info['source_height']) == (800, 600)
+    assert image.shape == (225, 300, 3)
+
+
+def test_reduced_read_keeps_requested_edge():
+    image, info = load_profile_image(image_data=encoded('.jpg', 600, 800), max_edge=200)
+    assert (info['source_width'], info['source_height']) == (800, 600)
+    assert (info['width'], info['height']) == (200, 150) and image.shape == (150, 200, 3)
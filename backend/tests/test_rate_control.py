@@ -0,0 +1,47 @@
+import pytest
+
+from utils.image_compression_dct import (compress_image_array, compress_image_array_to_target, decompress_to_array,
+                                         image_psnr)
+
+
+def sizes(image, version, color_mode):
+    return {faktor: len(compress_image_array(image, faktor, version=version, color_mode=color_mode))
+            for faktor in range(1, 16)}
+
+
+@pytest.mark.parametrize('version,color_mode', [(1, 'bgr'), (2, 'bgr'), (2, 'ycbcr420')])
+def test_target_bytes_is_never_exceeded(image, version, color_mode):
+    by_faktor = sizes(image, version, color_mode)
+    smallest, largest = min(by_faktor.values()), max(by_faktor.values())
+    for target in (smallest, (smallest + largest) // 2, largest - 1, largest, largest * 2):
+        data, info = compress_image_array_to_target(image, target_bytes=target, version=version,
+                                                    color_mode=color_mode)
+        assert info['met'] and len(data) == info['compressed_size'] <= target
+        # Enak rezultat kot pri neposredni kompresiji z izbranim faktorjem
+        assert data == compress_image_array(image, info['faktor'], version=version, color_mode=color_mode)
+        assert info['psnr'] == pytest.approx(image_psnr(image, decompress_to_array(data)))
+
+
+def test_unreachable_target_returns_smallest(image):
+    by_faktor = sizes(image, 2, 'bgr')
+    data, info = compress_image_array_to_target(image, target_bytes=min(by_faktor.values()) - 1)
+    assert not info['met']
+    assert len(data) <= min(by_faktor[faktor] for faktor in (8, 12, 14, 15))
+
+
+@pytest.mark.parametrize('min_psnr', [20.0, 21.5, 22.5])
+def test_min_psnr(image, min_psnr):
+    data, info = compress_image_array_to_target(image, min_psnr=min_psnr)
+    assert info['met'] and info['psnr'] >= min_psnr
+    assert image_psnr(image, decompress_to_array(data)) == pytest.approx(info['psnr'])
+
+    # Z dodatno omejitvijo velikosti, ki je ni mogoče doseči, kakovost ostane, met pa je False
+    data, info = compress_image_array_to_target(image, target_bytes=10, min_psnr=min_psnr)
+    assert not info['met'] and info['psnr'] >= min_psnr
+
+
+def test_unreachable_psnr_and_missing_constraints(image):
+    _, info = compress_image_array_to_target(image, min_psnr=99.0)
+    assert not info['met'] and info['faktor'] == 1
+    with pytest.raises(ValueError):
+        compress_image_array_to_target(image)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from conftest import make_image
+from utils.image_compression_dct import COLOR_MODES, compress_image_array, decompress_region, decompress_to_array
+
+REGIONS = [(10, 7, 30, 20), (0, 0, 8, 8), (17, 33, 1, 1), (70, 50, 40, 40), (-5, -5, 20, 20), (0, 0, 83, 61)]
+
+
+@pytest.mark.parametrize('color_mode', COLOR_MODES)
+def test_region_matches_full_decode(image, color_mode):
+    data = compress_image_array(image, 5, color_mode=color_mode, block_index=True)
+    full = decompress_to_array(data)
+    # Indeks blokov ne spremeni dekodirane slike
+    np.testing.assert_array_equal(full, decompress_to_array(compress_image_array(image, 5, color_mode=color_mode)))
+
+    # Pri podvzorčenih kromatskih kanalih je dovoljena razlika zaradi zaokroževanja pri povečavi
+    tolerance = 0 if color_mode in ('bgr', 'ycbcr444') else 2
+    for x, y, width, height in REGIONS:
+        region = decompress_region(data, x, y, width, height)
+        x0, y0 = max(0, x), max(0, y)
+        expected = full[y0:min(61, y + height), x0:min(83, x + width)]
+        assert region.shape == expected.shape
+        assert np.abs(region.astype(int) - expected).max() <= tolerance
+
+
+def test_region_grayscale():
+    image = make_image(40, 56, channels=1)
+    data = compress_image_array(image, 5, block_index=True)
+    full = decompress_to_array(data)
+    np.testing.assert_array_equal(decompress_region(data, 9, 3, 20, 30), full[3:33, 9:29])
+
+
+def test_region_errors(image):
+    with pytest.raises(ValueError, match='indeksa'):
+        decompress_region(compress_image_array(image, 5), 0, 0, 8, 8)
+    with pytest.raises(ValueError, match='v2'):
+        decompress_region(compress_image_array(image, 5, version=1), 0, 0, 8, 8)
+    with pytest.raises(ValueError, match='v1'):
+        compress_image_array(image, 5, version=1, block_index=True)
+
+    data = compress_image_array(image, 5, block_index=True)
+    with pytest.raises(ValueError, match='izven'):
+        decompress_region(data, 83, 0, 10, 10)
+    with pytest.raises(ValueError, match='poškodovani'):
+        decompress_region(data[:len(data) - 4], 0, 0, 8, 8)
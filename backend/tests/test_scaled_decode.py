@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import make_image
+from utils.image_compression_dct import COLOR_MODES, DECODE_SCALES, compress_image_array, decompress_to_array
+
+
+def luma(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb)[:, :, 0].astype(np.float64)
+
+
+@pytest.mark.parametrize('color_mode', COLOR_MODES)
+@pytest.mark.parametrize('scale', [2, 4, 8])
+def test_scaled_decode_matches_downscaled_full_decode(color_mode, scale):
+    # Velikost je večkratnik 8, zato zmanjšani bloki pokrijejo natanko enake piksle kot povprečje cele slike
+    data = compress_image_array(make_image(64, 96), 5, color_mode=color_mode)
+    full = luma(decompress_to_array(data))
+    scaled = luma(decompress_to_array(data, scale=scale))
+    assert scaled.shape == (64 // scale, 96 // scale)
+
+    expected = full.reshape(64 // scale, scale, 96 // scale, scale).mean(axis=(1, 3))
+    difference = np.abs(scaled - expected)
+    assert difference.mean() < 1.5
+    # Pri scale=8 je blok le DC koeficient, torej točno povprečje bloka (razlika zaradi zaokroževanja)
+    assert difference.max() < (1.5 if scale == 8 else 6)
+
+
+@pytest.mark.parametrize('version,color_mode', [(1, 'bgr'), (2, 'bgr'), (2, 'ycbcr420')])
+def test_scaled_sizes_round_up(image, version, color_mode):
+    data = compress_image_array(image, 5, version=version, color_mode=color_mode)
+    np.testing.assert_array_equal(decompress_to_array(data, scale=1), decompress_to_array(data))
+    for scale in DECODE_SCALES:
+        assert decompress_to_array(data, scale=scale).shape == (-(-61 // scale), -(-83 // scale), 3)
+
+
+def test_unsupported_scale(image):
+    data = compress_image_array(image, 5)
+    with pytest.raises(ValueError, match='pomanjšave'):
+        decompress_to_array(data, scale=3)
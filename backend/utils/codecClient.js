@@ -0,0 +1,184 @@
+const { spawn } = require('child_process');
+const path = require('path');
+
+// Odjemalec za codec_server.py - en dolgo živeči Python proces namesto PythonShell.run za vsako zahtevo
+// Okvir: request_id (uint32), op/status (uint8), dolžina JSON (uint16), dolžina podatkov (uint32), JSON, podatki
+const FRAME_HEADER_SIZE = 11;
+
+const OP_PING = 0;
+const OP_COMPRESS = 1;
+const OP_DECOMPRESS = 2;
+const OP_STATS = 3;
+
+const pythonPath = process.env.PYTHON_PATH || (process.platform === 'win32' ? 'python' : 'python3');
+const codecWorkers = process.env.CODEC_WORKERS || '2';
+// Največji čas čakanja na odgovor (ms), 0 = brez omejitve
+const requestTimeout = Number(process.env.CODEC_TIMEOUT_MS || 30000);
+
+let serverProcess = null;
+let buffered = Buffer.alloc(0);
+let nextRequestId = 1;
+const pending = new Map();
+
+// Odstrani zahtevo iz čakajočih in vrne njene povratne klice (ali undefined)
+const takePending = (requestId) => {
+    const request = pending.get(requestId);
+    if (request) {
+        pending.delete(requestId);
+        clearTimeout(request.timer);
+    }
+    return request;
+};
+
+const rejectAll = (error) => {
+    for (const requestId of [...pending.keys()]) {
+        takePending(requestId).reject(error);
+    }
+};
+
+// Ustavi trenutni strežnik (naslednja zahteva zažene novega) in zavrne vse čakajoče zahteve
+const resetServer = (error) => {
+    const child = serverProcess;
+    serverProcess = null;
+    buffered = Buffer.alloc(0);
+    if (child && child.exitCode === null) {
+        child.kill();
+    }
+    rejectAll(error);
+};
+
+const handleData = (chunk) => {
+    buffered = Buffer.concat([buffered, chunk]);
+
+    while (buffered.length >= FRAME_HEADER_SIZE) {
+        const requestId = buffered.readUInt32LE(0);
+        const status = buffered.readUInt8(4);
+        const metaLength = buffered.readUInt16LE(5);
+        const dataLength = buffered.readUInt32LE(7);
+        const frameLength = FRAME_HEADER_SIZE + metaLength + dataLength;
+        if (buffered.length < frameLength) {
+            break;
+        }
+
+        let meta;
+        try {
+            meta = JSON.parse(buffered.toString('utf8', FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + metaLength));
+        } catch (err) {
+            // Pokvarjen okvir: tok ni več zanesljiv, zato se strežnik ponovno zažene
+            console.error('Codec server sent a malformed frame:', err);
+            const failed = takePending(requestId);
+            if (failed) {
+                failed.reject(new Error('Codec server sent a malformed response'));
+            }
+            resetServer(new Error('Codec server sent a malformed response'));
+            return;
+        }
+        const data = Buffer.from(buffered.subarray(FRAME_HEADER_SIZE + metaLength, frameLength));
+        buffered = buffered.subarray(frameLength);
+
+        const request = takePending(requestId);
+        if (!request) {
+            continue;
+        }
+
+        if (status === 0) {
+            request.resolve({ meta, data });
+        } else {
+            request.reject(new Error(meta.error || 'Codec server error'));
+        }
+    }
+};
+
+// Zažene strežnik ob prvi zahtevi in ga ponovno zažene, če se proces konča
+const getServer = () => {
+    if (serverProcess) {
+        return serverProcess;
+    }
+
+    const child = spawn(pythonPath, ['-u', 'codec_server.py', '--workers', codecWorkers], {
+        cwd: path.join(__dirname, '..'),
+        stdio: ['pipe', 'pipe', 'inherit']
+    });
+    buffered = Buffer.alloc(0);
+
+    // Dogodki že zamenjanega strežnika ne vplivajo na zahteve novega
+    child.stdout.on('data', (chunk) => {
+        if (serverProcess === child) {
+            handleData(chunk);
+        }
+    });
+    child.stdin.on('error', (err) => console.error('Codec server stdin error:', err));
+    child.on('error', (err) => {
+        // Npr. neuspešen zagon - dogodka 'exit' morda ne bo
+        console.error('Codec server error:', err);
+        if (serverProcess === child) {
+            resetServer(new Error(`Codec server error: ${err.message}`));
+        }
+    });
+    child.on('exit', (code) => {
+        console.error(`Codec server exited with code ${code}`);
+        if (serverProcess === child) {
+            resetServer(new Error('Codec server exited'));
+        }
+    });
+
+    serverProcess = child;
+    return child;
+};
+
+const request = (op, options = {}, data = Buffer.alloc(0)) => new Promise((resolve, reject) => {
+    const server = getServer();
+    const requestId = nextRequestId;
+    nextRequestId = (nextRequestId % 0xffffffff) + 1;
+
+    const optionsBuffer = Buffer.from(JSON.stringify(options), 'utf8');
+    const header = Buffer.alloc(FRAME_HEADER_SIZE);
+    header.writeUInt32LE(requestId, 0);
+    header.writeUInt8(op, 4);
+    header.writeUInt16LE(optionsBuffer.length, 5);
+    header.writeUInt32LE(data.length, 7);
+
+    const timer = requestTimeout > 0 ? setTimeout(() => {
+        if (takePending(requestId)) {
+            reject(new Error(`Codec request timed out after ${requestTimeout} ms`));
+        }
+    }, requestTimeout) : undefined;
+    pending.set(requestId, { resolve, reject, timer });
+    server.stdin.write(Buffer.concat([header, optionsBuffer, data]));
+});
+
+// Kompresira sliko na disku, vrne { compressedData, originalSize, compressedSize, faktor }
+// options: { faktor, targetBytes, minPsnr } - s targetBytes ali minPsnr se faktor izbere samodejno
+exports.compressImage = async (imagePath, options = {}) => {
+    const { faktor = 10, targetBytes, minPsnr } = typeof options === 'number' ? { faktor: options } : options;
+    const { meta, data } = await request(OP_COMPRESS, {
+        path: path.resolve(imagePath),
+        faktor,
+        target_bytes: targetBytes,
+        min_psnr: minPsnr
+    });
+    return {
+        compressedData: data,
+        originalSize: meta.original_size,
+        compressedSize: meta.compressed_size,
+        faktor: meta.faktor
+    };
+};
+
+// Dekompresira shranjene podatke, vrne { image, format } kjer je image Buffer
+// options: { format: 'png' | 'jpeg' | 'webp', quality: 1-100, scale: 1 | 2 | 4 | 8 }
+exports.decompressImage = async (compressedData, options = {}) => {
+    const { meta, data } = await request(OP_DECOMPRESS, options, compressedData);
+    return { image: data, format: meta.format || 'png' };
+};
+
+// Statistika predpomnilnika dekodiranih slik (skupen za vse delavce strežnika)
+exports.stats = async () => {
+    const { meta } = await request(OP_STATS);
+    return meta;
+};
+
+exports.ping = async () => {
+    const { meta } = await request(OP_PING);
+    return meta;
+};
@@ -0,0 +1,202 @@
+"""
+Predpomnilnik dekodiranih profilnih slik
+Ključ je zgoščena vrednost kompresiranih podatkov in parametrov izhoda (format, kakovost, velikost),
+zato ista shranjena slika ne gre ponovno skozi IDCT in kodiranje v PNG/JPEG.
+Prvi nivo je LRU v pomnilniku, omejen s skupnim številom bytes; drugi nivo (neobvezen) je mapa na disku.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Ob prekoračenju disk_max_bytes se izrinja do tega deleža omejitve, da se mapa ne pregleduje ob vsakem zapisu
+DISK_LOW_WATER = 0.9
+
+
+def make_cache_key(compressed_data: bytes, **params) -> str:
+    """
+    Ustvari ključ iz vsebine kompresiranih podatkov in parametrov izhoda.
+
+    Args:
+        compressed_data: Kompresirani podatki (.dct)
+        **params: Parametri izhoda, npr. image_format, quality, scale
+
+    Returns:
+        Hex niz SHA-256
+    """
+    h = hashlib.sha256(compressed_data)
+    for name in sorted(params):
+        h.update(f"|{name}={params[name]}".encode('utf-8'))
+    return h.hexdigest()
+
+
+def cache_from_environment() -> 'DecodedImageCache':
+    """
+    Predpomnilnik z nastavitvami iz okolja: PROFILE_IMAGE_CACHE_BYTES (velikost v pomnilniku),
+    PROFILE_IMAGE_CACHE_DIR (neobvezen nivo na disku), PROFILE_IMAGE_CACHE_DISK_BYTES (omejitev diska).
+    """
+    disk_max_bytes = os.environ.get('PROFILE_IMAGE_CACHE_DISK_BYTES')
+    return DecodedImageCache(
+        max_bytes=int(os.environ.get('PROFILE_IMAGE_CACHE_BYTES', 64 * 1024 * 1024)),
+        disk_dir=os.environ.get('PROFILE_IMAGE_CACHE_DIR') or None,
+        disk_max_bytes=int(disk_max_bytes) if disk_max_bytes else None
+    )
+
+
+class DecodedImageCache:
+    """
+    LRU predpomnilnik z omejitvijo skupne velikosti in neobveznim nivojem na disku.
+
+    Args:
+        max_bytes: Največja skupna velikost vrednosti v pomnilniku
+        disk_dir: Mapa za drugi nivo (None = brez diska)
+        disk_max_bytes: Največja skupna velikost datotek na disku (None = brez omejitve);
+            ob prekoračenju se izrinja do DISK_LOW_WATER * disk_max_bytes
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 disk_max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._disk_size = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _store(self, key: str, value: bytes) -> None:
+        # Klicati z zaklenjenim self._lock
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Vrne shranjeno vrednost ali None. Zadetek na disku se prenese v pomnilnik.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    value = f.read()
+                os.utime(path)
+            except OSError:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Shrani vrednost v pomnilnik in (če je nastavljen) na disk.
+        """
+        with self._lock:
+            self._store(key, value)
+
+        if self.disk_dir:
+            self._write_disk(key, value)
+
+    def _write_disk(self, key: str, value: bytes) -> None:
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        if self.disk_max_bytes is not None:
+            with self._lock:
+                if self._disk_size is None:
+                    self._disk_size = sum(size for _, size, _ in self._disk_files())
+                else:
+                    self._disk_size += len(value)
+                if self._disk_size > self.disk_max_bytes:
+                    self._evict_disk()
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _evict_disk(self) -> None:
+        # Klicati z zaklenjenim self._lock; odstrani najdlje neuporabljene datoteke (po mtime)
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        self._disk_size = sum(size for _, size, _ in files)
+        low_water = int(self.disk_max_bytes * DISK_LOW_WATER)
+        for path, size, _ in files:
+            if self._disk_size <= low_water:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._disk_size -= size
+            self.disk_evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict:
+        """
+        Vrne števce zadetkov, zgrešitev in izrinjenj ter trenutno velikost.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,323 @@
+"""
+Skupni indeks predlog obrazov za preverjanje uporabnikov
+Namesto celotnega modela Keras na uporabnika se hrani ena skupna osnova (MobileNetV2 + GlobalAveragePooling2D)
+in za vsakega uporabnika nekaj normiranih vektorjev značilk (predlog) v float16, vse v eni matriki.
+Pri prijavi se vektor značilk slike primerja s predlogami uporabnika s kosinusno podobnostjo;
+matrika in tabela vrstic se preslikata v pomnilnik, uporabnik se v tabeli poišče z bisekcijo,
+zato cena prijave ni odvisna od števila uporabnikov.
+
+Datoteke v mapi indeksa (learned_model/):
+    embedding_index.json         trenutna generacija in imeni njenih datotek
+    embedding_templates.<n>.npy  predloge (float16, vrstice x dimenzija)
+    embedding_rows.<n>.npy       uporabniki, urejeni po imenu -> (začetna vrstica, število predlog, prag)
+    embedding_backbone.keras     skupna osnova za izračun vektorjev značilk
+
+Ob posodobitvi ostane prejšnja generacija na disku (bralec, ki je pravkar prebral indeks, jo še odpre),
+odstranijo se le starejše.
+"""
+
+import os
+import re
+import json
+import fcntl
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+INDEX_FILE = 'embedding_index.json'
+BACKBONE_FILE = 'embedding_backbone.keras'
+INDEX_VERSION = 2
+MAX_TEMPLATES = 4
+GENERATION_FILE = re.compile(r'^embedding_(templates|rows)\.(\d+)\.npy$')
+
+# Privzeti prag (najmanjša kosinusna podobnost z eno od predlog uporabnika) za uporabnike brez umerjenega praga.
+# Vektorji značilk ImageNet osnove so si med različnimi obrazi precej podobni, zato learn.py prag umeri
+# na uporabnikovih izrezih (glej calibrate_threshold); 0.8 je konzervativna vrednost za starejše vnose.
+MATCH_THRESHOLD = float(os.environ.get('FACE_MATCH_THRESHOLD', 0.8))
+
+# Umerjanje praga: delež zavrnjenih lastnih izrezov, razlika nad najbolj podobno tujo predlogo,
+# spodnja meja praga (le ob znanih tujih predlogah; brez njih je spodnja meja MATCH_THRESHOLD)
+# in najmanjše število izločenih izrezov za umerjanje
+TARGET_FALSE_REJECT = 0.05
+IMPOSTOR_MARGIN = 0.02
+MIN_THRESHOLD = 0.5
+MIN_CALIBRATION_SAMPLES = 5
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def build_templates(embeddings: np.ndarray, max_templates: int = MAX_TEMPLATES, iterations: int = 10) -> np.ndarray:
+    """
+    Iz vektorjev značilk slik uporabnika izračuna predloge: povprečje ali centroide (k-means na enotski sferi).
+
+    Args:
+        embeddings: Vektorji značilk oblike (N, D)
+        max_templates: Največje število predlog (1 = le povprečje)
+        iterations: Število iteracij k-means
+
+    Returns:
+        Normirane predloge oblike (K, D), float16
+    """
+    vectors = normalize(embeddings)
+    if len(vectors) == 0:
+        raise ValueError("Napaka: za predlogo je potreben vsaj en vektor značilk")
+    k = max(1, min(max_templates, len(vectors)))
+
+    # Začetni centroidi: povprečje, nato vsakič vektor, najmanj podoben že izbranim
+    centroids = [normalize(vectors.mean(axis=0))]
+    for _ in range(k - 1):
+        similarity = np.max(vectors @ np.stack(centroids).T, axis=1)
+        centroids.append(vectors[int(np.argmin(similarity))])
+    centroids = np.stack(centroids)
+
+    for _ in range(iterations if k > 1 else 0):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(k):
+            members = vectors[assignment == i]
+            if len(members):
+                centroids[i] = normalize(members.mean(axis=0))
+    return centroids.astype(np.float16)
+
+
+def calibrate_threshold(embeddings: np.ndarray, impostors: Optional[np.ndarray] = None,
+                        groups: Optional[np.ndarray] = None, holdout: float = 0.2,
+                        seed: int = 42) -> Tuple[Optional[float], Dict]:
+    """
+    Umeri prag uporabnika: predloge se zgradijo iz učnega dela izrezov, prag je podobnost, pri kateri
+    se zavrne TARGET_FALSE_REJECT izločenih izrezov, dvignjen nad najbolj podobno tujo predlogo.
+    Brez tujih predlog (prvi uporabniki) lažnih sprejemov ni mogoče oceniti, zato prag ne pade pod MATCH_THRESHOLD.
+
+    Args:
+        embeddings: Vektorji značilk uporabnika (N, D)
+        impostors: Predloge drugih uporabnikov (M, D) ali None
+        groups: Oznaka izvorne slike videa za vsak vektor; augmentacije iste slike ostanejo v istem delu
+        holdout: Delež izločenih slik
+        seed: Seme za naključno razdelitev
+
+    Returns:
+        Tuple (prag ali None, če je izrezov premalo, statistika)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    groups = np.arange(len(embeddings)) if groups is None else np.asarray(groups)
+    unique = np.unique(groups)
+    rng = np.random.default_rng(seed)
+    held_groups = rng.permutation(unique)[:int(round(len(unique) * holdout))]
+    held = np.isin(groups, held_groups)
+    if held.sum() < MIN_CALIBRATION_SAMPLES or (~held).sum() == 0:
+        return None, {'holdout': int(held.sum())}
+
+    templates = build_templates(embeddings[~held]).astype(np.float32)
+    genuine = np.max(normalize(embeddings[held]) @ templates.T, axis=1)
+    threshold = float(np.quantile(genuine, TARGET_FALSE_REJECT))
+    stats = {'holdout': int(held.sum()), 'genuine_median': float(np.median(genuine))}
+    if impostors is not None and len(impostors):
+        impostor = np.max(normalize(impostors) @ templates.T, axis=1)
+        threshold = min(max(threshold, float(impostor.max()) + IMPOSTOR_MARGIN, MIN_THRESHOLD), 1.0)
+        stats['impostor_max'] = float(impostor.max())
+        stats['false_accept'] = float(np.mean(impostor >= threshold))
+    else:
+        threshold = min(max(threshold, MATCH_THRESHOLD), 1.0)
+    stats['false_reject'] = float(np.mean(genuine < threshold))
+    return threshold, stats
+
+
+def _rows_dtype(name_length: int) -> np.dtype:
+    return np.dtype([('name', f'<U{max(name_length, 1)}'), ('offset', '<i8'), ('count', '<i4'), ('threshold', '<f4')])
+
+
+class EmbeddingIndex:
+    """
+    Indeks predlog vseh uporabnikov v eni matriki, preslikani v pomnilnik.
+    Posodobitve zapišejo novo generacijo (matriko in tabelo vrstic) in nato indeks (atomarno),
+    bralci z odprto prejšnjo generacijo nemoteno nadaljujejo. Sočasne posodobitve so zaklenjene s fcntl.
+
+    Args:
+        directory: Mapa indeksa (npr. learned_model)
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._index = None
+        self._rows = None
+        self._templates = None
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {'version': INDEX_VERSION, 'generation': 0, 'dim': None, 'file': None, 'rows': None}
+        if index.get('version') not in (1, INDEX_VERSION):
+            raise ValueError(f"Napaka: nepodprta verzija indeksa: {index.get('version')}")
+        return index
+
+    def _open(self):
+        # Vrne (indeks, tabela vrstic, predloge) trenutne generacije
+        index = self._read_index()
+        templates = np.load(os.path.join(self.directory, index['file']), mmap_mode='r') if index['file'] else None
+        if index['version'] == 1:
+            # Starejši indeks: uporabniki so v JSON
+            users = sorted(index['users'].items())
+            rows = np.zeros(len(users), dtype=_rows_dtype(max((len(name) for name, _ in users), default=1)))
+            for row, (name, entry) in zip(rows, users):
+                row['name'], row['offset'], row['count'], row['threshold'] = name, entry['offset'], entry['count'], np.nan
+        elif index['rows']:
+            rows = np.load(os.path.join(self.directory, index['rows']), mmap_mode='r')
+        else:
+            rows = np.zeros(0, dtype=_rows_dtype(1))
+        return index, rows, templates
+
+    def _load(self):
+        if self._index is None:
+            try:
+                opened = self._open()
+            except FileNotFoundError:
+                # Vmes sta bili zapisani dve novi generaciji in prebrana je bila odstranjena
+                opened = self._open()
+            self._index, self._rows, self._templates = opened
+        return self._index
+
+    def _find(self, username: str):
+        self._load()
+        names = self._rows['name']
+        i = int(np.searchsorted(names, username))
+        if i < len(names) and names[i] == username:
+            return self._rows[i]
+        return None
+
+    def __contains__(self, username: str) -> bool:
+        return self._find(username) is not None
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._rows)
+
+    def templates(self, username: str) -> Optional[np.ndarray]:
+        """
+        Predloge uporabnika (pogled v preslikano matriko) ali None, če uporabnik ni v indeksu.
+        """
+        row = self._find(username)
+        if row is None:
+            return None
+        offset, count = int(row['offset']), int(row['count'])
+        return self._templates[offset:offset + count]
+
+    def threshold(self, username: str) -> float:
+        """
+        Umerjeni prag uporabnika ali MATCH_THRESHOLD, če ga ni.
+        """
+        row = self._find(username)
+        if row is None or np.isnan(row['threshold']):
+            return MATCH_THRESHOLD
+        return float(row['threshold'])
+
+    def similarity(self, username: str, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Največja kosinusna podobnost vsakega vektorja značilk (N, D) s predlogami uporabnika.
+        """
+        templates = self.templates(username)
+        if templates is None:
+            raise KeyError(username)
+        return np.max(normalize(embeddings) @ templates.astype(np.float32).T, axis=-1)
+
+    def match(self, username: str, embedding: np.ndarray, threshold: Optional[float] = None):
+        """
+        Returns:
+            Tuple (ujemanje, podobnost)
+        """
+        if threshold is None:
+            threshold = self.threshold(username)
+        similarity = float(self.similarity(username, np.atleast_2d(embedding))[0])
+        return similarity >= threshold, similarity
+
+    def all_templates(self, exclude: Optional[str] = None) -> np.ndarray:
+        """
+        Predloge vseh uporabnikov razen exclude (za umerjanje pragov), float32.
+        """
+        self._load()
+        if self._templates is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        row = self._find(exclude) if exclude is not None else None
+        if row is None:
+            return np.asarray(self._templates, dtype=np.float32)
+        offset, count = int(row['offset']), int(row['count'])
+        return np.concatenate([self._templates[:offset], self._templates[offset + count:]]).astype(np.float32)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f'{INDEX_FILE}.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _remove_old_generations(self, generation: int):
+        # Prejšnja generacija ostane za bralce, ki so indeks prebrali tik pred zamenjavo
+        for name in os.listdir(self.directory):
+            found = GENERATION_FILE.match(name)
+            if found and int(found.group(2)) < generation - 1:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _rewrite(self, username: str, templates: Optional[np.ndarray], threshold: Optional[float] = None):
+        with self._locked():
+            index, rows, old = self._open()
+            dim = templates.shape[1] if templates is not None else index['dim']
+            if templates is not None and index['dim'] not in (None, dim):
+                raise ValueError(f"Napaka: dimenzija predlog {dim} se ne ujema z indeksom ({index['dim']})")
+
+            # Ostali uporabniki ohranijo predloge in prag, tabela ostane urejena po imenu
+            entries = [(str(row['name']), old[int(row['offset']):int(row['offset']) + int(row['count'])],
+                        float(row['threshold'])) for row in rows if row['name'] != username]
+            if templates is not None:
+                entries.append((username, np.asarray(templates, dtype=np.float16),
+                                np.nan if threshold is None else float(threshold)))
+            entries.sort(key=lambda entry: entry[0])
+
+            new_rows = np.zeros(len(entries), dtype=_rows_dtype(max((len(name) for name, _, _ in entries), default=1)))
+            offset = 0
+            for row, (name, block, user_threshold) in zip(new_rows, entries):
+                row['name'], row['offset'], row['count'], row['threshold'] = name, offset, len(block), user_threshold
+                offset += len(block)
+
+            generation = index['generation'] + 1
+            new_file = f'embedding_templates.{generation}.npy'
+            rows_file = f'embedding_rows.{generation}.npy'
+            blocks = [block for _, block, _ in entries]
+            matrix = np.concatenate(blocks) if blocks else np.zeros((0, dim or 0), dtype=np.float16)
+            np.save(os.path.join(self.directory, new_file), matrix.astype(np.float16))
+            np.save(os.path.join(self.directory, rows_file), new_rows)
+
+            tmp_path = f'{self.index_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'generation': generation, 'dim': dim,
+                           'file': new_file, 'rows': rows_file}, f)
+            os.replace(tmp_path, self.index_path)
+            self._remove_old_generations(generation)
+
+        self._index = None
+        self._rows = None
+        self._templates = None
+
+    def update(self, username: str, templates: np.ndarray, threshold: Optional[float] = None):
+        """
+        Doda ali zamenja predloge uporabnika (K, D) in njegov umerjeni prag (None = MATCH_THRESHOLD).
+        """
+        templates = np.atleast_2d(templates)
+        if len(templates) == 0:
+            raise ValueError("Napaka: prazne predloge")
+        self._rewrite(username, templates, threshold)
+
+    def remove(self, username: str):
+        if username in self:
+            self._rewrite(username, None)
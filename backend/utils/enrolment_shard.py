@@ -0,0 +1,156 @@
+"""
+Nabor izrezanih obrazov za učenje (enrolment shard)
+dataSet.py izreze obraze že pri vzorčenju videa in jih zapiše zaporedno v en .npy (uint8, N x 224 x 224 x 3),
+learn.py ga odpre z np.load(mmap_mode='r') - brez JPEG kodiranja, dekodiranja in ponovnega iskanja obrazov.
+
+Datoteke v mapi uporabnika (learnPhotos/<username>/):
+    enrolment_faces.npy   izrezi obrazov
+    enrolment_labels.npy  indeks oznake za vsak izrez (int32)
+    enrolment_frames.npy  zaporedna številka slike videa za vsak izrez (int32)
+    enrolment.json        seznam oznak in opis nabora (zapiše se zadnji)
+"""
+
+import io
+import os
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SHARD_FACES = 'enrolment_faces.npy'
+SHARD_LABELS = 'enrolment_labels.npy'
+SHARD_FRAMES = 'enrolment_frames.npy'
+SHARD_INDEX = 'enrolment.json'
+SHARD_FILES = (SHARD_INDEX, SHARD_FACES, SHARD_LABELS, SHARD_FRAMES)
+SHARD_VERSION = 1
+
+# Prostor za glavo .npy na začetku datoteke; glava se zapiše ob zaključku, ko je znano število izrezov
+NPY_HEADER_SIZE = 128
+
+
+def _npy_header(shape: Tuple[int, ...]) -> bytes:
+    # numpy glavo poravna na 64 bytes, za 4D uint8 obliko je vedno dolga NPY_HEADER_SIZE
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': '|u1', 'fortran_order': False, 'shape': shape})
+    data = header.getvalue()
+    if len(data) != NPY_HEADER_SIZE:
+        raise ValueError(f"Napaka: glava .npy ni dolga {NPY_HEADER_SIZE} bytes")
+    return data
+
+
+class EnrolmentShardWriter:
+    """
+    Zaporedno zapisuje izreze obrazov v nabor; datoteke se ob close() atomarno zamenjajo,
+    ob napaki (abort ali izjema v bloku with) pa ostane prejšnji nabor nespremenjen.
+
+    Args:
+        directory: Mapa uporabnika
+        image_size: (širina, višina) izrezov
+    """
+
+    def __init__(self, directory: str, image_size: Tuple[int, int] = (224, 224)):
+        self.directory = directory
+        self.image_size = image_size
+        self.labels: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+        self._rows: List[int] = []
+        self._frames: List[int] = []
+        os.makedirs(directory, exist_ok=True)
+        self._tmp_path = os.path.join(directory, f'{SHARD_FACES}.{os.getpid()}.tmp')
+        self._faces = open(self._tmp_path, 'wb')
+        self._faces.write(b'\0' * NPY_HEADER_SIZE)
+
+    @property
+    def count(self) -> int:
+        return len(self._rows)
+
+    def append(self, face: np.ndarray, label: str, frame_index: int = -1):
+        """
+        Doda izrez (uint8, višina x širina x 3) z oznako label.
+        """
+        width, height = self.image_size
+        if face.shape != (height, width, 3) or face.dtype != np.uint8:
+            raise ValueError(f"Napaka: izrez mora biti uint8 oblike {(height, width, 3)}, je {face.dtype} {face.shape}")
+        if label not in self._label_ids:
+            self._label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        self._faces.write(np.ascontiguousarray(face).data)
+        self._rows.append(self._label_ids[label])
+        self._frames.append(frame_index)
+
+    def close(self) -> int:
+        """
+        Zaključi nabor (glava .npy, oznake, indeks) in vrne število izrezov.
+        """
+        width, height = self.image_size
+        self._faces.seek(0)
+        self._faces.write(_npy_header((self.count, height, width, 3)))
+        self._faces.close()
+
+        # Indeks se zapiše zadnji; dokler ne obstaja, nabor ne velja
+        index_path = os.path.join(self.directory, SHARD_INDEX)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        os.replace(self._tmp_path, os.path.join(self.directory, SHARD_FACES))
+        np.save(os.path.join(self.directory, SHARD_LABELS), np.asarray(self._rows, dtype=np.int32))
+        np.save(os.path.join(self.directory, SHARD_FRAMES), np.asarray(self._frames, dtype=np.int32))
+        tmp_index = f'{index_path}.tmp'
+        with open(tmp_index, 'w') as f:
+            json.dump({
+                'version': SHARD_VERSION,
+                'count': self.count,
+                'image_size': list(self.image_size),
+                'labels': self.labels
+            }, f)
+        os.replace(tmp_index, index_path)
+        return self.count
+
+    def abort(self):
+        self._faces.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def has_enrolment_shard(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, SHARD_INDEX))
+
+
+def load_enrolment_shard(directory: str, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Odpre nabor izrezov.
+
+    Args:
+        directory: Mapa uporabnika
+        mmap: Preslikaj izreze v pomnilnik namesto branja
+
+    Returns:
+        Tuple (izrezi uint8 N x H x W x 3, oznake kot nizi dolžine N, indeks)
+    """
+    with open(os.path.join(directory, SHARD_INDEX)) as f:
+        index = json.load(f)
+    if index.get('version') != SHARD_VERSION:
+        raise ValueError(f"Napaka: nepodprta verzija nabora: {index.get('version')}")
+
+    faces = np.load(os.path.join(directory, SHARD_FACES), mmap_mode='r' if mmap else None)
+    label_ids = np.load(os.path.join(directory, SHARD_LABELS))
+    if len(faces) != index['count'] or len(label_ids) != index['count']:
+        raise ValueError("Napaka: nabor izrezov je nepopoln")
+    labels = np.asarray(index['labels'])[label_ids] if len(label_ids) else np.asarray([], dtype=str)
+    return faces, labels, index
+
+
+def remove_enrolment_shard(directory: str):
+    for name in SHARD_FILES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
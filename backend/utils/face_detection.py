@@ -0,0 +1,178 @@
+"""
+Zaznavanje in obrezovanje obraza (Haar kaskada iz OpenCV)
+Enaka obdelava kot v learn.detect_and_crop_face, le da dela na slikah v pomnilniku
+in kaskado naloži enkrat na proces.
+Obraz se poišče enkrat na sliko videa; okvir se skozi geometrijske augmentacije prenese analitično
+(transform_box), najdeni okvirji pa se hranijo v FaceBoxCache, da ponovno učenje ne išče znova.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FACE_SIZE = (224, 224)  # MobileNetV2 pričakuje vhodne slike velikosti 224x224
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Predpomnilnik okvirjev obrazov v mapi uporabnika (learnPhotos/<username>/)
+FACE_BOX_CACHE = 'face_boxes.json'
+
+_local = threading.local()
+
+
+def face_cascade():
+    """
+    Vrne kaskadni klasifikator, naložen enkrat na nit (detectMultiScale ni varen za sočasno uporabo).
+    """
+    cascade = getattr(_local, 'cascade', None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(CASCADE_PATH)
+        if cascade.empty():
+            raise RuntimeError(f"Could not load face cascade: {CASCADE_PATH}")
+        _local.cascade = cascade
+    return cascade
+
+
+def detect_face(image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Poišče obraz na (že zamegljeni) sliki.
+
+    Args:
+        image: BGR ali sivinska slika
+
+    Returns:
+        (x, y, w, h) prvega najdenega obraza ali None
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    if len(faces) == 0:
+        return None
+    x, y, w, h = faces[0]
+    return int(x), int(y), int(w), int(h)
+
+
+def crop_face(image: np.ndarray, box: Tuple[int, int, int, int],
+              target_size: Tuple[int, int] = FACE_SIZE) -> np.ndarray:
+    """
+    Izreže obraz in ga pomanjša na target_size; sivinske slike se razširijo v 3 kanale
+    (kot pri branju shranjene sivinske slike s cv2.imread).
+    """
+    x, y, w, h = box
+    face = image[y:y+h, x:x+w]
+    face = cv2.resize(face, target_size)
+    if face.ndim == 2:
+        face = cv2.cvtColor(face, cv2.COLOR_GRAY2BGR)
+    return face
+
+
+def detect_and_crop_face(image: np.ndarray, target_size: Tuple[int, int] = FACE_SIZE) -> Optional[np.ndarray]:
+    """
+    Zamegli sliko, poišče obraz in vrne izrez velikosti target_size (uint8, 3 kanali) ali None.
+    """
+    image = cv2.GaussianBlur(image, (5, 5), 0)  # Uporabi Gaussianov filter za zmanjšanje šuma
+    box = detect_face(image)
+    if box is None:
+        return None
+    return crop_face(image, box, target_size)
+
+
+def transform_box(box: Tuple[int, int, int, int], M: np.ndarray,
+                  shape: Tuple[int, int]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Preslika okvir z afino matriko (3x3, koordinate središč pikslov) in ga obreže na sliko.
+
+    Args:
+        box: (x, y, w, h) na izvorni sliki
+        M: Matrika transformacije
+        shape: (višina, širina) slike
+
+    Returns:
+        Okvir, ki zajame preslikane vogale, ali None, če je na sliki manj kot polovica okvirja
+    """
+    x, y, w, h = box
+    corners = np.array([[x, y, 1], [x + w - 1, y, 1], [x, y + h - 1, 1], [x + w - 1, y + h - 1, 1]], dtype=np.float64)
+    mapped = corners @ M[:2].T
+    x0, y0 = np.floor(mapped.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(mapped.max(axis=0)).astype(int) + 1
+    area = (x1 - x0) * (y1 - y0)
+
+    height, width = shape[:2]
+    x0, y0 = max(x0, 0), max(y0, 0)
+    x1, y1 = min(x1, width), min(y1, height)
+    if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) * 2 < area:
+        return None
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+
+def video_signature(path: str) -> str:
+    """
+    Hiter podpis video datoteke (velikost ter začetek in konec vsebine) za veljavnost predpomnilnika.
+    """
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        h.update(f.read(65536))
+        if size > 65536:
+            f.seek(max(65536, size - 65536))
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class FaceBoxCache:
+    """
+    Okvirji obrazov (ali None, če obraza ni) po ključu, shranjeni v JSON datoteki.
+    dataSet.py shrani okvir za vsako izbrano sliko videa ('frame:<indeks>') in za vsako shranjeno
+    augmentirano sliko (ime datoteke brez končnice), learn.py jih uporabi namesto iskanja.
+
+    Args:
+        path: Pot do JSON datoteke
+        source: Podpis vira (video_signature); ob neujemanju se predpomnilnik izprazni.
+            None = sprejmi obstoječ predpomnilnik ne glede na vir.
+    """
+
+    def __init__(self, path: str, source: Optional[str] = None):
+        self.path = path
+        self.source = source
+        self._boxes: Dict[str, Optional[list]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if source is None or data.get('source') == source:
+                self.source = data.get('source')
+                self._boxes = data.get('boxes', {})
+            else:
+                self._dirty = True
+        except (OSError, ValueError):
+            pass
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._boxes
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def get(self, key: str) -> Optional[Tuple[int, int, int, int]]:
+        box = self._boxes.get(key)
+        return tuple(box) if box is not None else None
+
+    def set(self, key: str, box: Optional[Tuple[int, int, int, int]]):
+        with self._lock:
+            self._boxes[key] = list(box) if box is not None else None
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'source': self.source, 'boxes': self._boxes}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
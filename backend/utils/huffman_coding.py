@@ -0,0 +1,481 @@
+"""
+Huffmanovo kodiranje kvantiziranih DCT koeficientov (JPEG slog)
+
+Vsak blok (64 koeficientov v zigzag vrstnem redu) se pretvori v simbole:
+- DC: razlika do DC prejšnjega bloka, simbol je velikostni razred razlike
+- AC: pari (dolžina niza ničel, velikostni razred vrednosti), ZRL za 16 ničel
+  in EOB, kadar so vsi preostali koeficienti nič
+Za DC in AC simbole se zgradita optimalni Huffmanovi tabeli (največ 16 bitov),
+ki se shranita pred bitnim tokom v obliki BITS[16] + HUFFVAL (kot pri JPEG).
+"""
+
+import heapq
+import struct
+import numpy as np
+from typing import List, Tuple
+from numba import jit
+
+MAX_CODE_LENGTH = 16
+NUM_DC_SYMBOLS = 17
+NUM_AC_SYMBOLS = 256
+EOB_SYMBOL = 0x00
+ZRL_SYMBOL = 0xF0
+# Najmanjša dolžina bloka v bitih: DC simbol in EOB (ali AC simbol), vsaka koda ima vsaj 1 bit
+MIN_BLOCK_BITS = 2
+
+PAYLOAD_LENGTH_STRUCT = struct.Struct('<I')
+
+
+@jit(nopython=True, cache=True)
+def _bit_length(value):
+    n = 0
+    while value > 0:
+        value >>= 1
+        n += 1
+    return n
+
+
+@jit(nopython=True, cache=True)
+def _coefficients_to_symbols(zz, dc_reset):
+    """
+    Pretvori zigzag koeficiente (N, 64) v tok simbolov.
+    DC napovednik se ponastavi na 0 pri blokih, kjer je dc_reset True.
+    """
+    n = zz.shape[0]
+    capacity = n * 65
+    symbols = np.empty(capacity, dtype=np.uint8)
+    tables = np.empty(capacity, dtype=np.uint8)
+    extra = np.empty(capacity, dtype=np.int64)
+    extra_len = np.empty(capacity, dtype=np.uint8)
+    k = 0
+    pred = 0
+
+    for b in range(n):
+        if dc_reset[b]:
+            pred = 0
+
+        # DC razlika
+        diff = np.int64(zz[b, 0]) - pred
+        pred = np.int64(zz[b, 0])
+        size = _bit_length(abs(diff))
+        symbols[k] = size
+        tables[k] = 0
+        extra[k] = diff if diff >= 0 else diff + (1 << size) - 1
+        extra_len[k] = size
+        k += 1
+
+        # Zadnji neničelni AC koeficient
+        last = 63
+        while last > 0 and zz[b, last] == 0:
+            last -= 1
+
+        run = 0
+        for i in range(1, last + 1):
+            value = np.int64(zz[b, i])
+            if value == 0:
+                run += 1
+                continue
+            while run > 15:
+                symbols[k] = ZRL_SYMBOL
+                tables[k] = 1
+                extra[k] = 0
+                extra_len[k] = 0
+                k += 1
+                run -= 16
+            size = _bit_length(abs(value))
+            symbols[k] = (run << 4) | size
+            tables[k] = 1
+            extra[k] = value if value >= 0 else value + (1 << size) - 1
+            extra_len[k] = size
+            k += 1
+            run = 0
+
+        if last < 63:
+            symbols[k] = EOB_SYMBOL
+            tables[k] = 1
+            extra[k] = 0
+            extra_len[k] = 0
+            k += 1
+
+    return symbols[:k], tables[:k], extra[:k], extra_len[:k]
+
+
+@jit(nopython=True, cache=True)
+def _pack_bits(symbols, tables, extra, extra_len, dc_codes, dc_sizes, ac_codes, ac_sizes):
+    """
+    Zapiše Huffmanove kode in dodatne bite vseh simbolov v bitni tok (MSB najprej).
+    Vrne (bitni tok, bitni odmik začetka vsakega bloka).
+    """
+    num_blocks = 0
+    for k in range(symbols.shape[0]):
+        if tables[k] == 0:
+            num_blocks += 1
+    block_bits = np.empty(num_blocks, dtype=np.int64)
+
+    total_bits = 0
+    b = 0
+    for k in range(symbols.shape[0]):
+        if tables[k] == 0:
+            # DC simbol je prvi simbol bloka
+            block_bits[b] = total_bits
+            b += 1
+            total_bits += dc_sizes[symbols[k]]
+        else:
+            total_bits += ac_sizes[symbols[k]]
+        total_bits += extra_len[k]
+
+    out = np.zeros((total_bits + 7) // 8, dtype=np.uint8)
+    acc = np.int64(0)
+    nacc = 0
+    pos = 0
+
+    for k in range(symbols.shape[0]):
+        if tables[k] == 0:
+            code = np.int64(dc_codes[symbols[k]])
+            size = dc_sizes[symbols[k]]
+        else:
+            code = np.int64(ac_codes[symbols[k]])
+            size = ac_sizes[symbols[k]]
+
+        # Koda in dodatni biti (skupaj največ 32 bitov) + največ 7 bitov ostanka
+        acc = (acc << size) | code
+        nacc += size
+        acc = (acc << extra_len[k]) | extra[k]
+        nacc += extra_len[k]
+
+        while nacc >= 8:
+            nacc -= 8
+            out[pos] = (acc >> nacc) & 0xFF
+            pos += 1
+        acc &= (np.int64(1) << nacc) - 1
+
+    if nacc > 0:
+        out[pos] = (acc << (8 - nacc)) & 0xFF
+
+    return out, block_bits
+
+
+@jit(nopython=True, cache=True)
+def _decode_huffman(data, bitpos, maxcode, mincode, valptr, values):
+    """
+    Dekodira en simbol (JPEG F.2.2.3). Vrne (simbol, nov bitpos) ali (-1, bitpos) ob napaki.
+    """
+    code = 0
+    nbits = data.shape[0] * 8
+    for length in range(1, MAX_CODE_LENGTH + 1):
+        if bitpos >= nbits:
+            return -1, bitpos
+        code = (code << 1) | ((data[bitpos >> 3] >> (7 - (bitpos & 7))) & 1)
+        bitpos += 1
+        if maxcode[length] >= 0 and code <= maxcode[length]:
+            return values[valptr[length] + code - mincode[length]], bitpos
+    return -1, bitpos
+
+
+@jit(nopython=True, cache=True)
+def _read_bits(data, bitpos, count):
+    value = 0
+    nbits = data.shape[0] * 8
+    if bitpos + count > nbits:
+        return -1, bitpos
+    for _ in range(count):
+        value = (value << 1) | ((data[bitpos >> 3] >> (7 - (bitpos & 7))) & 1)
+        bitpos += 1
+    return value, bitpos
+
+
+@jit(nopython=True, cache=True)
+def _extend(value, size):
+    # Obratno od zapisa negativnih vrednosti (eniški komplement v size bitih)
+    if size == 0:
+        return 0
+    if value < (1 << (size - 1)):
+        return value - (1 << size) + 1
+    return value
+
+
+@jit(nopython=True, cache=True)
+def _symbols_to_coefficients(data, bitpos, num_blocks, dc_reset,
+                             dc_maxcode, dc_mincode, dc_valptr, dc_values,
+                             ac_maxcode, ac_mincode, ac_valptr, ac_values):
+    """
+    Dekodira bitni tok od bita bitpos naprej nazaj v zigzag koeficiente (N, 64).
+    DC napovednik se začne z 0. Vrne (koeficienti, status), kjer status 0 pomeni uspeh.
+    """
+    zz = np.zeros((num_blocks, 64), dtype=np.int16)
+    pred = 0
+
+    for b in range(num_blocks):
+        if dc_reset[b]:
+            pred = 0
+
+        size, bitpos = _decode_huffman(data, bitpos, dc_maxcode, dc_mincode, dc_valptr, dc_values)
+        # Velikostni razred DC razlike je največ 16 (razlika dveh int16); večji simbol je pokvarjena tabela
+        if size < 0 or size >= NUM_DC_SYMBOLS:
+            return zz, 1
+        bits, bitpos = _read_bits(data, bitpos, size)
+        if bits < 0:
+            return zz, 1
+        pred += _extend(bits, size)
+        if pred < -32768 or pred > 32767:
+            return zz, 1
+        zz[b, 0] = pred
+
+        i = 1
+        while i < 64:
+            symbol, bitpos = _decode_huffman(data, bitpos, ac_maxcode, ac_mincode, ac_valptr, ac_values)
+            if symbol < 0:
+                return zz, 1
+            run = symbol >> 4
+            size = symbol & 0x0F
+            if size == 0:
+                if run == 15:
+                    i += 16
+                    continue
+                break  # EOB
+            i += run
+            if i > 63:
+                return zz, 1
+            bits, bitpos = _read_bits(data, bitpos, size)
+            if bits < 0:
+                return zz, 1
+            zz[b, i] = _extend(bits, size)
+            i += 1
+
+        if i > 64:
+            return zz, 1
+
+    return zz, 0
+
+
+def build_code_lengths(frequencies: np.ndarray) -> Tuple[List[int], List[int]]:
+    """
+    Zgradi Huffmanovo tabelo z največjo dolžino kode 16 bitov.
+    Port postopka iz JPEG standarda (Annex K.2 in K.3).
+
+    Args:
+        frequencies: Frekvence simbolov (indeks = simbol)
+
+    Returns:
+        Tuple (bits, huffval):
+        - bits: Število kod posamezne dolžine 1..16 (16 elementov)
+        - huffval: Simboli urejeni po dolžini kode
+    """
+    used = [(int(f), int(sym)) for sym, f in enumerate(frequencies) if f > 0]
+    if not used:
+        return [0] * MAX_CODE_LENGTH, []
+    if len(used) == 1:
+        bits = [0] * MAX_CODE_LENGTH
+        bits[0] = 1
+        return bits, [used[0][1]]
+
+    # Dolžine kod iz Huffmanovega drevesa
+    code_length = {sym: 0 for _, sym in used}
+    heap = [(f, sym, [sym]) for f, sym in used]
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        f1, key1, syms1 = heapq.heappop(heap)
+        f2, key2, syms2 = heapq.heappop(heap)
+        for sym in syms1 + syms2:
+            code_length[sym] += 1
+        heapq.heappush(heap, (f1 + f2, min(key1, key2), syms1 + syms2))
+
+    max_length = max(code_length.values())
+    bits = [0] * (max(max_length, MAX_CODE_LENGTH) + 1)
+    for length in code_length.values():
+        bits[length] += 1
+
+    # Omejitev dolžine kod na 16 bitov (JPEG Annex K.3, Adjust_BITS)
+    for i in range(len(bits) - 1, MAX_CODE_LENGTH, -1):
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+
+    # Simboli po naraščajoči dolžini kode (pri enaki dolžini po vrednosti)
+    huffval = sorted(code_length, key=lambda sym: (code_length[sym], sym))
+    return bits[1:MAX_CODE_LENGTH + 1], huffval
+
+
+def canonical_codes(bits: List[int], huffval: List[int], num_symbols: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dodeli kanonične Huffmanove kode simbolom.
+
+    Returns:
+        Tuple (codes, sizes), indeksirano s simbolom
+    """
+    codes = np.zeros(num_symbols, dtype=np.int64)
+    sizes = np.zeros(num_symbols, dtype=np.int64)
+    code = 0
+    k = 0
+    for length in range(1, MAX_CODE_LENGTH + 1):
+        for _ in range(bits[length - 1]):
+            codes[huffval[k]] = code
+            sizes[huffval[k]] = length
+            code += 1
+            k += 1
+        code <<= 1
+    return codes, sizes
+
+
+def decoder_tables(bits: List[int], huffval: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pripravi tabele MAXCODE, MINCODE, VALPTR za dekodiranje (JPEG F.2.2.3).
+    """
+    maxcode = np.full(MAX_CODE_LENGTH + 1, -1, dtype=np.int64)
+    mincode = np.zeros(MAX_CODE_LENGTH + 1, dtype=np.int64)
+    valptr = np.zeros(MAX_CODE_LENGTH + 1, dtype=np.int64)
+    code = 0
+    k = 0
+    for length in range(1, MAX_CODE_LENGTH + 1):
+        count = bits[length - 1]
+        if count > 0:
+            valptr[length] = k
+            mincode[length] = code
+            code += count
+            k += count
+            maxcode[length] = code - 1
+        code <<= 1
+    return maxcode, mincode, valptr, np.array(huffval, dtype=np.int64)
+
+
+def _write_table(out: bytearray, bits: List[int], huffval: List[int]) -> None:
+    out += bytes(bits)
+    out += bytes(huffval)
+
+
+def _read_table(mv: memoryview, offset: int, num_symbols: int) -> Tuple[List[int], List[int], int]:
+    bits = list(mv[offset:offset + MAX_CODE_LENGTH])
+    offset += MAX_CODE_LENGTH
+    count = sum(bits)
+    huffval = list(mv[offset:offset + count])
+    if len(bits) != MAX_CODE_LENGTH or len(huffval) != count or max(huffval, default=0) >= num_symbols:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    return bits, huffval, offset + count
+
+
+def encode_coefficients(zz: np.ndarray, dc_reset: np.ndarray, return_block_bits: bool = False):
+    """
+    Entropijsko kodira zigzag koeficiente vseh blokov.
+
+    Args:
+        zz: numpy array oblike (N, 64) kvantiziranih koeficientov (int16)
+        dc_reset: bool array dolžine N, True kjer se DC napovednik ponastavi
+        return_block_bits: Vrni tudi bitni odmik začetka vsakega bloka v bitnem toku
+
+    Returns:
+        bytes: DC tabela, AC tabela, dolžina bitnega toka (uint32) in bitni tok;
+        pri return_block_bits tuple (bytes, bitni odmiki (int64, dolžine N))
+    """
+    zz = np.ascontiguousarray(zz, dtype=np.int16)
+    if zz.size and zz[:, 1:].min() < -(2 ** 15 - 1):
+        raise ValueError("Napaka: AC koeficient je izven dovoljenega obsega")
+
+    symbols, tables, extra, extra_len = _coefficients_to_symbols(zz, np.ascontiguousarray(dc_reset, dtype=np.bool_))
+
+    dc_bits, dc_huffval = build_code_lengths(np.bincount(symbols[tables == 0], minlength=NUM_DC_SYMBOLS))
+    ac_bits, ac_huffval = build_code_lengths(np.bincount(symbols[tables == 1], minlength=NUM_AC_SYMBOLS))
+    dc_codes, dc_sizes = canonical_codes(dc_bits, dc_huffval, NUM_DC_SYMBOLS)
+    ac_codes, ac_sizes = canonical_codes(ac_bits, ac_huffval, NUM_AC_SYMBOLS)
+
+    payload, block_bits = _pack_bits(symbols, tables, extra, extra_len, dc_codes, dc_sizes, ac_codes, ac_sizes)
+
+    out = bytearray()
+    _write_table(out, dc_bits, dc_huffval)
+    _write_table(out, ac_bits, ac_huffval)
+    out += PAYLOAD_LENGTH_STRUCT.pack(len(payload))
+    out += payload.tobytes()
+    if return_block_bits:
+        return bytes(out), block_bits
+    return bytes(out)
+
+
+def decode_coefficients(buffer, offset: int, num_blocks: int, dc_reset: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Dekodira zigzag koeficiente, ki jih je zapisal encode_coefficients.
+
+    Args:
+        buffer: bytes ali memoryview s kompresiranimi podatki
+        offset: Začetek DC tabele v bufferju
+        num_blocks: Skupno število blokov
+        dc_reset: bool array dolžine num_blocks, enak kot pri kodiranju
+
+    Returns:
+        Tuple (zz, end_offset), kjer je zz numpy array oblike (num_blocks, 64) (int16)
+    """
+    dc_tables, ac_tables, payload, end_offset = read_entropy_tables(buffer, offset)
+    return decode_payload(payload, dc_tables, ac_tables, num_blocks, dc_reset), end_offset
+
+
+def check_block_count(payload: np.ndarray, num_blocks: int, start_bit: int = 0) -> None:
+    """
+    Preveri, da bitni tok lahko vsebuje num_blocks blokov, preden se zanje alocira pomnilnik.
+    Vsak blok ima vsaj DC simbol in EOB, torej vsaj MIN_BLOCK_BITS bitov.
+    """
+    if num_blocks < 0 or num_blocks > (payload.size * 8 - start_bit) // MIN_BLOCK_BITS:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+
+
+def decode_payload(payload: np.ndarray, dc_tables: Tuple, ac_tables: Tuple,
+                   num_blocks: int, dc_reset: np.ndarray) -> np.ndarray:
+    """
+    Dekodira num_blocks blokov iz bitnega toka (tabele iz read_entropy_tables).
+
+    Returns:
+        numpy array oblike (num_blocks, 64) (int16)
+    """
+    check_block_count(payload, num_blocks)
+    zz, status = _symbols_to_coefficients(payload, 0, num_blocks, np.ascontiguousarray(dc_reset, dtype=np.bool_),
+                                          *dc_tables, *ac_tables)
+    if status != 0:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    return zz
+
+
+def read_entropy_tables(buffer, offset: int) -> Tuple[Tuple, Tuple, np.ndarray, int]:
+    """
+    Prebere Huffmanovi tabeli in bitni tok, ki ju je zapisal encode_coefficients.
+
+    Args:
+        buffer: bytes ali memoryview s kompresiranimi podatki
+        offset: Začetek DC tabele v bufferju
+
+    Returns:
+        Tuple (dc_tables, ac_tables, payload, end_offset): tabele za dekodiranje (decoder_tables),
+        bitni tok kot uint8 pogled (brez kopije) in odmik za bitnim tokom
+    """
+    mv = memoryview(buffer).cast('B')
+    dc_bits, dc_huffval, offset = _read_table(mv, offset, NUM_DC_SYMBOLS)
+    ac_bits, ac_huffval, offset = _read_table(mv, offset, NUM_AC_SYMBOLS)
+    try:
+        payload_length = PAYLOAD_LENGTH_STRUCT.unpack_from(mv, offset)[0]
+    except struct.error:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    offset += PAYLOAD_LENGTH_STRUCT.size
+    if offset + payload_length > len(mv):
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+
+    payload = np.frombuffer(mv[offset:offset + payload_length], dtype=np.uint8)
+    return (decoder_tables(dc_bits, dc_huffval), decoder_tables(ac_bits, ac_huffval),
+            payload, offset + payload_length)
+
+
+def decode_blocks_at(payload: np.ndarray, dc_tables: Tuple, ac_tables: Tuple,
+                     start_bit: int, num_blocks: int) -> np.ndarray:
+    """
+    Dekodira num_blocks zaporednih blokov od bitnega odmika start_bit naprej.
+    Začetni blok mora imeti ponastavljen DC napovednik (npr. začetek vrstice blokov z indeksom).
+
+    Returns:
+        numpy array oblike (num_blocks, 64) (int16)
+    """
+    check_block_count(payload, num_blocks, start_bit)
+    no_reset = np.zeros(num_blocks, dtype=np.bool_)
+    zz, status = _symbols_to_coefficients(payload, start_bit, num_blocks, no_reset, *dc_tables, *ac_tables)
+    if status != 0:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    return zz
@@ -6,9 +6,13 @@ import cv2
 import numpy as np
 import json
 import os
+import mmap
 import struct
+from concurrent.futures import ProcessPoolExecutor
 from typing import Tuple, List, Dict, Optional
 from numba import jit
+from utils.huffman_coding import (encode_coefficients, read_entropy_tables, decode_payload, decode_blocks_at,
+                                  check_block_count)
 
 # JPEG kvantizacijska matrika (Q50)
 JPEG_QUANTIZATION_MATRIX = np.array([
@@ -22,6 +26,28 @@ JPEG_QUANTIZATION_MATRIX = np.array([
     [72, 92, 95, 98, 112, 100, 103, 99]
 ], dtype=np.float32)
 
+# JPEG kvantizacijska matrika za barvni (kromatski) kanal
+JPEG_CHROMA_QUANTIZATION_MATRIX = np.array([
+    [17, 18, 24, 47, 99, 99, 99, 99],
+    [18, 21, 26, 66, 99, 99, 99, 99],
+    [24, 26, 56, 99, 99, 99, 99, 99],
+    [47, 66, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99]
+], dtype=np.float32)
+
+# Barvni načini: 'bgr' kompresira B, G, R ločeno (kot doslej), 'ycbcr*' pretvori v Y, Cr, Cb
+# in kromatska kanala podvzorči (vodoravno, navpično)
+COLOR_MODES = ('bgr', 'ycbcr444', 'ycbcr422', 'ycbcr420')
+CHROMA_SUBSAMPLING = {
+    'bgr': (1, 1),
+    'ycbcr444': (1, 1),
+    'ycbcr422': (2, 1),
+    'ycbcr420': (2, 2),
+}
+
 # Zigzag pattern za 8x8 blok (64 elementov)
 ZIGZAG_PATTERN = [
     (0,0), (0,1), (1,0), (2,0), (1,1), (0,2), (0,3), (1,2), (2,1), (3,0),
@@ -33,6 +59,38 @@ ZIGZAG_PATTERN = [
     (5,7), (6,7), (7,6), (7,7)
 ]
 
+# Zigzag zaporedje kot ploski indeksi (row * 8 + col) za paketno preurejanje blokov
+ZIGZAG_INDEX = np.array([row * 8 + col for row, col in ZIGZAG_PATTERN], dtype=np.intp)
+
+# Obratna tabela: ZIGZAG_POSITION[row, col] = indeks koeficienta v zigzag zaporedju
+ZIGZAG_POSITION = np.argsort(ZIGZAG_INDEX).reshape(8, 8)
+
+# Podprta razmerja pomanjšave pri dekompresiji (1/1, 1/2, 1/4, 1/8)
+DECODE_SCALES = (1, 2, 4, 8)
+
+
+def _dct_basis(n: int = 8) -> np.ndarray:
+    """
+    Izračuna nxn bazo kosinusov za DCT, C[u, x] = sqrt(2/n) * C(u) * cos((2x+1)uπ/2n).
+    Za n = 8 je to 0.5 * C(u) * cos((2x+1)uπ/16).
+    
+    Args:
+        n: Velikost bloka
+    
+    Returns:
+        nxn numpy array (float64), tako da velja F = C @ block @ C.T
+    """
+    C = np.zeros((n, n), dtype=np.float64)
+    for u in range(n):
+        Cu = 1.0 / np.sqrt(2.0) if u == 0 else 1.0
+        for x in range(n):
+            C[u, x] = np.sqrt(2.0 / n) * Cu * np.cos(((2 * x + 1) * u * np.pi) / (2.0 * n))
+    return C
+
+
+# Predizračunana baza kosinusov (izračuna se enkrat ob uvozu modula)
+DCT_BASIS = _dct_basis()
+
 @jit(nopython=True, cache=True)
 def fdct_8x8(block: np.ndarray) -> np.ndarray:
     """
@@ -92,6 +150,98 @@ def idct_8x8(F: np.ndarray) -> np.ndarray:
     return f
 
 
+@jit(nopython=True, cache=True)
+def fdct_8x8_separable(block: np.ndarray) -> np.ndarray:
+    """
+    Izvede DCT na 8x8 bloku z ločljivima prehodoma (vrstice, nato stolpci)
+    in predizračunano bazo DCT_BASIS. Rezultat je enak kot pri fdct_8x8.
+    
+    Args:
+        block: 8x8 numpy array (float32, vrednosti -128 do 127)
+    
+    Returns:
+        8x8 numpy array z DCT koeficienti (float32)
+    """
+    C = DCT_BASIS
+    tmp = np.zeros((8, 8), dtype=np.float64)
+    F = np.zeros((8, 8), dtype=np.float32)
+    
+    # Prehod po vrsticah: tmp[x, v] = sum_y block[x, y] * C[v, y]
+    for x in range(8):
+        for v in range(8):
+            sum_val = 0.0
+            for y in range(8):
+                sum_val += block[x, y] * C[v, y]
+            tmp[x, v] = sum_val
+    
+    # Prehod po stolpcih: F[u, v] = sum_x C[u, x] * tmp[x, v]
+    for u in range(8):
+        for v in range(8):
+            sum_val = 0.0
+            for x in range(8):
+                sum_val += C[u, x] * tmp[x, v]
+            F[u, v] = sum_val
+    
+    return F
+
+@jit(nopython=True, cache=True)
+def idct_8x8_separable(F: np.ndarray) -> np.ndarray:
+    """
+    Izvede inverzno DCT na 8x8 bloku z ločljivima prehodoma
+    in predizračunano bazo DCT_BASIS. Rezultat je enak kot pri idct_8x8.
+    
+    Args:
+        F: 8x8 numpy array z DCT koeficienti (float32)
+    
+    Returns:
+        8x8 numpy array rekonstruirane slike (float32)
+    """
+    C = DCT_BASIS
+    tmp = np.zeros((8, 8), dtype=np.float64)
+    f = np.zeros((8, 8), dtype=np.float32)
+    
+    # Prehod po vrsticah: tmp[u, y] = sum_v F[u, v] * C[v, y]
+    for u in range(8):
+        for y in range(8):
+            sum_val = 0.0
+            for v in range(8):
+                sum_val += F[u, v] * C[v, y]
+            tmp[u, y] = sum_val
+    
+    # Prehod po stolpcih: f[x, y] = sum_u C[u, x] * tmp[u, y]
+    for x in range(8):
+        for y in range(8):
+            sum_val = 0.0
+            for u in range(8):
+                sum_val += C[u, x] * tmp[u, y]
+            f[x, y] = sum_val
+    
+    return f
+
+
+# Razpoložljive implementacije DCT: referenčna (neposredna formula) in ločljiva (hitra)
+DCT_ENGINES = {
+    'reference': (fdct_8x8, idct_8x8),
+    'separable': (fdct_8x8_separable, idct_8x8_separable),
+}
+DEFAULT_DCT_ENGINE = 'separable'
+
+
+def get_dct_engine(name: str = DEFAULT_DCT_ENGINE):
+    """
+    Vrne par funkcij (fdct, idct) za izbrano implementacijo DCT.
+    
+    Args:
+        name: Ime implementacije ('reference' ali 'separable')
+    
+    Returns:
+        Tuple (fdct, idct) funkcij, ki delujeta na 8x8 blokih
+    """
+    if name not in DCT_ENGINES:
+        raise ValueError(f"Napaka: neznana DCT implementacija: {name}")
+    return DCT_ENGINES[name]
+
+
 def zigzag_scan(block: np.ndarray) -> List[int]:
     """
     Pretvori 8x8 blok v 1D vektor po zigzag zaporedju.
@@ -103,11 +253,7 @@ def zigzag_scan(block: np.ndarray) -> List[int]:
     Returns:
         Lista 64 elementov v zigzag vrstnem redu
     """
-    result = []
-    for i in range(64):
-        row, col = ZIGZAG_PATTERN[i]
-        result.append(int(block[row, col]))
-    return result
+    return np.asarray(block).reshape(64)[ZIGZAG_INDEX].tolist()
 
 
 def zigzag_to_block(data: List[int]) -> np.ndarray:
@@ -121,11 +267,9 @@ def zigzag_to_block(data: List[int]) -> np.ndarray:
     Returns:
         8x8 numpy array (int16)
     """
-    block = np.zeros((8, 8), dtype=np.int16)
-    for i in range(64):
-        row, col = ZIGZAG_PATTERN[i]
-        block[row, col] = data[i]
-    return block
+    block = np.empty(64, dtype=np.int16)
+    block[ZIGZAG_INDEX] = data
+    return block.reshape(8, 8)
 
 
 def quant_matrix(faktor: int) -> np.ndarray:
@@ -145,6 +289,30 @@ def quant_matrix(faktor: int) -> np.ndarray:
     return Q
 
 
+def chroma_quant_matrix(faktor: int) -> np.ndarray:
+    """
+    Ustvari kvantizacijsko matriko za kromatska kanala (Cr, Cb) glede na faktor stiskanja.
+    
+    Args:
+        faktor: Faktor stiskanja (1-15), manjši = boljša kakovost
+    
+    Returns:
+        8x8 numpy array kvantizacijske matrike (float32)
+    """
+    faktor = max(1, min(15, faktor))
+    return JPEG_CHROMA_QUANTIZATION_MATRIX * float(faktor)
+
+
+def channel_quant_matrices(faktor: int, color_mode: str, num_channels: int) -> List[np.ndarray]:
+    """
+    Vrne kvantizacijsko matriko za vsak kanal: pri 'bgr' enako za vse,
+    pri YCbCr načinih svetlostno za Y in kromatsko za Cr in Cb.
+    """
+    if color_mode == 'bgr':
+        return [quant_matrix(faktor)] * num_channels
+    return [quant_matrix(faktor)] + [chroma_quant_matrix(faktor)] * (num_channels - 1)
+
+
 def apply_quant(F: np.ndarray, Q: np.ndarray) -> np.ndarray:
     """
     Izvede kvantizacijo na 8x8 DCT bloku.
@@ -191,20 +359,12 @@ def rle_encode(data: List[int]) -> List[Tuple[int, int]]:
     Returns:
         Lista parov (vrednost, dolžina)
     """
-    if not data:
+    data = np.asarray(data)
+    if data.size == 0:
         return []
     
-    out = []
-    cnt = 1
-    
-    for i in range(len(data)):
-        if i < len(data) - 1 and data[i] == data[i + 1]:
-            cnt += 1
-        else:
-            out.append((data[i], cnt))
-            cnt = 1
-    
-    return out
+    _, values, counts = rle_encode_blocks(data.reshape(1, -1))
+    return list(zip(values.tolist(), counts.tolist()))
 
 
 def rle_decode(encoded: List[Tuple[int, int]]) -> List[int]:
@@ -218,10 +378,851 @@ def rle_decode(encoded: List[Tuple[int, int]]) -> List[int]:
     Returns:
         Lista dekodiranih števil
     """
-    out = []
-    for value, count in encoded:
-        out.extend([value] * count)
-    return out
+    if not encoded:
+        return []
+    values, counts = zip(*encoded)
+    return np.repeat(values, counts).tolist()
+
+
+def rle_encode_blocks(blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    RLE kodiranje vseh vrstic naenkrat (vsaka vrstica, npr. zigzag blok, je svoje zaporedje).
+    Meje nizov se poiščejo z np.diff čez ploski array, dodatno pa se niz začne na začetku vsake vrstice.
+    
+    Args:
+        blocks: numpy array oblike (N, L)
+    
+    Returns:
+        Tuple (pair_counts, values, counts):
+        - pair_counts: Število RLE parov v vsaki vrstici (int32)
+        - values: Vrednosti vseh parov zaporedno (dtype vhoda)
+        - counts: Dolžine vseh parov zaporedno (int32)
+    """
+    num_rows, row_length = blocks.shape
+    flat = blocks.reshape(-1)
+    if flat.size == 0:
+        return np.zeros(num_rows, dtype=np.int32), flat[:0], np.zeros(0, dtype=np.int32)
+    
+    boundary = np.empty(flat.size, dtype=np.bool_)
+    boundary[0] = True
+    np.not_equal(np.diff(flat), 0, out=boundary[1:])
+    boundary[::row_length] = True
+    starts = np.flatnonzero(boundary)
+    
+    counts = np.diff(starts, append=flat.size).astype(np.int32)
+    pair_counts = np.bincount(starts // row_length, minlength=num_rows).astype(np.int32)
+    return pair_counts, flat[starts], counts
+
+
+def pad_plane(plane: np.ndarray) -> np.ndarray:
+    """
+    Premakne kanal za -128 in ga dopolni do večkratnika 8.
+    
+    Args:
+        plane: 2D numpy array kanala (uint8)
+    
+    Returns:
+        float32 array z višino in širino, deljivima z 8
+    """
+    rows, cols = plane.shape[:2]
+    
+    # Prilagodi velikost, da je deljiva z 8
+    new_rows = rows if rows % 8 == 0 else rows + (8 - rows % 8)
+    new_cols = cols if cols % 8 == 0 else cols + (8 - cols % 8)
+    
+    ch_float = plane.astype(np.float32)
+    ch_float -= 128.0
+    return cv2.copyMakeBorder(ch_float, 0, new_rows - rows, 0, new_cols - cols,
+                              cv2.BORDER_CONSTANT, value=0)
+
+
+def pad_channels(image_array: np.ndarray) -> Tuple[List[np.ndarray], int, int]:
+    """
+    Razdeli sliko na kanale, jih premakne za -128 in dopolni do večkratnika 8.
+    
+    Args:
+        image_array: numpy array slike (BGR format iz cv2, uint8)
+    
+    Returns:
+        Tuple (kanali, new_rows, new_cols), kjer so kanali float32 array-i
+        velikosti new_rows x new_cols
+    """
+    processed_channels = [pad_plane(ch) for ch in cv2.split(image_array)]
+    new_rows, new_cols = processed_channels[0].shape
+    return processed_channels, new_rows, new_cols
+
+
+def plane_sizes(orig_width: int, orig_height: int, num_channels: int,
+                color_mode: str = 'bgr') -> List[Tuple[int, int]]:
+    """
+    Vrne (širina, višina) vsakega kanala pred dopolnjevanjem do večkratnika 8.
+    Kromatska kanala sta pri podvzorčenju zaokrožena navzgor.
+    """
+    sx, sy = CHROMA_SUBSAMPLING[color_mode]
+    chroma = (-(-orig_width // sx), -(-orig_height // sy))
+    return [(orig_width, orig_height)] + [chroma] * (num_channels - 1)
+
+
+def channel_dimensions(width: int, height: int, orig_width: int, orig_height: int,
+                       num_channels: int, color_mode: str = 'bgr') -> List[Tuple[int, int, int, int]]:
+    """
+    Vrne (širina, višina, dopolnjena širina, dopolnjena višina) za vsak kanal.
+    Pri 'bgr' so vsi kanali veliki kot dopolnjena slika iz glave (width, height).
+    """
+    if color_mode == 'bgr':
+        return [(orig_width, orig_height, width, height)] * num_channels
+    return [(w, h, -(-w // 8) * 8, -(-h // 8) * 8)
+            for w, h in plane_sizes(orig_width, orig_height, num_channels, color_mode)]
+
+
+def split_color_planes(image_array: np.ndarray, color_mode: str = 'bgr') -> List[np.ndarray]:
+    """
+    Razdeli BGR sliko na kanale v izbranem barvnem načinu.
+    Pri YCbCr načinih vrne Y, Cr, Cb (vrstni red cv2), kromatska kanala podvzorčena.
+    
+    Args:
+        image_array: numpy array slike (BGR format iz cv2, uint8)
+        color_mode: Barvni način ('bgr', 'ycbcr444', 'ycbcr422' ali 'ycbcr420')
+    
+    Returns:
+        Lista 2D uint8 array-ev
+    """
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"Napaka: neznan barvni način: {color_mode}")
+    if color_mode == 'bgr':
+        return list(cv2.split(image_array))
+    
+    rows, cols = image_array.shape[:2]
+    y, cr, cb = cv2.split(cv2.cvtColor(image_array, cv2.COLOR_BGR2YCrCb))
+    chroma_size = plane_sizes(cols, rows, 3, color_mode)[1]
+    if chroma_size != (cols, rows):
+        cr = cv2.resize(cr, chroma_size, interpolation=cv2.INTER_AREA)
+        cb = cv2.resize(cb, chroma_size, interpolation=cv2.INTER_AREA)
+    return [y, cr, cb]
+
+
+def merge_color_planes(planes: List[np.ndarray], color_mode: str, width: int, height: int) -> np.ndarray:
+    """
+    Obratno od split_color_planes - kanale poveča na width x height in vrne BGR sliko.
+    """
+    resized = [plane if plane.shape[:2] == (height, width)
+               else cv2.resize(plane, (width, height), interpolation=cv2.INTER_LINEAR)
+               for plane in planes]
+    color_img = cv2.merge(resized)
+    if color_mode != 'bgr':
+        color_img = cv2.cvtColor(color_img, cv2.COLOR_YCrCb2BGR)
+    return color_img
+
+
+def channel_to_blocks(channel: np.ndarray) -> np.ndarray:
+    """
+    Preoblikuje kanal (višina in širina deljivi z 8) v tenzor 8x8 blokov.
+    Bloki so v enakem vrstnem redu kot v binarni datoteki (po vrsticah).
+    
+    Args:
+        channel: 2D numpy array velikosti H x W
+    
+    Returns:
+        numpy array oblike (H/8 * W/8, 8, 8)
+    """
+    H, W = channel.shape
+    return channel.reshape(H // 8, 8, W // 8, 8).swapaxes(1, 2).reshape(-1, 8, 8)
+
+
+def blocks_to_channel(blocks: np.ndarray, H: int, W: int) -> np.ndarray:
+    """
+    Obratno od channel_to_blocks - sestavi kanal iz tenzorja blokov.
+    
+    Args:
+        blocks: numpy array oblike (N, k, k), običajno k = 8
+        H: Višina kanala (večkratnik k)
+        W: Širina kanala (večkratnik k)
+    
+    Returns:
+        2D numpy array velikosti H x W
+    """
+    k = blocks.shape[1]
+    return blocks.reshape(H // k, W // k, k, k).swapaxes(1, 2).reshape(H, W)
+
+
+def fdct_blocks(blocks: np.ndarray, dct_engine: str = DEFAULT_DCT_ENGINE) -> np.ndarray:
+    """
+    Izvede DCT na vseh blokih naenkrat.
+    
+    Args:
+        blocks: numpy array oblike (N, 8, 8) (float32)
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+    
+    Returns:
+        numpy array oblike (N, 8, 8) z DCT koeficienti (float32)
+    """
+    fdct, _ = get_dct_engine(dct_engine)
+    if fdct is fdct_8x8_separable:
+        # F = C @ block @ C.T za vse bloke z enim matričnim množenjem
+        F = np.matmul(np.matmul(DCT_BASIS, blocks.astype(np.float64)), DCT_BASIS.T)
+        return F.astype(np.float32)
+    return np.array([fdct(block) for block in blocks], dtype=np.float32).reshape(-1, 8, 8)
+
+
+def idct_blocks(F: np.ndarray, dct_engine: str = DEFAULT_DCT_ENGINE) -> np.ndarray:
+    """
+    Izvede inverzno DCT na vseh blokih naenkrat.
+    
+    Args:
+        F: numpy array oblike (N, 8, 8) z DCT koeficienti (float32)
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+    
+    Returns:
+        numpy array oblike (N, 8, 8) rekonstruiranih blokov (float32)
+    """
+    _, idct = get_dct_engine(dct_engine)
+    if idct is idct_8x8_separable:
+        # f = C.T @ F @ C za vse bloke z enim matričnim množenjem
+        f = np.matmul(np.matmul(DCT_BASIS.T, F.astype(np.float64)), DCT_BASIS)
+        return f.astype(np.float32)
+    return np.array([idct(block) for block in F], dtype=np.float32).reshape(-1, 8, 8)
+
+
+def idct_blocks_scaled(F: np.ndarray, scale: int) -> np.ndarray:
+    """
+    Inverzna DCT z zmanjšano ločljivostjo: iz 8x8 bloka koeficientov vrne
+    blok velikosti (8/scale)x(8/scale). Uporabi se le nizkofrekvenčni kot
+    koeficientov in k-točkovna IDCT (pri scale=8 je rezultat povprečje bloka iz DC).
+    
+    Args:
+        F: numpy array oblike (N, k, k) ali (N, 8, 8) z DCT koeficienti, k = 8 / scale
+        scale: Razmerje pomanjšave (1, 2, 4 ali 8)
+    
+    Returns:
+        numpy array oblike (N, k, k) rekonstruiranih blokov (float32)
+    """
+    if scale not in DECODE_SCALES:
+        raise ValueError(f"Napaka: nepodprto razmerje pomanjšave: {scale}")
+    k = 8 // scale
+    Ck = _dct_basis(k)
+    # Baza dolžine k ima normo sqrt(k/8) glede na 8-točkovno, zato faktor k/8 v 2D
+    f = np.matmul(np.matmul(Ck.T, F[:, :k, :k].astype(np.float64)), Ck) * (k / 8.0)
+    return f.astype(np.float32)
+
+
+def zigzag_scan_blocks(blocks: np.ndarray) -> np.ndarray:
+    """
+    Zigzag skeniranje vseh blokov naenkrat.
+    
+    Args:
+        blocks: numpy array oblike (N, 8, 8)
+    
+    Returns:
+        numpy array oblike (N, 64) v zigzag vrstnem redu
+    """
+    return blocks.reshape(-1, 64)[:, ZIGZAG_INDEX]
+
+
+def zigzag_to_blocks(data: np.ndarray) -> np.ndarray:
+    """
+    Obratno od zigzag_scan_blocks - vrne bloke v 8x8 obliki.
+    
+    Args:
+        data: numpy array oblike (N, 64) v zigzag vrstnem redu
+    
+    Returns:
+        numpy array oblike (N, 8, 8)
+    """
+    out = np.empty_like(data)
+    out[:, ZIGZAG_INDEX] = data
+    return out.reshape(-1, 8, 8)
+
+
+def encode_plane(channel: np.ndarray, Q: np.ndarray,
+                 dct_engine: str = DEFAULT_DCT_ENGINE) -> np.ndarray:
+    """
+    DCT, kvantizacija in zigzag za kanal ali pas kanala (višina in širina deljivi z 8).
+    
+    Args:
+        channel: 2D float32 array (premaknjen za -128)
+        Q: 8x8 kvantizacijska matrika
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+    
+    Returns:
+        numpy array oblike (N, 64) (int16) v zigzag vrstnem redu
+    """
+    F = fdct_blocks(channel_to_blocks(channel), dct_engine)
+    Fq16 = apply_quant(F, Q)
+    return zigzag_scan_blocks(Fq16)
+
+
+# Bazeni procesov za vzporedno kompresijo, po eden za vsako število delavcev
+_PROCESS_POOLS: Dict[int, ProcessPoolExecutor] = {}
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Vrne (in ob prvem klicu ustvari) bazen procesov z danim številom delavcev.
+    Bazen se ohrani med klici, da se delavcem ni treba vsakič znova zagnati.
+    """
+    pool = _PROCESS_POOLS.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _PROCESS_POOLS[workers] = pool
+    return pool
+
+
+def encode_channels(image_array: np.ndarray, faktor: int,
+                    dct_engine: str = DEFAULT_DCT_ENGINE,
+                    workers: Optional[int] = 1,
+                    color_mode: str = 'bgr') -> Tuple[List[np.ndarray], int, int]:
+    """
+    Kompresira vse kanale slike: DCT, kvantizacija in zigzag se izvedejo
+    paketno nad vsemi bloki kanala.
+    
+    Pri workers > 1 se dopolnjena slika razreže na vodoravne pasove (cele vrstice
+    blokov), ki se obdelajo v bazenu procesov. Pasovi se združijo v prvotnem
+    vrstnem redu, zato je rezultat enak kot pri zaporedni obdelavi.
+    
+    Args:
+        image_array: numpy array slike (BGR format iz cv2, uint8)
+        faktor: Faktor stiskanja (1-15)
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+        workers: Število procesov (1 = zaporedno, None = število jeder)
+        color_mode: Barvni način ('bgr', 'ycbcr444', 'ycbcr422' ali 'ycbcr420')
+    
+    Returns:
+        Tuple (koeficienti, new_cols, new_rows), kjer so koeficienti lista
+        array-ev oblike (N, 64) (int16) v zigzag vrstnem redu, en na kanal,
+        new_cols in new_rows pa dopolnjena velikost prvega (svetlostnega) kanala
+    """
+    processed_channels = [pad_plane(plane) for plane in split_color_planes(image_array, color_mode)]
+    new_rows, new_cols = processed_channels[0].shape
+    Qs = channel_quant_matrices(faktor, color_mode, len(processed_channels))
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        coefficients = [encode_plane(channel, Q, dct_engine) for channel, Q in zip(processed_channels, Qs)]
+        return coefficients, new_cols, new_rows
+    
+    # Vsak kanal razrežemo na več pasov kot je delavcev za boljšo porazdelitev dela
+    strips, strip_quants, strip_channel = [], [], []
+    for c, (channel, Q) in enumerate(zip(processed_channels, Qs)):
+        block_rows = channel.shape[0] // 8
+        num_strips = max(1, min(block_rows, workers * 4))
+        bounds = [8 * (block_rows * i // num_strips) for i in range(num_strips + 1)]
+        for i in range(num_strips):
+            strips.append(channel[bounds[i]:bounds[i + 1]])
+            strip_quants.append(Q)
+            strip_channel.append(c)
+    
+    pool = get_process_pool(workers)
+    results = list(pool.map(encode_plane, strips, strip_quants, [dct_engine] * len(strips)))
+    
+    coefficients = [np.concatenate([zz for zz, sc in zip(results, strip_channel) if sc == c])
+                    for c in range(len(processed_channels))]
+    return coefficients, new_cols, new_rows
+
+
+def decode_channels(data: Dict, dct_engine: str = DEFAULT_DCT_ENGINE, scale: int = 1) -> np.ndarray:
+    """
+    Rekonstruira sliko iz podatkov, ki jih vrne parse_binary.
+    Inverzna kvantizacija in IDCT se izvedeta paketno nad vsemi bloki kanala.
+    
+    Args:
+        data: Dictionary s podatki iz parse_binary
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+        scale: Razmerje pomanjšave (1, 2, 4 ali 8); pri scale > 1 se uporabi
+               le nizkofrekvenčni kot koeficientov (dct_engine se ne upošteva)
+    
+    Returns:
+        numpy array slike (BGR format, uint8), obrezan na originalno velikost
+        (pri scale > 1 na ceil(originalna velikost / scale))
+    """
+    if scale not in DECODE_SCALES:
+        raise ValueError(f"Napaka: nepodprto razmerje pomanjšave: {scale}")
+    k = 8 // scale
+    color_mode = data.get('color_mode', 'bgr')
+    num_channels = len(data['coefficients'])
+    dims = channel_dimensions(data['width'], data['height'], data['orig_width'], data['orig_height'],
+                              num_channels, color_mode)
+    Qs = channel_quant_matrices(data['faktor'], color_mode, num_channels)
+    
+    reconstructed_channels = []
+    for zz, (w, h, padded_w, padded_h), Q in zip(data['coefficients'], dims, Qs):
+        if len(zz) != (padded_w // 8) * (padded_h // 8):
+            raise ValueError("Napaka: kompresirani podatki so poškodovani")
+        if scale == 1:
+            F = inverse_quant(zigzag_to_blocks(zz), Q)
+            blocks = idct_blocks(F, dct_engine)
+        else:
+            # Le kxk nizkofrekvenčnih koeficientov, brez visokih frekvenc
+            Fq = zz[:, ZIGZAG_POSITION[:k, :k].ravel()].reshape(-1, k, k)
+            F = inverse_quant(Fq, Q[:k, :k])
+            blocks = idct_blocks_scaled(F, scale)
+        blocks += 128.0
+        rec = blocks_to_channel(blocks, padded_h // scale, padded_w // scale)
+        rec_uint8 = np.clip(rec, 0, 255).astype(np.uint8)
+        reconstructed_channels.append(rec_uint8[0:-(-h // scale), 0:-(-w // scale)])
+    
+    # Obreži na originalno velikost (kromatske kanale povečaj) in pretvori v BGR
+    out_height = -(-data['orig_height'] // scale)
+    out_width = -(-data['orig_width'] // scale)
+    return merge_color_planes(reconstructed_channels, color_mode, out_width, out_height)
+
+
+# Binarni format v1 (.dct): glava iz 6 x int32, nato za vsak kanal int32 število blokov,
+# za vsak blok int32 število RLE parov in pari (int16 vrednost, int32 dolžina)
+HEADER_STRUCT = struct.Struct('<6i')
+INT32_STRUCT = struct.Struct('<i')
+RLE_PAIR_DTYPE = np.dtype([('value', '<i2'), ('count', '<i4')])
+
+# Binarni format v2: magic, verzija, število kanalov, faktor, zastavice in dimenzije,
+# nato Huffmanove tabele in bitni tok simbolov (dolžina niza ničel, vrednost)
+FORMAT_MAGIC = b'DCTZ'
+FORMAT_VERSION = 2
+HEADER_V2_STRUCT = struct.Struct('<4sBBBBIIII')
+
+# Zastavice v glavi v2: biti 0-1 so indeks barvnega načina v COLOR_MODES
+FLAG_COLOR_MODE_MASK = 0x03
+# Bit 2: za bitnim tokom je tabela odmikov vrstic blokov (uint32 bitni odmik začetka vsake vrstice
+# vsakega kanala), DC napovednik se ponastavi na začetku vsake vrstice (kot JPEG restart intervali)
+FLAG_BLOCK_INDEX = 0x04
+BLOCK_INDEX_DTYPE = np.dtype('<u4')
+
+
+def coefficients_to_runs(zz: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    RLE kodira zigzag koeficiente vseh blokov kanala.
+    
+    Args:
+        zz: numpy array oblike (N, 64) v zigzag vrstnem redu
+    
+    Returns:
+        Tuple (pair_counts, values, counts) kot pri rle_blocks_to_runs
+    """
+    pair_counts, values, counts = rle_encode_blocks(zz)
+    return pair_counts, values.astype(np.int16, copy=False), counts
+
+
+def runs_to_coefficients(pair_counts: np.ndarray, values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Obratno od coefficients_to_runs.
+    
+    Returns:
+        numpy array oblike (N, 64) (int16) v zigzag vrstnem redu
+    """
+    # Preveri dolžine pred razširitvijo, da poškodovani podatki ne povzročijo ogromne alokacije
+    if (counts < 0).any() or int(counts.sum(dtype=np.int64)) != len(pair_counts) * 64:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    return np.repeat(values, counts).reshape(-1, 64)
+
+
+def channel_block_counts(dims: List[Tuple[int, int, int, int]]) -> List[int]:
+    """
+    Vrne število 8x8 blokov v vsakem kanalu (dims iz channel_dimensions).
+    """
+    return [(padded_w // 8) * (padded_h // 8) for _, _, padded_w, padded_h in dims]
+
+
+def row_reset_mask(dims: List[Tuple[int, int, int, int]]) -> np.ndarray:
+    """
+    Vrne bool array, ki označuje prvi blok vsake vrstice blokov vsakega kanala (za indeks blokov).
+    """
+    masks = []
+    for _, _, padded_w, padded_h in dims:
+        mask = np.zeros((padded_h // 8, padded_w // 8), dtype=np.bool_)
+        mask[:, 0] = True
+        masks.append(mask.reshape(-1))
+    return np.concatenate(masks) if masks else np.zeros(0, dtype=np.bool_)
+
+
+def dc_reset_mask(block_counts: List[int]) -> np.ndarray:
+    """
+    Vrne bool array, ki označuje prvi blok vsakega kanala (tam se DC napovednik ponastavi).
+    """
+    mask = np.zeros(sum(block_counts), dtype=np.bool_)
+    starts = np.cumsum([0] + block_counts[:-1])
+    mask[starts[np.array(block_counts) > 0]] = True
+    return mask
+
+
+def rle_blocks_to_runs(channel_blocks: List[List[Tuple[int, int]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pretvori RLE bloke enega kanala (liste parov) v ploske array-e.
+    
+    Args:
+        channel_blocks: Lista blokov, vsak blok je lista parov (vrednost, dolžina)
+    
+    Returns:
+        Tuple (pair_counts, values, counts):
+        - pair_counts: Število RLE parov v vsakem bloku (int32)
+        - values: Vrednosti vseh parov kanala zaporedno (int16)
+        - counts: Dolžine vseh parov kanala zaporedno (int32)
+    """
+    pair_counts = np.array([len(blk) for blk in channel_blocks], dtype=np.int32)
+    pairs = np.array([pair for blk in channel_blocks for pair in blk], dtype=np.int64).reshape(-1, 2)
+    return pair_counts, pairs[:, 0].astype(np.int16), pairs[:, 1].astype(np.int32)
+
+
+def runs_to_rle_blocks(pair_counts: np.ndarray, values: np.ndarray, counts: np.ndarray) -> List[List[Tuple[int, int]]]:
+    """
+    Obratno od rle_blocks_to_runs - vrne liste parov za vsak blok.
+    
+    Args:
+        pair_counts: Število RLE parov v vsakem bloku
+        values: Vrednosti vseh parov kanala
+        counts: Dolžine vseh parov kanala
+    
+    Returns:
+        Lista blokov, vsak blok je lista parov (vrednost, dolžina)
+    """
+    pairs = list(zip(values.tolist(), counts.tolist()))
+    bounds = np.concatenate(([0], np.cumsum(pair_counts))).tolist()
+    return [pairs[bounds[b]:bounds[b + 1]] for b in range(len(pair_counts))]
+
+
+def serialize_binary(channels: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                     width: int,
+                     height: int,
+                     orig_width: int,
+                     orig_height: int,
+                     faktor: int) -> bytes:
+    """
+    Zapiše vse podatke o sliki v bytes v enakem formatu kot save_binary.
+    Celoten izhod se zapiše v vnaprej alociran bytearray, RLE pari pa se
+    prepišejo paketno z numpy indeksiranjem namesto s struct.pack za vsak par.
+    
+    Args:
+        channels: Lista kanalov, vsak kanal je tuple (pair_counts, values, counts)
+        width: Širina slike (padded na 8)
+        height: Višina slike (padded na 8)
+        orig_width: Originalna širina slike
+        orig_height: Originalna višina slike
+        faktor: Faktor stiskanja
+    
+    Returns:
+        bytes: Kompresirani podatki (binarni format)
+    """
+    total = HEADER_STRUCT.size
+    for pair_counts, values, _ in channels:
+        total += INT32_STRUCT.size * (1 + len(pair_counts)) + RLE_PAIR_DTYPE.itemsize * len(values)
+    
+    buf = bytearray(total)
+    out = np.frombuffer(buf, dtype=np.uint8)
+    HEADER_STRUCT.pack_into(buf, 0, len(channels), width, height, orig_width, orig_height, faktor)
+    offset = HEADER_STRUCT.size
+    
+    for pair_counts, values, counts in channels:
+        num_blocks = len(pair_counts)
+        INT32_STRUCT.pack_into(buf, offset, num_blocks)
+        offset += INT32_STRUCT.size
+        
+        # Blok b se začne za b glavami blokov in vsemi pari prejšnjih blokov
+        first_pair = np.zeros(num_blocks, dtype=np.int64)
+        np.cumsum(pair_counts[:-1], out=first_pair[1:])
+        block_pos = offset + 4 * np.arange(num_blocks, dtype=np.int64) + 6 * first_pair
+        out[block_pos[:, None] + np.arange(4)] = pair_counts.astype('<i4').view(np.uint8).reshape(-1, 4)
+        
+        # Par j v bloku b leži za b + 1 glavami blokov in j prejšnjimi pari
+        pairs = np.empty(len(values), dtype=RLE_PAIR_DTYPE)
+        pairs['value'] = values
+        pairs['count'] = counts
+        block_of_pair = np.repeat(np.arange(num_blocks, dtype=np.int64), pair_counts)
+        pair_pos = offset + 4 * (block_of_pair + 1) + 6 * np.arange(len(values), dtype=np.int64)
+        out[pair_pos[:, None] + np.arange(6)] = pairs.view(np.uint8).reshape(-1, 6)
+        
+        offset += 4 * num_blocks + 6 * len(values)
+    
+    return bytes(buf)
+
+
+def serialize_binary_v2(coefficients: List[np.ndarray],
+                        width: int,
+                        height: int,
+                        orig_width: int,
+                        orig_height: int,
+                        faktor: int,
+                        color_mode: str = 'bgr',
+                        block_index: bool = False) -> bytes:
+    """
+    Zapiše vse podatke o sliki v bytes v formatu v2 (Huffmanovo kodiranje simbolov).
+    Z block_index se doda tabela odmikov vrstic blokov, ki omogoča dekodiranje izreza (decompress_region).
+    
+    Args:
+        coefficients: Lista array-ev oblike (N, 64) kvantiziranih koeficientov, en na kanal
+        width: Širina slike (padded na 8)
+        height: Višina slike (padded na 8)
+        orig_width: Originalna širina slike
+        orig_height: Originalna višina slike
+        faktor: Faktor stiskanja
+        color_mode: Barvni način, zapisan v zastavice glave
+        block_index: Dodaj tabelo odmikov vrstic blokov
+    
+    Returns:
+        bytes: Kompresirani podatki (binarni format v2)
+    """
+    faktor = max(1, min(15, faktor))
+    flags = COLOR_MODES.index(color_mode)
+    if block_index:
+        flags |= FLAG_BLOCK_INDEX
+    header = HEADER_V2_STRUCT.pack(FORMAT_MAGIC, FORMAT_VERSION, len(coefficients), faktor, flags,
+                                   width, height, orig_width, orig_height)
+    zz_all = np.concatenate(coefficients) if coefficients else np.zeros((0, 64), dtype=np.int16)
+    
+    if not block_index:
+        block_counts = [len(zz) for zz in coefficients]
+        return header + encode_coefficients(zz_all, dc_reset_mask(block_counts))
+    
+    dims = channel_dimensions(width, height, orig_width, orig_height, len(coefficients), color_mode)
+    if [len(zz) for zz in coefficients] != channel_block_counts(dims):
+        raise ValueError("Napaka: število blokov se ne ujema z velikostjo slike")
+    row_starts = row_reset_mask(dims)
+    entropy, block_bits = encode_coefficients(zz_all, row_starts, return_block_bits=True)
+    if block_bits.size and block_bits[-1] > np.iinfo(BLOCK_INDEX_DTYPE).max:
+        raise ValueError("Napaka: slika je prevelika za indeks blokov")
+    return header + entropy + block_bits[row_starts].astype(BLOCK_INDEX_DTYPE).tobytes()
+
+
+def parse_binary(buffer) -> Dict:
+    """
+    Prebere kompresirane podatke iz bytes ali memoryview (brez datoteke).
+    Podpira format v1 (brez glave z magic) in format v2.
+    
+    Args:
+        buffer: bytes, bytearray, memoryview ali mmap kompresiranih podatkov
+    
+    Returns:
+        Dictionary z podatki:
+        - coefficients: Lista array-ev oblike (N, 64) (int16) v zigzag vrstnem redu
+        - version: Verzija formata (1 ali 2)
+        - color_mode: Barvni način (v1 je vedno 'bgr')
+        - width: Širina slike
+        - height: Višina slike
+        - orig_width: Originalna širina
+        - orig_height: Originalna višina
+        - faktor: Faktor stiskanja
+    """
+    mv = memoryview(buffer).cast('B')
+    if bytes(mv[:len(FORMAT_MAGIC)]) == FORMAT_MAGIC:
+        return _parse_binary_v2(mv)
+    
+    return _parse_binary_v1(mv)
+
+
+def check_header_dimensions(num_channels: int, width: int, height: int, orig_width: int, orig_height: int) -> None:
+    """
+    Preveri podatke iz glave (oba formata): 1 ali 3 kanali, originalna velikost znotraj poravnane.
+    """
+    if num_channels not in (1, 3) or not (0 < orig_width <= width and 0 < orig_height <= height):
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+
+
+def _parse_binary_v2(mv: memoryview) -> Dict:
+    try:
+        magic, version, num_channels, faktor, flags, width, height, orig_width, orig_height = \
+            HEADER_V2_STRUCT.unpack_from(mv, 0)
+    except struct.error:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Napaka: nepodprta verzija formata: {version}")
+    
+    check_header_dimensions(num_channels, width, height, orig_width, orig_height)
+    
+    color_mode = COLOR_MODES[flags & FLAG_COLOR_MODE_MASK]
+    dims = channel_dimensions(width, height, orig_width, orig_height, num_channels, color_mode)
+    block_counts = channel_block_counts(dims)
+    # Velikost iz glave se preveri glede na dolžino bitnega toka, preden se alocirajo bloki
+    dc_tables, ac_tables, payload, _ = read_entropy_tables(mv, HEADER_V2_STRUCT.size)
+    check_block_count(payload, sum(block_counts))
+    dc_reset = row_reset_mask(dims) if flags & FLAG_BLOCK_INDEX else dc_reset_mask(block_counts)
+    zz_all = decode_payload(payload, dc_tables, ac_tables, sum(block_counts), dc_reset)
+    bounds = np.cumsum([0] + block_counts)
+    
+    return {
+        'coefficients': [zz_all[bounds[c]:bounds[c + 1]] for c in range(num_channels)],
+        'version': version,
+        'color_mode': color_mode,
+        'width': width,
+        'height': height,
+        'orig_width': orig_width,
+        'orig_height': orig_height,
+        'faktor': faktor
+    }
+
+
+@jit(nopython=True, cache=True)
+def _read_int32_le(raw: np.ndarray, pos: int) -> int:
+    value = (np.int64(raw[pos]) | (np.int64(raw[pos + 1]) << 8) |
+             (np.int64(raw[pos + 2]) << 16) | (np.int64(raw[pos + 3]) << 24))
+    if value >= 2147483648:
+        value -= 4294967296
+    return value
+
+
+@jit(nopython=True, cache=True)
+def _read_int16_le(raw: np.ndarray, pos: int) -> int:
+    value = np.int64(raw[pos]) | (np.int64(raw[pos + 1]) << 8)
+    if value >= 32768:
+        value -= 65536
+    return value
+
+
+@jit(nopython=True, cache=True)
+def _index_v1_blocks(raw: np.ndarray, offset: int, block_offsets: np.ndarray, pair_counts: np.ndarray) -> int:
+    # En prehod čez glave blokov kanala: začetek RLE parov in število parov vsakega bloka
+    # Vrne odmik za zadnjim blokom ali -1, če so podatki poškodovani
+    size = raw.shape[0]
+    for b in range(block_offsets.shape[0]):
+        if offset + 4 > size:
+            return -1
+        n = _read_int32_le(raw, offset)
+        if n < 0:
+            return -1
+        offset += 4
+        block_offsets[b] = offset
+        pair_counts[b] = n
+        offset += 6 * n
+    if offset > size:
+        return -1
+    return offset
+
+
+@jit(nopython=True, cache=True)
+def _expand_v1_runs(raw: np.ndarray, block_offsets: np.ndarray, pair_counts: np.ndarray, out: np.ndarray) -> bool:
+    # RLE pari vsakega bloka se razširijo neposredno v out (N, 64), brez vmesnih array-ev parov
+    for b in range(block_offsets.shape[0]):
+        pos = block_offsets[b]
+        filled = 0
+        for _ in range(pair_counts[b]):
+            value = _read_int16_le(raw, pos)
+            count = _read_int32_le(raw, pos + 2)
+            pos += 6
+            if count < 0 or filled + count > 64:
+                return False
+            for k in range(count):
+                out[b, filled + k] = value
+            filled += count
+        if filled != 64:
+            return False
+    return True
+
+
+@jit(nopython=True, cache=True)
+def _gather_v1_pairs(raw: np.ndarray, block_offsets: np.ndarray, pair_counts: np.ndarray,
+                     values: np.ndarray, counts: np.ndarray) -> None:
+    i = 0
+    for b in range(block_offsets.shape[0]):
+        pos = block_offsets[b]
+        for _ in range(pair_counts[b]):
+            values[i] = _read_int16_le(raw, pos)
+            counts[i] = _read_int32_le(raw, pos + 2)
+            pos += 6
+            i += 1
+
+
+def index_runs_v1(buffer) -> Dict:
+    """
+    Zgradi indeks blokov datoteke v formatu v1 v enem prehodu, brez kopiranja RLE parov.
+    
+    Args:
+        buffer: bytes, bytearray, memoryview ali mmap kompresiranih podatkov
+    
+    Returns:
+        Dictionary z podatki:
+        - raw: uint8 pogled na buffer (brez kopije)
+        - channels: Lista kanalov, vsak kanal je tuple (block_offsets, pair_counts) -
+          odmik prvega RLE para in število parov vsakega bloka
+        - width, height, orig_width, orig_height, faktor: Podatki iz glave
+    """
+    mv = memoryview(buffer).cast('B')
+    raw = np.frombuffer(mv, dtype=np.uint8)
+    
+    try:
+        num_channels, width, height, orig_width, orig_height, faktor = HEADER_STRUCT.unpack_from(mv, 0)
+        offset = HEADER_STRUCT.size
+        check_header_dimensions(num_channels, width, height, orig_width, orig_height)
+        expected_blocks = -(-width // 8) * -(-height // 8)
+        
+        channels = []
+        for ch in range(num_channels):
+            num_blocks = INT32_STRUCT.unpack_from(mv, offset)[0]
+            offset += INT32_STRUCT.size
+            # Število blokov mora ustrezati velikosti iz glave, vsak blok ima vsaj 4-bajtno glavo -
+            # prepreči ogromno alokacijo pri poškodovanih podatkih
+            if num_blocks != expected_blocks or num_blocks > (len(raw) - offset) // INT32_STRUCT.size:
+                raise ValueError("Napaka: kompresirani podatki so poškodovani")
+            
+            block_offsets = np.empty(num_blocks, dtype=np.int64)
+            pair_counts = np.empty(num_blocks, dtype=np.int32)
+            offset = _index_v1_blocks(raw, offset, block_offsets, pair_counts)
+            if offset < 0:
+                raise ValueError("Napaka: kompresirani podatki so poškodovani")
+            channels.append((block_offsets, pair_counts))
+    except struct.error:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    
+    return {
+        'raw': raw,
+        'channels': channels,
+        'width': width,
+        'height': height,
+        'orig_width': orig_width,
+        'orig_height': orig_height,
+        'faktor': faktor
+    }
+
+
+def block_runs_v1(raw: np.ndarray, block_offset: int, pair_count: int) -> np.ndarray:
+    """
+    Vrne RLE pare enega bloka kot pogled (brez kopije) s polji 'value' in 'count' (RLE_PAIR_DTYPE).
+    """
+    return raw[block_offset:block_offset + RLE_PAIR_DTYPE.itemsize * pair_count].view(RLE_PAIR_DTYPE)
+
+
+def parse_runs_v1(buffer) -> Dict:
+    """
+    Prebere podatke v formatu v1 iz bytes ali memoryview (brez datoteke).
+    Glave blokov se preberejo v enem prehodu (index_runs_v1), RLE pari pa naenkrat.
+    
+    Args:
+        buffer: bytes, bytearray ali memoryview kompresiranih podatkov
+    
+    Returns:
+        Dictionary z podatki:
+        - channels: Lista kanalov, vsak kanal je tuple (pair_counts, values, counts)
+        - width: Širina slike
+        - height: Višina slike
+        - orig_width: Originalna širina
+        - orig_height: Originalna višina
+        - faktor: Faktor stiskanja
+    """
+    data = index_runs_v1(buffer)
+    raw = data.pop('raw')
+    
+    channels = []
+    for block_offsets, pair_counts in data['channels']:
+        num_pairs = int(pair_counts.sum(dtype=np.int64))
+        values = np.empty(num_pairs, dtype=np.int16)
+        counts = np.empty(num_pairs, dtype=np.int32)
+        _gather_v1_pairs(raw, block_offsets, pair_counts, values, counts)
+        channels.append((pair_counts, values, counts))
+    
+    data['channels'] = channels
+    return data
+
+
+def _parse_binary_v1(mv: memoryview) -> Dict:
+    data = index_runs_v1(mv)
+    raw = data.pop('raw')
+    
+    coefficients = []
+    for block_offsets, pair_counts in data.pop('channels'):
+        zz = np.empty((len(block_offsets), 64), dtype=np.int16)
+        if not _expand_v1_runs(raw, block_offsets, pair_counts, zz):
+            raise ValueError("Napaka: kompresirani podatki so poškodovani")
+        coefficients.append(zz)
+    
+    data['coefficients'] = coefficients
+    data['version'] = 1
+    data['color_mode'] = 'bgr'
+    return data
 
 
 def save_binary(blocks: List[List[List[Tuple[int, int]]]], 
@@ -244,26 +1245,27 @@ def save_binary(blocks: List[List[List[Tuple[int, int]]]],
         orig_height: Originalna višina slike
         faktor: Faktor stiskanja
     """
+    channels = [rle_blocks_to_runs(channel_blocks) for channel_blocks in blocks]
     with open(filename, 'wb') as out:
-        num_channels = len(blocks)
-        out.write(struct.pack('i', num_channels))
-        out.write(struct.pack('i', width))
-        out.write(struct.pack('i', height))
-        out.write(struct.pack('i', orig_width))
-        out.write(struct.pack('i', orig_height))
-        out.write(struct.pack('i', faktor))
-        
-        for ch in range(num_channels):
-            num_blocks = len(blocks[ch])
-            out.write(struct.pack('i', num_blocks))
-            
-            for blk in blocks[ch]:
-                n = len(blk)
-                out.write(struct.pack('i', n))
-                
-                for value, count in blk:
-                    out.write(struct.pack('h', value))  # int16_t
-                    out.write(struct.pack('i', count))  # int32_t
+        out.write(serialize_binary(channels, width, height, orig_width, orig_height, faktor))
+
+
+def read_compressed_file(filename: str) -> Dict:
+    """
+    Prebere .dct datoteko prek mmap - podatki se ne kopirajo v pomnilnik procesa,
+    poraba pomnilnika je odvisna le od velikosti slike (koeficienti), ne od števila RLE parov.
+    
+    Args:
+        filename: Ime vhodne datoteke
+    
+    Returns:
+        Dictionary kot pri parse_binary
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Napaka: kompresirani podatki so poškodovani")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_binary(mm)
 
 
 def read_binary(filename: str) -> Dict:
@@ -282,44 +1284,19 @@ def read_binary(filename: str) -> Dict:
         - orig_width: Originalna širina
         - orig_height: Originalna višina
         - faktor: Faktor stiskanja
+        - version: Verzija formata (1 ali 2)
     """
-    with open(filename, 'rb') as f:
-        num_channels = struct.unpack('i', f.read(4))[0]
-        width = struct.unpack('i', f.read(4))[0]
-        height = struct.unpack('i', f.read(4))[0]
-        orig_width = struct.unpack('i', f.read(4))[0]
-        orig_height = struct.unpack('i', f.read(4))[0]
-        faktor = struct.unpack('i', f.read(4))[0]
-        
-        blocks = []
-        for ch in range(num_channels):
-            num_blocks = struct.unpack('i', f.read(4))[0]
-            channel_blocks = []
-            
-            for b in range(num_blocks):
-                n = struct.unpack('i', f.read(4))[0]
-                block_data = []
-                
-                for i in range(n):
-                    value = struct.unpack('h', f.read(2))[0]  # int16_t
-                    count = struct.unpack('i', f.read(4))[0]    # int32_t
-                    block_data.append((value, count))
-                
-                channel_blocks.append(block_data)
-            
-            blocks.append(channel_blocks)
-    
-    return {
-        'blocks': blocks,
-        'width': width,
-        'height': height,
-        'orig_width': orig_width,
-        'orig_height': orig_height,
-        'faktor': faktor
-    }
+    data = read_compressed_file(filename)
+    data['blocks'] = [runs_to_rle_blocks(*coefficients_to_runs(zz)) for zz in data.pop('coefficients')]
+    return data
 
 
-def compress_image_dct(image_path: str, output_path: str, faktor: int = 5) -> Dict:
+def compress_image_dct(image_path: str, output_path: str, faktor: int = 5,
+                       dct_engine: str = DEFAULT_DCT_ENGINE,
+                       version: int = FORMAT_VERSION,
+                       workers: Optional[int] = 1,
+                       color_mode: str = 'bgr',
+                       block_index: bool = False) -> Dict:
     """
     Kompresira sliko z DCT algoritmom.
     Port iz C++ compressImage funkcije.
@@ -328,6 +1305,11 @@ def compress_image_dct(image_path: str, output_path: str, faktor: int = 5) -> Di
         image_path: Pot do vhodne slike
         output_path: Pot za shranjevanje kompresirane datoteke (.dct)
         faktor: Faktor stiskanja (1-15), manjši = boljša kakovost
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+        version: Verzija binarnega formata (1 ali 2)
+        workers: Število procesov za vzporedno kompresijo (1 = zaporedno, None = število jeder)
+        color_mode: Barvni način ('bgr' ali 'ycbcr444'/'ycbcr422'/'ycbcr420', le format v2)
+        block_index: Dodaj indeks vrstic blokov za decompress_region (le format v2)
     
     Returns:
         Dictionary s statistiko:
@@ -344,56 +1326,12 @@ def compress_image_dct(image_path: str, output_path: str, faktor: int = 5) -> Di
     if img is None:
         raise ValueError(f"Napaka: slike ni mogoče naložiti: {image_path}")
     
-    # Razdeli na BGR kanale
-    bgr_channels = cv2.split(img)
-    rows, cols = img.shape[:2]
-    
-    # Prilagodi velikost, da je deljiva z 8
-    new_rows = rows if rows % 8 == 0 else rows + (8 - rows % 8)
-    new_cols = cols if cols % 8 == 0 else cols + (8 - cols % 8)
-    
-    # Padding za vsak kanal
-    processed_channels = []
-    for ch in bgr_channels:
-        ch_float = ch.astype(np.float32)
-        ch_float -= 128.0
-        # Padding
-        ch_padded = cv2.copyMakeBorder(ch_float, 0, new_rows - rows, 0, new_cols - cols, 
-                                      cv2.BORDER_CONSTANT, value=0)
-        processed_channels.append(ch_padded)
-    
-    # Kvantizacijska matrika
-    Q = quant_matrix(faktor)
-    
-    # Obdelaj vsak kanal
-    all_blocks = []
-    
-    for c in range(3):  # B, G, R
-        channel_blocks = []
-        
-        for i in range(0, new_rows, 8):
-            for j in range(0, new_cols, 8):
-                # Izreži 8x8 blok
-                block = processed_channels[c][i:i+8, j:j+8]
-                
-                # DCT
-                F = fdct_8x8(block)
-                
-                # Kvantizacija
-                Fq16 = apply_quant(F, Q)
-                
-                # Zigzag skeniranje
-                zz = zigzag_scan(Fq16)
-                
-                # RLE kodiranje
-                rle_encoded = rle_encode(zz)
-                
-                channel_blocks.append(rle_encoded)
-        
-        all_blocks.append(channel_blocks)
+    # DCT, kvantizacija, zigzag in entropijsko kodiranje za vse kanale
+    compressed_data = compress_image_array(img, faktor, dct_engine, version, workers, color_mode, block_index)
     
     # Shrani v binarno datoteko
-    save_binary(all_blocks, output_path, new_cols, new_rows, cols, rows, faktor)
+    with open(output_path, 'wb') as out:
+        out.write(compressed_data)
     
     # Statistika
     elapsed_time = time.time() - start_time
@@ -409,7 +1347,8 @@ def compress_image_dct(image_path: str, output_path: str, faktor: int = 5) -> Di
     }
 
 
-def decompress_image_dct(compressed_path: str, output_path: str) -> Dict:
+def decompress_image_dct(compressed_path: str, output_path: str,
+                         dct_engine: str = DEFAULT_DCT_ENGINE) -> Dict:
     """
     Dekompresira sliko iz DCT formata.
     Port iz C++ decompressImage funkcije.
@@ -417,6 +1356,7 @@ def decompress_image_dct(compressed_path: str, output_path: str) -> Dict:
     Args:
         compressed_path: Pot do kompresirane datoteke (.dct)
         output_path: Pot za shranjevanje dekompresirane slike
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
     
     Returns:
         Dictionary s statistiko:
@@ -427,51 +1367,11 @@ def decompress_image_dct(compressed_path: str, output_path: str) -> Dict:
     import time
     start_time = time.time()
     
-    # Preberi binarno datoteko
-    data = read_binary(compressed_path)
-    
-    W = data['width']
-    H = data['height']
-    Q = quant_matrix(data['faktor'])
-    
-    # Rekonstruiraj vsak kanal
-    reconstructed_channels = []
+    # Preberi binarno datoteko (mmap, brez kopije)
+    data = read_compressed_file(compressed_path)
     
-    for c in range(len(data['blocks'])):
-        rec = np.zeros((H, W), dtype=np.float32)
-        idx = 0
-        
-        for y in range(0, H, 8):
-            for x in range(0, W, 8):
-                # RLE dekodiranje
-                zz = rle_decode(data['blocks'][c][idx])
-                
-                # Zigzag nazaj v blok
-                Fq16 = zigzag_to_block(zz)
-                
-                # Inverzna kvantizacija
-                F = inverse_quant(Fq16, Q)
-                
-                # Inverzna DCT
-                block = idct_8x8(F)
-                
-                # Dodaj 128
-                block += 128.0
-                
-                # Kopiraj v rekonstruirano sliko
-                rec[y:y+8, x:x+8] = block
-                
-                idx += 1
-        
-        # Pretvori v uint8
-        rec_uint8 = np.clip(rec, 0, 255).astype(np.uint8)
-        reconstructed_channels.append(rec_uint8)
-    
-    # Združi kanale
-    color_img = cv2.merge(reconstructed_channels)
-    
-    # Obreži na originalno velikost
-    cropped = color_img[0:data['orig_height'], 0:data['orig_width']]
+    # Rekonstruiraj kanale in obreži na originalno velikost
+    cropped = decode_channels(data, dct_engine)
     
     # Shrani
     cv2.imwrite(output_path, cropped)
@@ -485,111 +1385,284 @@ def decompress_image_dct(compressed_path: str, output_path: str) -> Dict:
     }
 
 
-def compress_image_array(image_array: np.ndarray, faktor: int = 5) -> bytes:
+def compress_image_array(image_array: np.ndarray, faktor: int = 5,
+                         dct_engine: str = DEFAULT_DCT_ENGINE,
+                         version: int = FORMAT_VERSION,
+                         workers: Optional[int] = 1,
+                         color_mode: str = 'bgr',
+                         block_index: bool = False) -> bytes:
     """
     Kompresira numpy array slike (ne datoteke).
     
     Args:
         image_array: numpy array slike (BGR format iz cv2, uint8)
         faktor: Faktor stiskanja (1-15)
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+        version: Verzija binarnega formata (1 ali 2)
+        workers: Število procesov za vzporedno kompresijo (1 = zaporedno, None = število jeder)
+        color_mode: Barvni način ('bgr' ali 'ycbcr444'/'ycbcr422'/'ycbcr420', le format v2)
+        block_index: Dodaj indeks vrstic blokov za decompress_region (le format v2)
     
     Returns:
         bytes: Kompresirani podatki (binarni format)
     """
+    if version == 1 and color_mode != 'bgr':
+        raise ValueError("Napaka: format v1 podpira le barvni način 'bgr'")
+    
     rows, cols = image_array.shape[:2]
+    coefficients, new_cols, new_rows = encode_channels(image_array, faktor, dct_engine, workers, color_mode)
+    return serialize_coefficients(coefficients, new_cols, new_rows, cols, rows, faktor, version, color_mode,
+                                  block_index)
+
+
+def serialize_coefficients(coefficients: List[np.ndarray], width: int, height: int,
+                           orig_width: int, orig_height: int, faktor: int,
+                           version: int = FORMAT_VERSION, color_mode: str = 'bgr',
+                           block_index: bool = False) -> bytes:
+    """
+    Zapiše kvantizirane zigzag koeficiente v binarni format izbrane verzije.
+    """
+    if version == 1 and block_index:
+        raise ValueError("Napaka: format v1 ne podpira indeksa blokov")
+    if version == 1:
+        channels = [coefficients_to_runs(zz) for zz in coefficients]
+        return serialize_binary(channels, width, height, orig_width, orig_height, faktor)
+    if version == FORMAT_VERSION:
+        return serialize_binary_v2(coefficients, width, height, orig_width, orig_height, faktor, color_mode,
+                                   block_index)
+    raise ValueError(f"Napaka: nepodprta verzija formata: {version}")
+
+
+def image_psnr(original: np.ndarray, decoded: np.ndarray) -> float:
+    """
+    PSNR med originalno in dekodirano sliko v dB (inf, če sta enaki).
+    """
+    mse = np.mean((original.astype(np.float64) - decoded.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float('inf')
+    return float(10.0 * np.log10(255.0 ** 2 / mse))
+
+
+def compress_image_array_to_target(image_array: np.ndarray,
+                                   target_bytes: Optional[int] = None,
+                                   min_psnr: Optional[float] = None,
+                                   dct_engine: str = DEFAULT_DCT_ENGINE,
+                                   version: int = FORMAT_VERSION,
+                                   color_mode: str = 'bgr') -> Tuple[bytes, Dict]:
+    """
+    Kompresira sliko s faktorjem, izbranim glede na omejitev velikosti in/ali kakovosti.
+    DCT se izračuna enkrat, pri iskanju faktorja (bisekcija po 1-15) se koeficienti le ponovno kvantizirajo.
+    Velikost in PSNR s faktorjem nista nujno monotona, zato bisekcija le izbere preizkušene faktorje,
+    vrne pa se najboljši preizkušeni, ki ustreza omejitvam:
     
-    # Razdeli na BGR kanale
-    bgr_channels = cv2.split(image_array)
+    - samo target_bytes: najvišji PSNR med faktorji, ki ne presežejo target_bytes
+    - min_psnr (in po želji target_bytes): najmanjša datoteka med faktorji s PSNR >= min_psnr
     
-    # Prilagodi velikost
-    new_rows = rows if rows % 8 == 0 else rows + (8 - rows % 8)
-    new_cols = cols if cols % 8 == 0 else cols + (8 - cols % 8)
+    Če omejitvam ne ustreza noben faktor, vrne najbližji rezultat (najmanjša datoteka pri velikosti,
+    faktor 1 oz. najmanjša datoteka s PSNR >= min_psnr pri kakovosti) in 'met' = False.
     
-    # Padding in pretvorba
-    processed_channels = []
-    for ch in bgr_channels:
-        ch_float = ch.astype(np.float32)
-        ch_float -= 128.0
-        ch_padded = cv2.copyMakeBorder(ch_float, 0, new_rows - rows, 0, new_cols - cols,
-                                      cv2.BORDER_CONSTANT, value=0)
-        processed_channels.append(ch_padded)
-    
-    Q = quant_matrix(faktor)
-    all_blocks = []
-    
-    for c in range(3):
-        channel_blocks = []
-        for i in range(0, new_rows, 8):
-            for j in range(0, new_cols, 8):
-                block = processed_channels[c][i:i+8, j:j+8]
-                F = fdct_8x8(block)
-                Fq16 = apply_quant(F, Q)
-                zz = zigzag_scan(Fq16)
-                rle_encoded = rle_encode(zz)
-                channel_blocks.append(rle_encoded)
-        all_blocks.append(channel_blocks)
-    
-    # Shrani v začasno datoteko in preberi kot bytes
-    import tempfile
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.dct') as tmp:
-        tmp_path = tmp.name
+    Args:
+        image_array: numpy array slike (BGR format iz cv2, uint8)
+        target_bytes: Največja velikost kompresiranih podatkov
+        min_psnr: Najmanjši PSNR v dB, izmerjen na dekodirani sliki velikosti orig_width x orig_height
+                  (robni bloki zaradi poravnave na 8 in obrezovanje na 0-255 ne popačijo ocene)
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+        version: Verzija binarnega formata (1 ali 2)
+        color_mode: Barvni način ('bgr' ali 'ycbcr444'/'ycbcr422'/'ycbcr420', le format v2)
     
-    try:
-        save_binary(all_blocks, tmp_path, new_cols, new_rows, cols, rows, faktor)
-        with open(tmp_path, 'rb') as f:
-            compressed_data = f.read()
-        return compressed_data
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+    Returns:
+        Tuple (kompresirani podatki, info), info vsebuje faktor, psnr, compressed_size in met
+    """
+    if target_bytes is None and min_psnr is None:
+        raise ValueError("Napaka: podati je treba target_bytes ali min_psnr")
+    if version == 1 and color_mode != 'bgr':
+        raise ValueError("Napaka: format v1 podpira le barvni način 'bgr'")
+    
+    rows, cols = image_array.shape[:2]
+    channels = [pad_plane(plane) for plane in split_color_planes(image_array, color_mode)]
+    new_rows, new_cols = channels[0].shape
+    F = [fdct_blocks(channel_to_blocks(channel), dct_engine) for channel in channels]
+    
+    psnr_cache = {}
+    encoded_cache = {}
+    
+    def quantize(faktor):
+        Qs = channel_quant_matrices(faktor, color_mode, len(F))
+        return [zigzag_scan_blocks(apply_quant(f, Q)) for f, Q in zip(F, Qs)]
+    
+    def psnr_at(faktor):
+        if faktor not in psnr_cache:
+            decoded = decode_channels({
+                'coefficients': quantize(faktor),
+                'width': new_cols,
+                'height': new_rows,
+                'orig_width': cols,
+                'orig_height': rows,
+                'faktor': faktor,
+                'color_mode': color_mode
+            }, dct_engine)
+            psnr_cache[faktor] = image_psnr(image_array, decoded)
+        return psnr_cache[faktor]
+    
+    def encode_at(faktor):
+        if faktor not in encoded_cache:
+            coefficients = quantize(faktor)
+            encoded_cache[faktor] = serialize_coefficients(coefficients, new_cols, new_rows, cols, rows,
+                                                           faktor, version, color_mode)
+        return encoded_cache[faktor]
+    
+    def search(condition, prefer_largest):
+        # Bisekcija ob predpostavki, da velikost in PSNR večinoma padata z naraščajočim faktorjem
+        lo, hi = 1, 15
+        best = None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if condition(mid):
+                best = mid
+                if prefer_largest:
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            elif prefer_largest:
+                hi = mid - 1
+            else:
+                lo = mid + 1
+        return best
+    
+    if min_psnr is not None:
+        search(lambda f: psnr_at(f) >= min_psnr, prefer_largest=True)
+        # Izmed vseh preizkušenih faktorjev z zadostnim PSNR najmanjša datoteka
+        candidates = [f for f in psnr_cache if psnr_cache[f] >= min_psnr]
+        if candidates:
+            faktor = min(candidates, key=lambda f: (len(encode_at(f)), -f))
+            met = target_bytes is None or len(encode_at(faktor)) <= target_bytes
+        else:
+            faktor = 1
+            met = False
+    else:
+        search(lambda f: len(encode_at(f)) <= target_bytes, prefer_largest=False)
+        # Izmed vseh preizkušenih faktorjev, ki ne presežejo velikosti, najvišji PSNR
+        candidates = [f for f in encoded_cache if len(encoded_cache[f]) <= target_bytes]
+        if candidates:
+            faktor = max(candidates, key=lambda f: (psnr_at(f), -f))
+            met = True
+        else:
+            faktor = min(encoded_cache, key=lambda f: (len(encoded_cache[f]), -f))
+            met = False
+    
+    data = encode_at(faktor)
+    return data, {
+        'faktor': faktor,
+        'psnr': psnr_at(faktor),
+        'compressed_size': len(data),
+        'met': met
+    }
 
 
-def decompress_to_array(compressed_data: bytes) -> np.ndarray:
+def decompress_to_array(compressed_data: bytes,
+                        dct_engine: str = DEFAULT_DCT_ENGINE,
+                        scale: int = 1) -> np.ndarray:
     """
     Dekompresira v numpy array (ne datoteko).
     
     Args:
         compressed_data: bytes kompresiranih podatkov
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+        scale: Razmerje pomanjšave (1, 2, 4 ali 8) - slika se dekodira
+               neposredno v 1/scale ločljivosti
     
     Returns:
         numpy array slike (BGR format, uint8)
     """
-    # Shrani v začasno datoteko
-    import tempfile
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.dct') as tmp:
-        tmp.write(compressed_data)
-        tmp_path = tmp.name
+    data = parse_binary(compressed_data)
+    return decode_channels(data, dct_engine, scale)
+
+
+def decompress_region(compressed_data, x: int, y: int, width: int, height: int,
+                      dct_engine: str = DEFAULT_DCT_ENGINE) -> np.ndarray:
+    """
+    Dekompresira le pravokoten izrez slike (npr. obraz), ki mora biti kodirana z indeksom blokov.
+    Za vsak kanal se preberejo le vrstice blokov, ki sekajo izrez (skok na odmik iz indeksa),
+    v vsaki vrstici se bloki dekodirajo do desnega roba izreza, IDCT pa se izvede le za bloke v izrezu.
+    Pri podvzorčenih kromatskih kanalih se piksli od izreza celotne dekodirane slike lahko
+    razlikujejo za 1-2 (zaokroževanje pri bilinearni povečavi).
     
+    Args:
+        compressed_data: bytes, memoryview ali mmap kompresiranih podatkov (format v2 z indeksom blokov)
+        x, y: Zgornji levi kot izreza v pikslih originalne slike
+        width, height: Velikost izreza (obreže se na rob slike)
+        dct_engine: Implementacija DCT ('reference' ali 'separable')
+    
+    Returns:
+        numpy array izreza (BGR format, uint8)
+    """
+    mv = memoryview(compressed_data).cast('B')
+    if bytes(mv[:len(FORMAT_MAGIC)]) != FORMAT_MAGIC:
+        raise ValueError("Napaka: dekodiranje izreza podpira le format v2")
     try:
-        # Preberi z read_binary
-        data = read_binary(tmp_path)
-        W = data['width']
-        H = data['height']
-        Q = quant_matrix(data['faktor'])
-        
-        reconstructed_channels = []
-        
-        for c in range(len(data['blocks'])):
-            rec = np.zeros((H, W), dtype=np.float32)
-            idx = 0
-            
-            for y in range(0, H, 8):
-                for x in range(0, W, 8):
-                    zz = rle_decode(data['blocks'][c][idx])
-                    Fq16 = zigzag_to_block(zz)
-                    F = inverse_quant(Fq16, Q)
-                    block = idct_8x8(F)
-                    block += 128.0
-                    rec[y:y+8, x:x+8] = block
-                    idx += 1
-            
-            rec_uint8 = np.clip(rec, 0, 255).astype(np.uint8)
-            reconstructed_channels.append(rec_uint8)
+        magic, version, num_channels, faktor, flags, padded_w, padded_h, orig_width, orig_height = \
+            HEADER_V2_STRUCT.unpack_from(mv, 0)
+    except struct.error:
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Napaka: nepodprta verzija formata: {version}")
+    if not flags & FLAG_BLOCK_INDEX:
+        raise ValueError("Napaka: kompresirani podatki nimajo indeksa blokov")
+    check_header_dimensions(num_channels, padded_w, padded_h, orig_width, orig_height)
+    
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(orig_width, x + width), min(orig_height, y + height)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("Napaka: izrez je izven slike")
+    
+    color_mode = COLOR_MODES[flags & FLAG_COLOR_MODE_MASK]
+    dims = channel_dimensions(padded_w, padded_h, orig_width, orig_height, num_channels, color_mode)
+    Qs = channel_quant_matrices(faktor, color_mode, num_channels)
+    dc_tables, ac_tables, payload, offset = read_entropy_tables(mv, HEADER_V2_STRUCT.size)
+    check_block_count(payload, sum(channel_block_counts(dims)))
+    
+    num_rows = sum(padded_h // 8 for _, _, _, padded_h in dims)
+    index_end = offset + BLOCK_INDEX_DTYPE.itemsize * num_rows
+    if index_end > len(mv):
+        raise ValueError("Napaka: kompresirani podatki so poškodovani")
+    row_bits = np.frombuffer(mv[offset:index_end], dtype=BLOCK_INDEX_DTYPE)
+    
+    planes = []
+    first_row = 0
+    for (w, h, plane_w, plane_h), Q in zip(dims, Qs):
+        # Izrez v koordinatah kanala (kromatska kanala sta lahko podvzorčena)
+        sx, sy = orig_width / w, orig_height / h
+        px0, py0 = int(x0 / sx), int(y0 / sy)
+        px1, py1 = min(w, int(np.ceil(x1 / sx))), min(h, int(np.ceil(y1 / sy)))
+        if sx > 1 or sy > 1:
+            # Rob za bilinearno povečavo kromatskih kanalov
+            px0, py0 = max(0, px0 - 1), max(0, py0 - 1)
+            px1, py1 = min(w, px1 + 1), min(h, py1 + 1)
+        bx0, by0 = px0 // 8, py0 // 8
+        bx1, by1 = -(-px1 // 8), -(-py1 // 8)
         
-        color_img = cv2.merge(reconstructed_channels)
-        cropped = color_img[0:data['orig_height'], 0:data['orig_width']]
+        rows = []
+        for block_row in range(by0, by1):
+            zz = decode_blocks_at(payload, dc_tables, ac_tables, int(row_bits[first_row + block_row]), bx1)
+            rows.append(zz[bx0:bx1])
+        first_row += plane_h // 8
         
-        return cropped
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        F = inverse_quant(zigzag_to_blocks(np.concatenate(rows)), Q)
+        blocks = idct_blocks(F, dct_engine)
+        blocks += 128.0
+        rec = blocks_to_channel(blocks, (by1 - by0) * 8, (bx1 - bx0) * 8)
+        plane = np.clip(rec, 0, 255).astype(np.uint8)
+        planes.append((plane[py0 - by0 * 8:py1 - by0 * 8, px0 - bx0 * 8:px1 - bx0 * 8], px0, py0, sx, sy))
+    
+    # Kanale preslikaj na piksle izreza; kromatske kanale povečaj z enako preslikavo kot pri celi sliki
+    out_w, out_h = x1 - x0, y1 - y0
+    resized = []
+    for plane, px0, py0, sx, sy in planes:
+        if sx == 1 and sy == 1:
+            resized.append(plane)
+            continue
+        map_x = ((np.arange(x0, x1, dtype=np.float32) + 0.5) / sx - 0.5 - px0).clip(0, plane.shape[1] - 1)
+        map_y = ((np.arange(y0, y1, dtype=np.float32) + 0.5) / sy - 0.5 - py0).clip(0, plane.shape[0] - 1)
+        resized.append(cv2.remap(plane, *np.meshgrid(map_x, map_y), cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_REPLICATE))
+    return merge_color_planes(resized, color_mode, out_w, out_h)